@@ -154,16 +154,20 @@ class ClassDeletrunDialog(QDialog):
 
         if ok:
             for i, (run, scenarios) in enumerate(selection.items()):
+                if not scenarios:
+                    continue
                 sql = "run = '{0}' AND scenario IN ({1})".format(run,
                                                                  ",".join(scenarios))
-                self.mdb.delete("resultats", sql)
-                self.mdb.delete("resultats_basin", sql)
-                self.mdb.delete("resultats_links", sql)
-                self.mdb.delete("runs", sql)
+
+                def avance(val, i=i):
+                    progress.setValue(int((i + val / 100.) / float(n) * 100))
+                    QApplication.processEvents()
+
+                self.mdb.delete_runs(sql, avance)
                 if self.mgis.DEBUG:
                     self.mgis.add_info("Deletion of {0} scenario for {1} is done".format(scenarios, run))
 
-                progress.setValue(i / float(n) * 100)
+                progress.setValue(int((i + 1) / float(n) * 100))
 
         self.iface.messageBar().clearWidgets()
 
@@ -19,66 +19,205 @@ email                :
 """
 
 # from shapely.wkb import loads
+import multiprocessing
+import threading
+from multiprocessing.pool import ThreadPool
+
 import numpy as np
 from qgis.PyQt.QtCore import *
 from qgis.core import *
 from qgis.gui import *
 
+# QgsRasterBlock data types -> numpy
+DTYPES = {1: np.uint8, 2: np.uint16, 3: np.int16, 4: np.uint32, 5: np.int32, 6: np.float32, 7: np.float64}
+
 
 class ClassMNT(QObject):
-    """Example worker for calculating the total area of all features in a layer"""
+    """
+    Extraction of the DTM along the selected profiles.
+    The raster window covering a profile is read in one block
+    and the points are sampled (bilinear) with numpy.
+    The worker is run in a QThread : the profiles are processed by chunks,
+    the results of each chunk are sent (signal resultat) to be saved
+    by the GUI thread and the extraction can be canceled between two chunks.
+    """
+    CHUNK = 10
+    progress = pyqtSignal(int)
+    info = pyqtSignal(str)
+    resultat = pyqtSignal(object)
+    finished = pyqtSignal()
 
-    def __init__(self, main, profil, raster, facteur):
+    def __init__(self, main, profil, raster, facteur, nb_thread=1):
         QObject.__init__(self)
         self.mgis = main
+        self.mdb = getattr(main, 'mdb', None)
         self.profil = profil
+        # the layer is read in the GUI thread
+        self.features = profil.selectedFeatures()
+        self.idx_x = profil.fields().indexFromName("tab_xmnt")
+        self.idx_z = profil.fields().indexFromName("tab_zmnt")
         self.raster_provider = raster.dataProvider()
         self.res = raster.rasterUnitsPerPixelX()
+        self.res_y = raster.rasterUnitsPerPixelY()
+        self.extent = self.raster_provider.extent()
+        self.nb_col = self.raster_provider.xSize()
+        self.nb_lig = self.raster_provider.ySize()
         self.facteur = facteur
+        # 0 : number of processors
+        self.nb_thread = nb_thread if nb_thread > 0 else multiprocessing.cpu_count()
+        self.local = threading.local()
+        self.annule = False
         self.mnt = {}
 
     def run(self):
-        ret = None
-        # try:
-        total_area = 0.0
-        features = self.profil.selectedFeatures()
-        self.profil.startEditing()
-
-        for feature in features:
-            geomcoupe = feature.geometry()
-            longueur = geomcoupe.length()
-            if longueur < self.res:
-                self.mgis.add_info("Problem {0} between lenght profile : {1} and Raster accurancy : {2}."
-                                   .format(feature["name"], longueur, self.res))
-                self.mgis.add_info("This problem could come from the projection units.")
+        """ extraction by chunks of profiles"""
+        try:
+            nb = len(self.features)
+            for deb in range(0, nb, self.CHUNK):
+                if self.annule:
+                    self.info.emit("Extraction canceled")
+                    break
+                resultats = self.extrait(self.features[deb:deb + self.CHUNK])
+                self.resultat.emit(self.modifs(resultats))
+                self.progress.emit(int(100. * min(deb + self.CHUNK, nb) / nb))
+        except Exception as e:
+            self.info.emit("Error: DTM extraction")
+            self.info.emit(str(e))
+        finally:
+            if self.mdb is not None:
+                # connection of the worker thread
+                self.mdb.release()
+            self.finished.emit()
+
+    def cancel(self):
+        """ stop the extraction after the current chunk"""
+        self.annule = True
+
+    def extrait(self, features):
+        """ DTM of the features, list of (feature, tab_x, tab_z)"""
+        if self.nb_thread > 1 and len(features) > 1:
+            pool = ThreadPool(min(self.nb_thread, len(features)))
+            try:
+                fct = self.extrait_feature if self.mdb is None else self.mdb.worker(self.extrait_feature)
+                tabs = pool.map(fct, features)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            tabs = [self.extrait_feature(feature) for feature in features]
+        return [(feature, tab[0], tab[1]) for feature, tab in zip(features, tabs)]
+
+    def provider(self):
+        """ raster provider, one clone by thread (the provider of the layer belongs to the GUI thread)"""
+        provider = getattr(self.local, 'provider', None)
+        if provider is None:
+            try:
+                provider = self.raster_provider.clone()
+            except Exception as e:
+                raise RuntimeError("the raster provider can't be cloned ({0})".format(e))
+            if provider is None:
+                raise RuntimeError("the raster provider can't be cloned")
+            self.local.provider = provider
+        return provider
+
+    def extrait_feature(self, feature):
+        """ points and levels of the DTM along the profile, (None, None) if the profile is too short"""
+        geomcoupe = feature.geometry()
+        longueur = geomcoupe.length()
+        if longueur < self.res:
+            return None, None
+        # self.res taille du la résolution du raster
+        dist = np.arange(0.0, round(longueur, 3), round(self.res, 3))
+        px, py = self.points(geomcoupe, dist)
+        val = self.echantillon(self.provider(), px, py)
+        cond = ~np.isnan(val)
+        return dist[cond], val[cond] / self.facteur
 
+    @staticmethod
+    def points(geom, dist):
+        """ coordinates of the points at the distances dist along the line"""
+        if geom.isMultipart():
+            points = geom.asMultiPolyline()[0]
+        else:
+            points = geom.asPolyline()
+        coord = np.array([(p[0], p[1]) for p in points], dtype=float)
+        long = np.concatenate(([0.], np.cumsum(np.hypot(np.diff(coord[:, 0]), np.diff(coord[:, 1])))))
+        return np.interp(dist, long, coord[:, 0]), np.interp(dist, long, coord[:, 1])
+
+    def lit_bloc(self, provider, col0, col1, lig0, lig1):
+        """ values of the raster window [lig0:lig1, col0:col1], NaN for no data"""
+        x0 = self.extent.xMinimum()
+        y1 = self.extent.yMaximum()
+        rect = QgsRectangle(x0 + col0 * self.res, y1 - lig1 * self.res_y,
+                            x0 + col1 * self.res, y1 - lig0 * self.res_y)
+        larg = col1 - col0
+        haut = lig1 - lig0
+        block = provider.block(1, rect, larg, haut)
+        dtype = DTYPES.get(int(block.dataType()))
+        try:
+            tab = np.frombuffer(bytes(block.data()), dtype=dtype).astype(np.float64).reshape(haut, larg)
+        except Exception:
+            tab = np.array([[block.value(i, j) for j in range(larg)] for i in range(haut)], dtype=np.float64)
+        if block.hasNoDataValue():
+            tab[tab == block.noDataValue()] = np.nan
+        return tab
+
+    def echantillon(self, provider, px, py):
+        """ bilinear interpolation of the raster at the points, NaN outside or no data"""
+        val = np.full(px.shape[0], np.nan)
+        x0 = self.extent.xMinimum()
+        y1 = self.extent.yMaximum()
+        # position in pixels (centre of the pixel at +0.5)
+        fc = (px - x0) / self.res
+        fl = (y1 - py) / self.res_y
+        dedans = (fc >= 0) & (fc < self.nb_col) & (fl >= 0) & (fl < self.nb_lig)
+        if not dedans.any():
+            return val
+        col0 = max(int(np.floor(fc[dedans].min() - 0.5)), 0)
+        col1 = min(int(np.floor(fc[dedans].max() + 0.5)) + 1, self.nb_col)
+        lig0 = max(int(np.floor(fl[dedans].min() - 0.5)), 0)
+        lig1 = min(int(np.floor(fl[dedans].max() + 0.5)) + 1, self.nb_lig)
+        tab = self.lit_bloc(provider, col0, col1, lig0, lig1)
+        larg = col1 - col0
+        haut = lig1 - lig0
+
+        fc = np.clip(fc[dedans] - 0.5 - col0, 0, larg - 1)
+        fl = np.clip(fl[dedans] - 0.5 - lig0, 0, haut - 1)
+        c0 = np.floor(fc).astype(int)
+        l0 = np.floor(fl).astype(int)
+        c1 = np.minimum(c0 + 1, larg - 1)
+        l1 = np.minimum(l0 + 1, haut - 1)
+        wc = fc - c0
+        wl = fl - l0
+        bil = (tab[l0, c0] * (1 - wc) * (1 - wl) + tab[l0, c1] * wc * (1 - wl) +
+               tab[l1, c0] * (1 - wc) * wl + tab[l1, c1] * wc * wl)
+        # no data around the point : value of the pixel
+        proche = tab[np.clip(np.rint(fl).astype(int), 0, haut - 1), np.clip(np.rint(fc).astype(int), 0, larg - 1)]
+        val[dedans] = np.where(np.isnan(bil), proche, bil)
+        return val
+
+    def modifs(self, resultats):
+        """ new values of tab_xmnt and tab_zmnt by feature id"""
+        modif = {}
+        for feature, tab_x, tab_z in resultats:
+            if tab_x is None:
+                self.info.emit("Problem {0} between lenght profile : {1} and Raster accurancy : {2}."
+                               .format(feature["name"], feature.geometry().length(), self.res))
+                self.info.emit("This problem could come from the projection units.")
+                continue
+            # the text xmnt, zmnt is written by the database
+            modif[feature.id()] = {self.idx_x: tab_x.tolist(),
+                                   self.idx_z: tab_z.tolist()}
+            if tab_z.shape[0] > 0:
+                self.info.emit("Extraction of {0} : Ok".format(feature['name']))
             else:
-                nom = feature["name"]
-                gid = feature["gid"]
-                feature["xmnt"] = ""
-                feature["zmnt"] = ""
-
-                # self.res taille du la résolution du raste
-
-                for dist in np.arange(0.0, round(longueur, 3), round(self.res, 3)):
-
-                    point = geomcoupe.interpolate(dist)
-                    ident = self.raster_provider.identify(point.asPoint(),
-                                                          QgsRaster.IdentifyFormatValue).results()
-
-                    if ident[1]:
-                        feature["xmnt"] += " " + str(dist)
-                        feature["zmnt"] += " " + str(ident[1] / self.facteur)
-                self.profil.updateFeature(feature)
-
-                if len(feature["zmnt"]) > 0:
-                    self.mgis.add_info("Extraction of {0} : Ok".format(feature['name']))
-                else:
-                    self.mgis.add_info("Extraction of {} : Echec".format(feature['name']))
-                    self.mgis.add_info("This problem could come from the different projection"
-                                       " between the raster and the profile")
-
-        try:  # qgis2
-            self.profil.saveEdits()
-        except:  # qgis 3
-            self.profil.commitChanges()
+                self.info.emit("Extraction of {} : Echec".format(feature['name']))
+                self.info.emit("This problem could come from the different projection"
+                               " between the raster and the profile")
+        return modif
+
+    def sauve(self, modif):
+        """ save tab_xmnt and tab_zmnt of the profiles of one chunk (GUI thread)"""
+        if modif:
+            self.profil.dataProvider().changeAttributeValues(modif)
+            self.profil.triggerRepaint()
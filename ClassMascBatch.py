@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+Name                 : Mascaret
+Description          : Pre and Postprocessing for Mascaret for QGIS
+Date                 : June,2017
+copyright            : (C) 2017 by Artelia
+email                :
+***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+
+Run of a Mascaret model without the QGIS GUI : export of the model files,
+run of the kernel and import of the results in the database.
+
+From the plugins folder (the plugin folder is a python package) :
+
+    python -m <plugin folder>.ClassMascBatch --dbname mydb --schema model1 \\
+        --kernel unsteady --run run1 --scenario event1 event2 --overwrite
+
+Import again the tracer results of a scenario (files of the run folder) :
+
+    python -m <plugin folder>.ClassMascBatch --dbname mydb --schema model1 \\
+        --kernel unsteady --run run1 --scenario event1 --tracer
+
+The password can be given by the PGPASSWORD variable.
+"""
+import argparse
+import os
+import posixpath
+import sys
+
+from qgis.core import QgsApplication
+
+from .ClassDownload import ClassDownloadMasc
+from .ClassMascaret import ClassMascaret
+from .db.ClassMasDatabase import ClassMasDatabase
+
+
+class ClassMascBatch(object):
+    """
+    Main object of the plugin for a run without GUI.
+    Replace MascPlugDialog for ClassMasDatabase and ClassMascaret.
+    """
+
+    def __init__(self, debug=False, nb_proc=0, log=None):
+        self.masplugPath = os.path.dirname(os.path.abspath(__file__))
+        self.iface = None
+        self.mdb = None
+        self.DEBUG = debug
+        self.nb_proc = nb_proc
+        self.log = log
+
+    def add_info(self, text):
+        print(text)
+        if self.log:
+            with open(self.log, 'a') as fich:
+                fich.write('{0}\n'.format(text))
+
+    def download_bin(self):
+        """ download the kernel"""
+        url_path = posixpath.join('https://raw.githubusercontent.com/Artelia/Exe_Mascaret/', 'master')
+        cl_load = ClassDownloadMasc(self.masplugPath, url_path, self)
+        cl_load.download_dir({'bin': ['mascaret.exe', 'mascaret_linux']})
+
+
+def parser_args():
+    parser = argparse.ArgumentParser(description='Run a Mascaret model without the QGIS GUI.')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', default='5432')
+    parser.add_argument('--dbname', required=True)
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default=os.environ.get('PGPASSWORD', ''))
+    parser.add_argument('--schema', required=True, help='model')
+    parser.add_argument('--kernel', required=True, choices=['steady', 'unsteady', 'transcritical'])
+    parser.add_argument('--run', required=True, help='run name')
+    parser.add_argument('--scenario', nargs='*', default=[],
+                        help='scenario names, for events : the events to run (all if empty)')
+    parser.add_argument('--comments', default='')
+    parser.add_argument('--overwrite', action='store_true',
+                        help='remove the results of the existing scenarios')
+    parser.add_argument('--tracer', action='store_true',
+                        help='import again the tracer results (.tra_opt of the run folder) '
+                             'of the existing scenario, without run')
+    parser.add_argument('--init', default=None,
+                        help='initial water line : "run:scenario" or .lig file')
+    parser.add_argument('--nb-proc', type=int, default=0, dest='nb_proc',
+                        help='simulations run at the same time (0 : number of processors)')
+    parser.add_argument('--work', default=None, help='run folder (default : mascaret folder of the plugin)')
+    parser.add_argument('--prefix', default=os.environ.get('QGIS_PREFIX_PATH'), help='QGIS prefix path')
+    parser.add_argument('--log', default=None, help='log file')
+    parser.add_argument('--debug', action='store_true')
+    return parser
+
+
+def main(argv=None):
+    args = parser_args().parse_args(argv)
+
+    qgs = QgsApplication([], False)
+    if args.prefix:
+        qgs.setPrefixPath(args.prefix, True)
+    qgs.initQgis()
+
+    mgis = ClassMascBatch(args.debug, args.nb_proc, args.log)
+    mdb = ClassMasDatabase(mgis, args.dbname, args.host, args.port, args.user, args.password)
+    mgis.mdb = mdb
+    mdb.connect_pg()
+    if mdb.con is None:
+        qgs.exitQgis()
+        return 1
+    if args.schema not in mdb.liste_models():
+        mgis.add_info('Error: model {0} not found.'.format(args.schema))
+        mdb.disconnect_pg()
+        qgs.exitQgis()
+        return 1
+    mdb.SCHEMA = args.schema
+    mdb.check_model()
+
+    clam = ClassMascaret(mgis)
+    if args.work:
+        work = os.path.abspath(args.work)
+        if not os.path.isdir(work):
+            os.makedirs(work)
+        clam.set_dossier(work)
+        clam.dossierFileStage = work + '_scen'
+    if args.tracer:
+        if len(args.scenario) != 1:
+            mgis.add_info('Error: --tracer needs one scenario.')
+            ok = False
+        else:
+            ok = clam.lit_tracer(args.run, args.scenario[0], clam.baseName)
+        mdb.disconnect_pg()
+        qgs.exitQgis()
+        return 0 if ok else 1
+    clam.batch = {'scenarios': args.scenario,
+                  'comments': args.comments.replace("'", "''").replace('"', ' '),
+                  'overwrite': args.overwrite,
+                  'init': args.init}
+    clam.mascaret(args.kernel, args.run)
+
+    mdb.disconnect_pg()
+    qgs.exitQgis()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
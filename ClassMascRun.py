@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+Name                 : Mascaret
+Description          : Pre and Postprocessing for Mascaret for QGIS
+Date                 : June,2017
+copyright            : (C) 2017 by Artelia
+email                :
+***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+import os
+import re
+import sys
+from xml.etree.ElementTree import parse as et_parse
+
+from qgis.PyQt.QtCore import QProcess
+
+# time printed by the kernel, ex: "TEMPS = 3600.0" or "Time : 0.36D+04"
+TEMPS = re.compile(r'\b(?:temps|time)\b[^0-9+\-]{0,20}([-+]?\d+(?:\.\d*)?(?:[EeDd][-+]?\d+)?)',
+                   re.IGNORECASE)
+
+
+def soft_mascaret():
+    """ name of the kernel executable, None if the platform isn't supported"""
+    test = sys.platform
+    # Linux(2.x and 3.x) ='linux2'
+    # Windows = 'win32'
+    # Windows / Cygwin = 'cygwin'
+    # MacOSX = 'darwin'
+    if 'linux' in test or test == 'cygwin':
+        return "mascaret_linux"
+    elif test == 'win32':
+        return "mascaret.exe"
+    return None
+
+
+def duree_xcas(fich_xcas):
+    """
+    Initial and final times of the simulation read in the xcas file
+
+    Returns:
+        tuple: (tinit, tfin), None if the final time is unknown
+    """
+    try:
+        racine = et_parse(fich_xcas).getroot()
+        param = racine[0].find('parametresTemporels')
+        tinit = float(param.find('tempsInit').text)
+        critere = int(param.find('critereArret').text)
+        if critere == 1:
+            tfin = float(param.find('tempsMax').text)
+        elif critere == 2:
+            tfin = tinit + float(param.find('pasTemps').text) * float(param.find('nbPasTemps').text)
+        else:
+            return None
+    except Exception:
+        return None
+    if tfin <= tinit:
+        return None
+    return tinit, tfin
+
+
+class ClassMascRun(object):
+    """
+    Run of the Mascaret kernel in a QProcess.
+    The output is sent to the log line by line, the progress is read
+    from the time printed by the kernel and the run can be canceled.
+    The working directory is the one of the process, the cwd of QGIS isn't changed.
+    """
+
+    def __init__(self, mgis, dossier, fichier_cas, label=''):
+        """
+        Args:
+            mgis: main plugin (add_info)
+            dossier (str): run folder
+            fichier_cas (str): xcas file name
+            label (str): prefix of the output lines
+        """
+        self.mgis = mgis
+        self.dossier = dossier
+        self.fichier_cas = fichier_cas
+        self.label = label
+        self.duree = duree_xcas(os.path.join(dossier, fichier_cas))
+        self.progress = 0.
+        self.reste = ''
+        self.annule = False
+        self.termine = False
+        self.erreur = False
+        self.proc = QProcess()
+        self.proc.setWorkingDirectory(dossier)
+        self.proc.setProcessChannelMode(QProcess.MergedChannels)
+        self.proc.readyReadStandardOutput.connect(self.lit_sortie)
+        self.proc.finished.connect(self.fin)
+
+    def start(self):
+        """ Start the kernel, return False if error"""
+        soft = soft_mascaret()
+        if soft is None:
+            self.mgis.add_info("{0} platform  doesn't allow to run simulation.".format(sys.platform))
+            return False
+        with open(os.path.join(self.dossier, 'FichierCas.txt'), 'w') as fichier:
+            fichier.write("'" + self.fichier_cas + "'\n")
+        self.proc.start(os.path.join(self.dossier, soft), [])
+        if not self.proc.waitForStarted():
+            self.mgis.add_info("Error: {0}".format(self.proc.errorString()))
+            self.termine = True
+            self.erreur = True
+            return False
+        self.proc.closeWriteChannel()
+        return True
+
+    def lit_sortie(self):
+        """ read the available output"""
+        data = bytes(self.proc.readAllStandardOutput())
+        txt = self.reste + data.decode('utf-8', 'replace')
+        lignes = txt.split('\n')
+        self.reste = lignes.pop()
+        for ligne in lignes:
+            self.ligne(ligne.rstrip('\r'))
+
+    def ligne(self, ligne):
+        """ one line of output"""
+        if not ligne.strip():
+            return
+        self.mgis.add_info('{0}{1}'.format(self.label, ligne))
+        if self.duree is None:
+            return
+        res = TEMPS.search(ligne)
+        if res:
+            try:
+                t = float(res.group(1).replace('D', 'E').replace('d', 'e'))
+            except ValueError:
+                return
+            tinit, tfin = self.duree
+            self.progress = min(max((t - tinit) / (tfin - tinit), self.progress), 1.)
+
+    def fin(self, *args):
+        """ end of the process"""
+        self.lit_sortie()
+        if self.reste:
+            self.ligne(self.reste)
+            self.reste = ''
+        self.termine = True
+        if not self.annule and self.proc.exitStatus() != QProcess.NormalExit:
+            self.erreur = True
+        self.progress = 1.
+
+    def cancel(self):
+        """ stop the kernel"""
+        if not self.termine:
+            self.annule = True
+            self.proc.kill()
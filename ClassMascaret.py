@@ -19,23 +19,25 @@ email                :
 
 """
 
-import csv
 import datetime
+import multiprocessing
 import os
-import re
 import shutil
-import subprocess
 import sys
 from xml.etree.ElementTree import ElementTree, Element, SubElement
 from xml.etree.ElementTree import parse as et_parse
 
-from qgis.PyQt.QtCore import qVersion
+import numpy as np
+from qgis.PyQt.QtCore import qVersion, QEventLoop, QTimer
 from qgis.core import *
 from qgis.gui import *
 from qgis.utils import *
 
 from .Function import str2bool, copy_dir_to_dir
 from .Function import del_symbol
+from .ClassMascRun import ClassMascRun
+from .ClassObservation import ClassObsFormule
+from .ClassReadOpt import ClassReadOpt, merge_tracer
 from .WaterQuality.ClassMascWQ import ClassMascWQ
 from .ui.custom_control import ClassWarningBox
 
@@ -57,6 +59,8 @@ class ClassMascaret:
             os.mkdir(self.dossierFileMasc)
         self.dossierFileMascOri = os.path.join(self.mgis.masplugPath, "mascaret_ori")
         self.dossierFile_bin = os.path.join(self.mgis.masplugPath, "bin")
+        # run folders of the scenarios run at the same time
+        self.dossierFileStage = os.path.join(self.mgis.masplugPath, "mascaret_scen")
         self.baseName = "mascaret"
         self.nomfichGEO = self.baseName + ".geo"
         self.box = ClassWarningBox(self.mgis)
@@ -65,138 +69,140 @@ class ClassMascaret:
         # kernel list
         self.Klist = ["steady", "unsteady", "transcritical"]
         self.wq = ClassMascWQ(self.mgis, self.dossierFileMasc)
+        # answers of the dialogs for a run without GUI (see ClassMascBatch)
+        # {'scenarios': [...], 'comments': '', 'overwrite': False, 'init': 'run:scenario' or '.lig' file}
+        self.batch = None
 
     def creer_geo(self):
         """creation of gemoetry file"""
-        try:
-            nomfich = os.path.join(self.dossierFileMasc, self.baseName + '.geo')
-
-            if os.path.isfile(nomfich):
-                sauv = nomfich.replace(".geo", "_old.geo")
-                shutil.move(nomfich, sauv)
-            requete = self.mdb.select("profiles", "active", "abscissa")
-
-            with open(nomfich, 'w') as fich:
-                for i, nom in enumerate(requete["name"]):
-                    branche = requete["branchnum"][i]
-                    abs = requete["abscissa"][i]
-                    temp_x = requete["x"][i]
-                    temp_z = requete["z"][i]
-                    lit_min_g = requete["leftminbed"][i]
-                    lit_min_d = requete["rightminbed"][i]
-                    if lit_min_d is not None and lit_min_g is None:
-                        lit_min_g = 0.0
-
-                    if branche and abs and temp_x and temp_z and lit_min_g and lit_min_d:
-                        # tabX = list(map(lambda x: round(float(x), 2), temp_x.split()))
-                        # tab_z = list(map(lambda x: round(float(x), 2), temp_z.split()))
-                        tab_z = []
-                        tab_x = []
-                        # fct1 = lambda x: round(float(x), 2)
-                        for var1, var2 in zip(temp_x.split(), temp_z.split()):
-                            tab_x.append(self.around(var1))
-                            tab_z.append(self.around(var2))
-
-                        fich.write('PROFIL Bief_{0} {1} {2}\n'.format(branche,
-                                                                      nom, abs))
-                        for x, z in zip(tab_x, tab_z):
-                            if lit_min_g <= x <= lit_min_d:
-                                type = "B"
-                            else:
-                                type = "T"
-
-                            fich.write('{0:.2f} {1:.2f} {2}\n'.format(x, z, type))
-            self.mgis.add_info("Creation the geometry is done")
-        except Exception as e:
-            self.mgis.add_info("Error: save the geometry")
-            self.mgis.add_info(str(e))
+        self.ecrit_geo(georef=False)
 
     def creer_geo_ref(self):
-        # """creation of gemoetry file"""
+        """creation of georeferenced gemoetry file"""
+        self.ecrit_geo(georef=True)
+
+    def ecrit_geo(self, georef=True):
+        """
+        Creation of the geometry file by the database : the points of the profiles,
+        their bed type and coordinates are computed in one query and
+        the lines are written in the file with COPY.
+        For the georeferenced file, the points are placed on the profiles
+        extended (centred) up to their last abscissa, the extension is saved after.
+        """
         try:
             nomfich = os.path.join(self.dossierFileMasc, self.baseName + '.geo')
 
             if os.path.isfile(nomfich):
                 sauv = nomfich.replace(".geo", "_old.geo")
                 shutil.move(nomfich, sauv)
-            requete = self.mdb.select("profiles", "active", "abscissa")
 
-            # To get projection and Line coordinated.
-            vlayer = self.mdb.make_vlayer(self.mdb.register['profiles'])
-            vlayer_dp = vlayer.dataProvider()
-            vlayer_crs = vlayer_dp.crs()
-            vlayer_crs_str = vlayer_crs.authid()
+            if georef:
+                sql = "SELECT auth_name, auth_srid FROM spatial_ref_sys " \
+                      "WHERE srid = (SELECT ST_SRID(geom) FROM {0}.profiles WHERE geom IS NOT NULL LIMIT 1);"
+                rows = self.mdb.run_query(sql.format(self.mdb.SCHEMA), fetch=True)
+                proj = '{0}:{1}'.format(rows[0][0], rows[0][1]) if rows else ''
 
-            # Write the File
             with open(nomfich, 'w') as fich:
-
-                fich.write('#  DATE : {0:%d/%m/%Y %H:%M:%S}\n'
-                           '#  PROJ. : {1}\n'.format(datetime.date.today(), vlayer_crs_str))
-
-                iter = vlayer.getFeatures()
-                feature_list = [v for v in iter]
-                name_feature = [v['name'] for v in feature_list]
-                for i, nom in enumerate(requete["name"]):
-                    if nom in name_feature:
-                        id = name_feature.index(nom)
-                        # fetch geometry
-                        geom = feature_list[id].geometry()
-                        branche = requete["branchnum"][i]
-                        abs = requete["abscissa"][i]
-                        temp_x = requete["x"][i]
-                        temp_z = requete["z"][i]
-                        lit_min_g = requete["leftminbed"][i]
-                        lit_min_d = requete["rightminbed"][i]
-                        if lit_min_d is not None and lit_min_g is None:
-                            lit_min_g = 0.0
-                        if branche is not None and abs is not None and temp_x is not None \
-                                and temp_z is not None and lit_min_g is not None and lit_min_d is not None:
-                            tab_z = []
-                            tab_x = []
-                            # fct1 = lambda x: round(float(x), 2)
-                            for var1, var2 in zip(temp_x.split(), temp_z.split()):
-                                tab_x.append(self.around(var1))
-                                tab_z.append(self.around(var2))
-                            # tab_x = list(map(lambda x: round(float(x), 2), temp_x.split()))
-                            # tab_z = list(map(lambda x: round(float(x), 2), tempZ.split()))
-
-                            points = geom.asMultiPolyline()[0]
-                            (cood1X, cood1Y) = points[0]
-                            (cood2X, cood2Y) = points[1]
-                            cood_axe_x = cood1X + (cood2X - cood1X) / 2.
-                            cood_axe_y = cood1Y + (cood2Y - cood1Y) / 2.
-
-                            fich.write('PROFIL Bief_{0} {1} {2} {3} {4} {5} {6} AXE {7} {8}\n'.format(branche, nom, abs,
-                                                                                                      cood1X, cood1Y,
-                                                                                                      cood2X, cood2Y,
-                                                                                                      cood_axe_x,
-                                                                                                      cood_axe_y))
-                            dif = tab_x[-1] - geom.length()
-                            if dif > 0:
-                                dif += 1
-                                # garde line centree
-                                geom = geom.extendLine(dif / 2., dif / 2.)
-                                feature_list[id].setGeometry(geom)
-                                # change geometry
-                                vlayer.startEditing()
-                                vlayer.updateFeature(feature_list[id])
-                                # Call commit to save the changes
-                                vlayer.commitChanges()
-
-                            for x, z in zip(tab_x, tab_z):
-                                if lit_min_g <= x <= lit_min_d:
-                                    type = "B"
-                                else:
-                                    type = "T"
-                                # interpolate the distance on profile
-                                dpoint = geom.interpolate(x).asPoint()
-                                fich.write('{0:.2f} {1:.2f} {2} {3} {4}\n'.format(x, z, type, dpoint[0], dpoint[1]))
-
-            self.mgis.add_info("Creation the geometry is done")
+                if georef:
+                    fich.write('#  DATE : {0:%d/%m/%Y %H:%M:%S}\n'
+                               '#  PROJ. : {1}\n'.format(datetime.date.today(), proj))
+                fich.flush()
+                ok = self.mdb.copy_query(self.sql_geo(georef), fich)
+
+            if ok and georef and self.mdb.run_query(self.sql_extend_profiles()) is None:
+                self.mgis.add_info("Error: extension of the profiles")
+            if ok:
+                self.mgis.add_info("Creation the geometry is done")
+            else:
+                self.mgis.add_info("Error: save the geometry")
         except Exception as e:
             self.mgis.add_info("Error: save the geometry")
             self.mgis.add_info(str(e))
-            # Fonction de creation du fichier .casier avec la loi surface-volume
+
+    def sql_profiles(self):
+        """ active profiles which can be written in the geometry file"""
+        sql = """SELECT gid, name, branchnum, abscissa,
+                        COALESCE(leftminbed, 0.) AS lit_min_g, rightminbed AS lit_min_d,
+                        tab_x, tab_z, ST_GeometryN(geom, 1) AS line
+                 FROM {0}.profiles
+                 WHERE active AND branchnum IS NOT NULL AND abscissa IS NOT NULL
+                       AND tab_x IS NOT NULL AND tab_z IS NOT NULL AND rightminbed IS NOT NULL"""
+        return sql.format(self.mdb.SCHEMA)
+
+    @staticmethod
+    def sql_float(expr):
+        """ text of a float expression written as python does (1500 -> 1500.0)"""
+        return "(CASE WHEN ({0}) = trunc({0}) AND abs({0}) < 1e16 " \
+               "THEN trunc({0})::bigint || '.0' ELSE ({0})::text END)".format(expr)
+
+    def sql_geo(self, georef=True):
+        """ query of the lines of the geometry file"""
+        fl = self.sql_float
+        if georef:
+            # the header gives the points of the profile before its extension
+            entete = "format('PROFIL Bief_%s %s %s %s %s %s %s AXE %s %s', branchnum, name, {0}, " \
+                     "{1}, {2}, {3}, {4}, {5}, {6})".format(fl('abscissa'), fl('x1'), fl('y1'), fl('x2'), fl('y2'),
+                                                           fl('x1 + (x2 - x1) / 2.'), fl('y1 + (y2 - y1) / 2.'))
+            tete = "(SELECT *, ST_X(ST_PointN(line, 1)) AS x1, ST_Y(ST_PointN(line, 1)) AS y1, " \
+                   "ST_X(ST_PointN(line, 2)) AS x2, ST_Y(ST_PointN(line, 2)) AS y2 FROM prof) AS h"
+            point = "format('%s %s %s %s %s', x, z, typ, {0}, {1})".format(fl('ST_X(pt)'), fl('ST_Y(pt)'))
+            coord = ", ST_LineInterpolatePoint(ext, LEAST(GREATEST(x / NULLIF(ST_Length(ext), 0), 0.), 1.)) AS pt"
+            ext = ",\n                      e AS ({0})".format(self.sql_extension())
+            prof = "SELECT p.*, COALESCE(e.ext, p.line) AS ext FROM p LEFT JOIN e USING (gid) " \
+                   "WHERE p.line IS NOT NULL"
+        else:
+            entete = "format('PROFIL Bief_%s %s %s', branchnum, name, {0})".format(fl('abscissa'))
+            tete = "prof"
+            point = "format('%s %s %s', x, z, typ)"
+            coord = ""
+            ext = ""
+            prof = "SELECT p.*, NULL::geometry AS ext FROM p"
+        sql = """WITH p AS ({0}){1},
+                      prof AS (SELECT row_number() OVER (ORDER BY abscissa) AS num, * FROM ({2}) AS pe),
+                      pts AS (SELECT prof.num, u.ord, round(u.x::numeric, 2) AS x, round(u.z::numeric, 2) AS z,
+                                     CASE WHEN lit_min_g <= round(u.x::numeric, 2)
+                                               AND round(u.x::numeric, 2) <= lit_min_d
+                                          THEN 'B' ELSE 'T' END AS typ,
+                                     prof.ext
+                              FROM prof, unnest(prof.tab_x, prof.tab_z) WITH ORDINALITY AS u(x, z, ord)
+                              WHERE u.x IS NOT NULL AND u.z IS NOT NULL)
+                 SELECT ligne FROM (
+                     SELECT num, 0 AS ord, {3} AS ligne FROM {4}
+                     UNION ALL
+                     SELECT num, ord, {5} FROM (SELECT *{6} FROM pts) AS t
+                 ) AS lignes
+                 ORDER BY num, ord"""
+        return sql.format(self.sql_profiles(), ext, prof, entete, tete, point, coord)
+
+    def sql_extension(self):
+        """ lines (of the p query) shorter than the last abscissa, extended (centred)"""
+        sql = """SELECT gid, ST_SetPoint(ST_SetPoint(line, 0,
+                            ST_Translate(a0, (ST_X(a0) - ST_X(a1)) / ST_Distance(a0, a1) * d,
+                                             (ST_Y(a0) - ST_Y(a1)) / ST_Distance(a0, a1) * d)),
+                            ST_NPoints(line) - 1,
+                            ST_Translate(b0, (ST_X(b0) - ST_X(b1)) / ST_Distance(b0, b1) * d,
+                                             (ST_Y(b0) - ST_Y(b1)) / ST_Distance(b0, b1) * d)) AS ext
+                 FROM (SELECT gid, line,
+                              (round(tab_x[array_length(tab_x, 1)]::numeric, 2) - ST_Length(line) + 1) / 2. AS d,
+                              ST_PointN(line, 1) AS a0, ST_PointN(line, 2) AS a1,
+                              ST_PointN(line, ST_NPoints(line)) AS b0,
+                              ST_PointN(line, ST_NPoints(line) - 1) AS b1
+                       FROM p
+                       WHERE line IS NOT NULL
+                             AND round(tab_x[array_length(tab_x, 1)]::numeric, 2) > ST_Length(line)) AS l"""
+        return sql
+
+    def sql_extend_profiles(self):
+        """ save the extension (centred) of the profiles shorter than their last abscissa"""
+        sql = """WITH p AS ({0}),
+                      e AS ({1})
+                 UPDATE {2}.profiles AS prof
+                 SET geom = ST_Multi(e.ext)
+                 FROM e
+                 WHERE prof.gid = e.gid;"""
+        return sql.format(self.sql_profiles(), self.sql_extension(), self.mdb.SCHEMA)
+
+        # Fonction de creation du fichier .casier avec la loi surface-volume
 
     def creer_geo_casier(self):
         try:
@@ -211,13 +217,10 @@ class ClassMascaret:
             with open(nomfich, 'w') as fich:
                 for i, nom in enumerate(casiers["name"]):
                     fich.write('CASIER {0}\n'.format(nom))
-                    cotes = casiers["level"][i]
-                    surfaces = casiers["area"][i]
-                    volumes = casiers["volume"][i]
-                    for j, cote in enumerate(cotes.split()):
-                        fich.write(
-                            '{0:.2f} {1:.2f} {2:.2f}\n'.format(float(cotes.split()[j]), float(surfaces.split()[j]),
-                                                               float(volumes.split()[j])))
+                    fich.writelines('{0:.2f} {1:.2f} {2:.2f}\n'.format(cote, surf, vol)
+                                    for cote, surf, vol in zip(casiers["tab_level"][i].tolist(),
+                                                               casiers["tab_area"][i].tolist(),
+                                                               casiers["tab_volume"][i].tolist()))
 
             self.mgis.add_info("Creation of the basin file is done")
         except Exception as e:
@@ -248,13 +251,12 @@ class ClassMascaret:
 
     def fmt_plani_casier(self, liste):
         liste_plani = []
-        for chaine_z in liste:
+        for liste_z in liste:
             try:
-                liste_z = chaine_z.split()
                 # Calcul des parties entieres et decimale de la planimetrie
-                plani_entier = int((float(liste_z[1]) - float(liste_z[0])) // 1)
+                plani_entier = int((liste_z[1] - liste_z[0]) // 1)
                 liste_plani.append(str(plani_entier))
-                plani_decimale = int((float(liste_z[1]) - float(liste_z[0])) % 1)
+                plani_decimale = int((liste_z[1] - liste_z[0]) % 1)
                 if plani_decimale > 0:
                     self.mgis.add_info("Simulation Error: the basin planimetry has to be an integer value")
             except:
@@ -488,8 +490,8 @@ class ClassMascaret:
                        'limDroitLitMaj': []}
 
         tab = zip(profils["abscissa"],
-                  profils["x"],
-                  profils["z"],
+                  profils["tab_x"],
+                  profils["tab_z"],
                   profils["leftstock"],
                   profils["rightstock"],
                   profils["branchnum"])
@@ -497,9 +499,8 @@ class ClassMascaret:
         for j, (abs, x, z, sg, sd, n) in enumerate(tab):
 
             try:
-                xx = [float(var) for var in x.split()]
-                zz = [float(var) for var in z.split()]
-                diff = max(zz) - min(zz)
+                diff = z.max() - z.min()
+                x_min, x_max = x.min(), x.max()
             except:
                 self.mgis.add_info("Check the {} profile if it's ok ".format(profils["name"][j]))
                 return dict_lois
@@ -522,12 +523,12 @@ class ClassMascaret:
                 if sg:
                     lim_gauch_lit_maj = sg
                 else:
-                    lim_gauch_lit_maj = min(xx)
+                    lim_gauch_lit_maj = x_min
 
                 if sd:
                     lim_droit_lit_maj = sd
                 else:
-                    lim_droit_lit_maj = max(xx)
+                    lim_droit_lit_maj = x_max
 
                 liste_stock["numProfil"].append(j + 1)
                 liste_stock["limGauchLitMaj"].append(lim_gauch_lit_maj)
@@ -665,14 +666,17 @@ class ClassMascaret:
             else:
                 try:
                     i = prof_seuil["name"].index(nom)
-                    long = len(prof_seuil['x'][i].split())
+                    long = prof_seuil['tab_x'][i].shape[0]
                     SubElement(struct, "nbPtLoiSeuil").text = str(long)
-                    SubElement(struct, "abscTravCrete").text = prof_seuil['x'][i]
-                    SubElement(struct, "cotesCrete").text = prof_seuil['z'][i]
+                    SubElement(struct, "abscTravCrete").text = self.fmt(prof_seuil['tab_x'][i].tolist())
+                    SubElement(struct, "cotesCrete").text = self.fmt(prof_seuil['tab_z'][i].tolist())
 
                 except:
                     msg = 'Profil de crete introuvable pour {}'
-                    QMessageBox.warning(None, 'Message', msg.format(nom))
+                    if self.batch is not None:
+                        self.mgis.add_info(msg.format(nom))
+                    else:
+                        QMessageBox.warning(None, 'Message', msg.format(nom))
                     return
 
             SubElement(struct, "gradient").text = "-0"
@@ -875,7 +879,7 @@ class ClassMascaret:
         cas = fichier_cas.find('parametresCas')
         casier = SubElement(cas, "parametresCasier")
         SubElement(casier, "nbCasiers").text = str(len(casiers["name"]))
-        SubElement(casier, "optionPlanimetrage").text = self.fmt_plani_casier(casiers["level"])
+        SubElement(casier, "optionPlanimetrage").text = self.fmt_plani_casier(casiers["tab_level"])
         SubElement(casier, "optionCalcul").text = "1"  # Todo
         SubElement(casier, "fichierGeomCasiers").text = "mascaret.casier"  # Todo
         SubElement(casier, "cotesInitiale").text = self.fmt_sans_none(casiers["initlevel"], '-1.0')
@@ -1123,15 +1127,13 @@ class ClassMascaret:
         :param date_fin:
         :return:
         """
-        pattern = re.compile('([A-Z][0-9]{7})\\[t([+-][0-9]+)?\\]')
         somme = 0
         debit_prec = 0
-        obs = {}
         duree = int((date_fin - date_debut).total_seconds() / 3600)
 
-        # liste_date = [date_debut + datetime.timedelta(hours=x)
-        # for x in range(duree)]
-
+        # all the stations of the event in one query by type
+        formules = {}
+        stations = {'Q': {}, 'H': {}}
         for nom, loi in dict_lois.items():
             if loi['type'] == 1:
                 type = 'Q'
@@ -1139,30 +1141,33 @@ class ClassMascaret:
                 type = 'H'
             else:
                 continue
+            formules[nom] = (type, ClassObsFormule(loi['formule']))
+            for cd_hydro, deltas in formules[nom][1].stations().items():
+                stations[type].setdefault(cd_hydro, set()).update(deltas)
+        for type, dico in stations.items():
+            if dico:
+                deltas = set.union(*dico.values())
+                self.mdb.obs.charge(list(dico.keys()), type,
+                                    date_debut + datetime.timedelta(hours=min(deltas)),
+                                    date_fin + datetime.timedelta(hours=max(deltas)))
+
+        for nom, (type, formule) in formules.items():
+            # dates of the law : dates of the first station with data
+            liste_date = np.zeros(0, dtype='datetime64[us]')
+            for cd_hydro, delta in formule.termes:
+                dt = datetime.timedelta(hours=delta)
+                dates = self.mdb.obs.serie(cd_hydro, type, date_debut + dt, date_fin + dt)[0]
+                if dates.shape[0] > 0:
+                    liste_date = dates - np.timedelta64(delta, 'h')
+                    break
 
-            liste_stations = pattern.findall(loi['formule'])
-
-            liste_date = None
-            for cd_hydro, delta in liste_stations:
-                if not delta:
-                    delta = '0'
-                dt = datetime.timedelta(hours=int(delta))
-                condition = """code ='{0}'
-                            AND type = '{1}'
-                            AND date >= '{2:%Y-%m-%d %H:%M}' 
-                            AND date <= '{3:%Y-%m-%d %H:%M}'
-                            """.format(cd_hydro,
-                                       type,
-                                       date_debut + dt,
-                                       date_fin + dt)
-
-                obs[cd_hydro] = self.mdb.select('observations',
-                                                condition,
-                                                'code, date')
-
-                if not liste_date:
-                    # liste_date = map(lambda x: x - dt, obs[cd_hydro]['date'])
-                    liste_date = [x - dt for x in obs[cd_hydro]['date']]
+            # values of each term at the dates of the law
+            valeurs = [self.mdb.obs.valeurs(cd_hydro, type, liste_date + np.timedelta64(delta, 'h'))
+                       for cd_hydro, delta in formule.termes]
+            resultat = formule.evalue(valeurs)
+            valide = ~np.isnan(resultat)
+            tps = (liste_date[valide] - np.datetime64(date_debut)) / np.timedelta64(1, 's') / 3600.
+            resultat = resultat[valide]
 
             fichier_loi = os.path.join(self.dossierFileMasc, del_symbol(nom) + '.loi')
             valeur_init = None
@@ -1174,31 +1179,12 @@ class ClassMascaret:
                 else:
                     fich_sortie.write('# Temps (H) Hauteur\n')
                 fich_sortie.write(' H \n')
-                for t in liste_date:
-                    calc = loi['formule']
-                    for cd_hydro, delta in liste_stations:
-                        if not delta:
-                            delta = '0'
-                        t2 = t + datetime.timedelta(hours=int(delta))
-                        if t2 in obs[cd_hydro]['date']:
-                            i = obs[cd_hydro]['date'].index(t2)
-                            val = obs[cd_hydro]['valeur'][i]
-                        else:
-                            val = None
-                        calc = pattern.sub(str(val), calc, 1)
+                chaine = '  {0:4.3f}   {1:3.6f}\n'
+                fich_sortie.writelines(chaine.format(t, val) for t, val in zip(tps.tolist(), resultat.tolist()))
 
-                    try:
-                        resultat = eval(calc)
-                    except:
-                        resultat = None
-
-                    if resultat is not None:
-                        if valeur_init is None:
-                            valeur_init = resultat
-                            somme += resultat
-                        tps = (t - date_debut).total_seconds() / 3600
-                        chaine = '  {0:4.3f}   {1:3.6f}\n'
-                        fich_sortie.write(chaine.format(tps, resultat))
+            if resultat.shape[0] > 0:
+                valeur_init = float(resultat[0])
+                somme += valeur_init
 
             if valeur_init is not None:
                 if type == "Q":
@@ -1211,13 +1197,8 @@ class ClassMascaret:
         for nom, loi in dict_lois.items():
             if loi['type'] != 5:
                 continue
-            condition = """name ='{0}' 
-                        AND type = {1}
-                        AND starttime <= '{2:%Y-%m-%d %H:%M}' 
-                        AND endtime >= '{3:%Y-%m-%d %H:%M}'
-                        """.format(nom, loi['type'], date_debut, date_fin)
-
-            temp = self.mdb.select_one('laws', condition)
+            condition = "name = %s AND type = %s AND starttime <= %s AND endtime >= %s"
+            temp = self.mdb.select_one('laws', condition, params=[nom, loi['type'], date_debut, date_fin])
             # cote = list(map(float, temp['z'].split()))
             # debit = list(map(float, temp['flowrate'].split()))
             cote = [float(var) for var in temp['z'].split()]
@@ -1240,7 +1221,9 @@ class ClassMascaret:
 
     def fct_comment(self):
         liste_col = self.mdb.list_columns('runs')
-        if 'comments' in liste_col:
+        if 'comments' in liste_col and self.batch is not None:
+            comments = self.batch.get('comments', '')
+        elif 'comments' in liste_col:
             comments, ok = QInputDialog.getText(QWidget(), 'Comments',
                                                 'if you want to input a comment :')
             if not ok:
@@ -1282,9 +1265,16 @@ class ClassMascaret:
             listexclu = []
             if len(dict_scen_tmp['name']) == 0:
                 self.mgis.add_info("Warning: scenario not found")
+            if self.batch is not None and self.batch.get('scenarios'):
+                for scen in self.batch['scenarios']:
+                    if scen not in dict_scen_tmp['name']:
+                        self.mgis.add_info("Warning: scenario {0} not found in events".format(scen))
             for i, scen in enumerate(dict_scen_tmp['name']):
                 # self.mgis.add_info("scen******************* {}".format(scen))
-                if not self.check_scenar(scen, run):
+                if self.batch is not None and self.batch.get('scenarios') \
+                        and scen not in self.batch['scenarios']:
+                    listexclu.append(i)
+                elif not self.check_scenar(scen, run):
                     self.mgis.add_info("Canceled Simulation because of {0} already exists.".format(scen))
                     listexclu.append(i)
             if listexclu:
@@ -1296,6 +1286,20 @@ class ClassMascaret:
             else:
                 dict_scen = dict_scen_tmp
             comments = self.fct_comment()
+        elif self.batch is not None:
+            dict_scen = {'name': []}
+            if not self.batch.get('scenarios'):
+                self.mgis.add_info("Error: no scenario name.")
+                return
+            for scen in self.batch['scenarios']:
+                scen = scen.replace("'", " ").replace('"', ' ')
+                if self.check_scenar(scen, run):
+                    dict_scen['name'].append(scen)
+                else:
+                    self.mgis.add_info("Canceled Simulation because of {0} already exists.".format(scen))
+            if not dict_scen['name']:
+                return
+            comments = self.fct_comment()
         else:
             scen, ok = QInputDialog.getText(QWidget(), 'Scenario name',
                                             'Please input a scenario name :')
@@ -1308,12 +1312,6 @@ class ClassMascaret:
 
             dict_scen = {'name': [scen]}
 
-        # progressMessageBar = self.iface.messageBar().createMessage(
-        #     "Run ...")
-        # self.iface.messageBar().pushWidget(progressMessageBar, self.iface.messageBar().INFO)
-
-        date_debut = None
-
         dict_lois = self.creer_xcas(noyau)
         if self.mgis.DEBUG:
             self.mgis.add_info("Xcas file is created.")
@@ -1325,232 +1323,408 @@ class ClassMascaret:
         if self.mgis.DEBUG:
             self.mgis.add_info("Tracer files are created.")
 
+        cond_casier = False
+        if par["presenceCasiers"] and noyau == "unsteady":
+            cond_casier = True
+        ctx = {'noyau': noyau, 'run': run, 'par': par, 'comments': comments,
+               'dict_lois': dict_lois, 'dict_scen': dict_scen, 'casier': cond_casier}
+
+        nb_proc = self.nb_proc(len(dict_scen['name']))
+        jobs = []
         for i, scen in enumerate(dict_scen['name']):
-            if self.mgis.DEBUG:
-                self.mgis.add_info("The current scenario is {}".format(scen))
-            if noyau == "steady":
-                if par['presenceTraceurs']:
-                    if self.wq.dico_phy[self.wq.cur_wq_mod]['meteo']:
-                        self.wq.create_filemet()
-                # steady
-                for nom, l in dict_lois.items():
-                    if "valeurperm" not in l.keys():
-                        continue
-                    if l["valeurperm"] is None:
-                        self.mgis.add_info("Error : Add the 'valeurprerm' value in extremities.")
+            jobs.append({'num': i, 'scen': scen, 'date_debut': None, 'steps': [],
+                         'dossier': self.stage_dir(i, nb_proc > 1)})
+        if nb_proc > 1:
+            self.mgis.add_info("{0} simulations run at the same time.".format(nb_proc))
+        self.run_jobs(jobs, ctx, nb_proc)
+
+        if self.iface is not None:
+            self.iface.messageBar().clearWidgets()
+        self.mgis.add_info("Simulation finished")
+        return
 
-                    try:
-                        liste_ = ['pasTemps', 'critereArret', 'nbPasTemps', 'tempsMax', 'tempsInit']
-                        temp_dic = {}
-                        for info in liste_:
-                            condition = "parametre ='{}'".format(info)
-                            dtemp = self.mdb.select_distinct('steady', 'parametres', condition)
-                            temp_dic[info] = dtemp['steady'][0]
-                    except Exception as e:
-                        self.mgis.add_info(str(e))
-                        return
-                    if temp_dic['critereArret'] == 1:
-                        tfinal = temp_dic['tempsMax']
-                    elif temp_dic['critereArret'] == 2:
-                        tfinal = temp_dic['tempsInit'] + temp_dic['pasTemps'] * temp_dic['nbPasTemps']
-                    elif temp_dic['critereArret'] == 3:
-                        tfinal = 365 * 24 * 3600
-                    if l['type'] == 1:
-                        tab = {"time": [0, tfinal], 'flowrate': [l["valeurperm"]] * 2}
-                    else:
-                        # In steady case the other type don't exist
-                        l['type'] = 2
-                        tab = {"time": [0, tfinal], 'z': [l["valeurperm"]] * 2}
-
-                    self.creer_loi(nom, tab, l['type'])
-
-            elif par["evenement"]:
-                # transcritical unsteady evenement
-                date_debut = dict_scen['starttime'][i]
-                date_fin = dict_scen['endtime'][i]
-                duree = int((date_fin - date_debut).total_seconds()) - 3600
-
-                tab = {"tempsMax": {'valeur': str(duree),
-                                    'balise1': 'parametresTemporels'},
-                       "titreCalcul": {'valeur': scen,
-                                       'balise1': 'parametresImpressionResultats'}
-                       }
-                self.modif_xcas(tab, self.baseName + '.xcas')
-                self.mgis.add_info("Xcas file is created.")
-                if par['presenceTraceurs']:
-                    if self.wq.dico_phy[self.wq.cur_wq_mod]['meteo']:
-                        self.wq.create_filemet(typ_time='date', datefirst=date_debut, dateend=date_fin)
-
-                self.obs_to_loi(dict_lois, date_debut, date_fin)
+    def prepare_scen(self, job, ctx):
+        """
+        Create the laws and the xcas of one scenario in its run folder
+        and add the simulations of the scenario in job['steps'].
 
-            else:
-                # transcritical unsteady hors evenement
-                if par['presenceTraceurs']:
-                    if self.wq.dico_phy[self.wq.cur_wq_mod]['meteo']:
-                        self.wq.create_filemet()
-
-                for nom, l in dict_lois.items():
-                    # dictLois.items() extremities liste
-                    condition = "name ='{0}' AND type={1}".format(nom, l["type"])
-                    # self.mgis.add_info('{}'.format(condition))
-                    try:
-                        temp = self.mdb.select_one('laws', condition)
-                    except Exception as e:
-                        self.mgis.add_info("Error: Please check if law {0} is correct. ".format(nom))
-                        self.mgis.add_info(str(e))
-                        return
+        Returns:
+            bool: False if the scenario can't be run
+        """
+        noyau = ctx['noyau']
+        run = ctx['run']
+        par = ctx['par']
+        dict_lois = ctx['dict_lois']
+        dict_scen = ctx['dict_scen']
+        i = job['num']
+        scen = job['scen']
+        if self.mgis.DEBUG:
+            self.mgis.add_info("The current scenario is {}".format(scen))
+        if noyau == "steady":
+            if par['presenceTraceurs']:
+                if self.wq.dico_phy[self.wq.cur_wq_mod]['meteo']:
+                    self.wq.create_filemet()
+            # steady
+            for nom, l in dict_lois.items():
+                if "valeurperm" not in l.keys():
+                    continue
+                if l["valeurperm"] is None:
+                    self.mgis.add_info("Error : Add the 'valeurprerm' value in extremities.")
+
+                try:
+                    liste_ = ['pasTemps', 'critereArret', 'nbPasTemps', 'tempsMax', 'tempsInit']
+                    temp_dic = {}
+                    for info in liste_:
+                        condition = "parametre ='{}'".format(info)
+                        dtemp = self.mdb.select_distinct('steady', 'parametres', condition)
+                        temp_dic[info] = dtemp['steady'][0]
+                except Exception as e:
+                    self.mgis.add_info(str(e))
+                    return False
+                if temp_dic['critereArret'] == 1:
+                    tfinal = temp_dic['tempsMax']
+                elif temp_dic['critereArret'] == 2:
+                    tfinal = temp_dic['tempsInit'] + temp_dic['pasTemps'] * temp_dic['nbPasTemps']
+                elif temp_dic['critereArret'] == 3:
+                    tfinal = 365 * 24 * 3600
+                if l['type'] == 1:
+                    tab = {"time": [0, tfinal], 'flowrate': [l["valeurperm"]] * 2}
+                else:
+                    # In steady case the other type don't exist
+                    l['type'] = 2
+                    tab = {"time": [0, tfinal], 'z': [l["valeurperm"]] * 2}
+
+                self.creer_loi(nom, tab, l['type'])
+
+        elif par["evenement"]:
+            # transcritical unsteady evenement
+            date_debut = dict_scen['starttime'][i]
+            job['date_debut'] = date_debut
+            date_fin = dict_scen['endtime'][i]
+            duree = int((date_fin - date_debut).total_seconds()) - 3600
+
+            tab = {"tempsMax": {'valeur': str(duree),
+                                'balise1': 'parametresTemporels'},
+                   "titreCalcul": {'valeur': scen,
+                                   'balise1': 'parametresImpressionResultats'}
+                   }
+            self.modif_xcas(tab, self.baseName + '.xcas')
+            self.mgis.add_info("Xcas file is created.")
+            if par['presenceTraceurs']:
+                if self.wq.dico_phy[self.wq.cur_wq_mod]['meteo']:
+                    self.wq.create_filemet(typ_time='date', datefirst=date_debut, dateend=date_fin)
 
-                    liste = ["z", "flowrate", "time", "z_upstream", "z_downstream",
-                             "z_lower", "z_up"]
-                    tab = {}
-                    for k, v in temp.items():
-                        if v and k in liste:
-                            tab[k] = [float(var) for var in v.split()]
+            self.obs_to_loi(dict_lois, date_debut, date_fin)
 
-                    self.creer_loi(nom, tab, l["type"])
-                    if self.mgis.DEBUG:
-                        self.mgis.add_info("Laws file is created.")
+        else:
+            # transcritical unsteady hors evenement
+            if par['presenceTraceurs']:
+                if self.wq.dico_phy[self.wq.cur_wq_mod]['meteo']:
+                    self.wq.create_filemet()
+
+            for nom, l in dict_lois.items():
+                # dictLois.items() extremities liste
+                temp = self.mdb.select_law(nom, l["type"])
+                if temp is None:
+                    self.mgis.add_info("Error: Please check if law {0} is correct. ".format(nom))
+                    self.mgis.add_info("The law {0} (type {1}) isn't in the laws table.".format(nom, l["type"]))
+                    return False
 
-                    if "valeurperm" not in l.keys():
-                        continue
+                liste = ["z", "flowrate", "time", "z_upstream", "z_downstream",
+                         "z_lower", "z_up"]
+                tab = {}
+                for k, v in temp.items():
+                    if v and k in liste:
+                        tab[k] = [float(var) for var in v.split()]
+
+                self.creer_loi(nom, tab, l["type"])
+                if self.mgis.DEBUG:
+                    self.mgis.add_info("Laws file is created.")
+
+                if "valeurperm" not in l.keys():
+                    continue
 
-                    nom = nom + "_init"
-                    # 3600 To change TODO
-                    if l["valeurperm"] is not None:
-                        if l['type'] == 1:
-                            tab = {"time": [0, 3600], 'flowrate': [l["valeurperm"]] * 2}
-                            self.creer_loi(nom, tab, 1)
-                        elif l['type'] in [2, 4, 5]:
-                            tab = {"time": [0, 3600], 'z': [l["valeurperm"]] * 2}
-                            self.creer_loi(nom, tab, 2)
-                        else:
-                            par["initialisationAuto"] = False
-                            self.mgis.add_info("No initialisation")
+                nom = nom + "_init"
+                # 3600 To change TODO
+                if l["valeurperm"] is not None:
+                    if l['type'] == 1:
+                        tab = {"time": [0, 3600], 'flowrate': [l["valeurperm"]] * 2}
+                        self.creer_loi(nom, tab, 1)
+                    elif l['type'] in [2, 4, 5]:
+                        tab = {"time": [0, 3600], 'z': [l["valeurperm"]] * 2}
+                        self.creer_loi(nom, tab, 2)
                     else:
                         par["initialisationAuto"] = False
-                        self.mgis.add_info("No initialisation because of no valeurperm for {} condition".format(nom))
-
-            if par["initialisationAuto"] and noyau is not "steady":
-                # add if name of init. exist previously
-                sceninit = scen + '_init'
-                if self.check_scenar(sceninit, run):
-                    self.mgis.add_info("========== Run initialization =========")
-                    self.mgis.add_info("Run = {} ;  Scenario = {} ; Kernel= {}".format(run, sceninit, noyau))
-                    self.lance_mascaret(self.baseName + '_init.xcas')
-                    self.lit_opt(run, sceninit, None,
-                                 self.baseName + '_init', comments)
-                else:
-                    self.mgis.add_info("No Run initialization.\n"
-                                       " The initial boundaries come from {} scenario.".format(sceninit))
-
-                self.opt_to_lig(run, sceninit, self.baseName)
-                tab = {"LigEauInit": {'valeur': 'true',
-                                      'balise1': 'parametresConditionsInitiales',
-                                      'balise2': 'ligneEau'}
-                       }
-                self.modif_xcas(tab, self.baseName + '.xcas')
-
-            elif par["LigEauInit"] and noyau != "steady":
-                # condition = "run LIKE 'Steady'"
-                # dico_run = self.mdb.select_distinct("scenario",
-                #                                    "runs", condition)
-                # dico_run = self.mdb.select("runs")
-                #
-                # if not dico_run and self.mgis.DEBUG:
-                #     self.mgis.add_info("There aren't scenarii for the Steady case.")
-                #     if self.mgis.DEBUG:
-                #         self.mgis.add_info("Cancel run")
-                #     return
-
-                # liste2=list(dico_run["scenario"])
-
-                dico_run = self.mdb.select_distinct("run",
-                                                    "runs")
-                if dico_run != {}:
-                    liste_run = ['{}'.format(v) for v in dico_run['run']]
+                        self.mgis.add_info("No initialisation")
                 else:
-                    liste_run = []
-                liste_run.append('".lig" File')
-                case, ok = QInputDialog.getItem(None,
-                                                'Initial run case ',
-                                                'Runs',
-                                                liste_run, 0, False)
+                    par["initialisationAuto"] = False
+                    self.mgis.add_info("No initialisation because of no valeurperm for {} condition".format(nom))
+
+        if par["initialisationAuto"] and noyau is not "steady":
+            # add if name of init. exist previously
+            sceninit = scen + '_init'
+            if self.check_scenar(sceninit, run):
+                # the initialization is run before the scenario
+                job['steps'].append({'scen': sceninit,
+                                     'xcas': self.baseName + '_init.xcas',
+                                     'fin': self.fin_init})
+            else:
+                self.mgis.add_info("No Run initialization.\n"
+                                   " The initial boundaries come from {} scenario.".format(sceninit))
+                self.lig_init(job, ctx)
 
-                if ok:
-                    if case == '".lig" File':
-                        self.copy_lig()
-                    else:
-                        condition = "run LIKE '{0}'".format(case)
-                        dico_scen = self.mdb.select_distinct("scenario",
-                                                             "runs", condition)
-                        liste_scen = ['{}'.format(v) for v in dico_scen["scenario"]]
-
-                        scen2, ok = QInputDialog.getItem(None,
-                                                         'Initial Scenario',
-                                                         'Initial Scenario',
-                                                         liste_scen, 0, False)
-
-                        if ok:
-                            self.opt_to_lig(case, scen2, self.baseName)
-                        else:
-                            if self.mgis.DEBUG:
-                                self.mgis.add_info("Cancel run")
-                            return
+        elif par["LigEauInit"] and noyau != "steady" and self.batch is not None:
+            if not self.lig_batch():
+                return False
 
+        elif par["LigEauInit"] and noyau != "steady":
+            # condition = "run LIKE 'Steady'"
+            # dico_run = self.mdb.select_distinct("scenario",
+            #                                    "runs", condition)
+            # dico_run = self.mdb.select("runs")
+            #
+            # if not dico_run and self.mgis.DEBUG:
+            #     self.mgis.add_info("There aren't scenarii for the Steady case.")
+            #     if self.mgis.DEBUG:
+            #         self.mgis.add_info("Cancel run")
+            #     return
+
+            # liste2=list(dico_run["scenario"])
+
+            dico_run = self.mdb.select_distinct("run",
+                                                "runs")
+            if dico_run != {}:
+                liste_run = ['{}'.format(v) for v in dico_run['run']]
+            else:
+                liste_run = []
+            liste_run.append('".lig" File')
+            case, ok = QInputDialog.getItem(None,
+                                            'Initial run case ',
+                                            'Runs',
+                                            liste_run, 0, False)
+
+            if ok:
+                if case == '".lig" File':
+                    self.copy_lig()
                 else:
-                    if self.mgis.DEBUG:
-                        self.mgis.add_info("Cancel run")
-                    return
+                    condition = "run LIKE '{0}'".format(case)
+                    dico_scen = self.mdb.select_distinct("scenario",
+                                                         "runs", condition)
+                    liste_scen = ['{}'.format(v) for v in dico_scen["scenario"]]
+
+                    scen2, ok = QInputDialog.getItem(None,
+                                                     'Initial Scenario',
+                                                     'Initial Scenario',
+                                                     liste_scen, 0, False)
+
+                    if ok:
+                        self.opt_to_lig(case, scen2, self.baseName)
+                    else:
+                        if self.mgis.DEBUG:
+                            self.mgis.add_info("Cancel run")
+                        return False
 
-            self.mgis.add_info("========== Run case  =========")
-            self.mgis.add_info("Run = {} ;  Scenario = {} ; Kernel= {}".format(run, scen, noyau))
-            cond_casier = False
-            if par["presenceCasiers"] and noyau == "unsteady":
-                cond_casier = True
-            finish = self.lance_mascaret(self.baseName + '.xcas',par['presenceTraceurs'], cond_casier)
-            if not finish:
-                self.mgis.add_info("Simulation error")
-                return
+            else:
+                if self.mgis.DEBUG:
+                    self.mgis.add_info("Cancel run")
+                return False
 
-            # Lecture de l'OPT des casiers et liaisons puis ecriture dans la table resultats
+        job['steps'].append({'scen': scen,
+                             'xcas': self.baseName + '.xcas',
+                             'fin': self.fin_scen})
+        return True
 
-            self.lit_opt(run, scen, date_debut, self.baseName, comments, par['presenceTraceurs'], cond_casier)
+    def lig_batch(self):
+        """ initial water line of a run without GUI : 'run:scenario' or .lig file"""
+        init = self.batch.get('init')
+        if not init:
+            self.mgis.add_info("Error: no initial water line (run:scenario or .lig file).")
+            return False
+        if init.lower().endswith('.lig'):
+            if not os.path.isfile(init):
+                self.mgis.add_info("Error: {0} not found.".format(init))
+                return False
+            shutil.copy(init, os.path.join(self.dossierFileMasc, self.baseName + '.lig'))
+        elif ':' in init:
+            case, scen = init.split(':', 1)
+            self.opt_to_lig(case, scen, self.baseName)
+        else:
+            self.mgis.add_info("Error: the initial water line {0} isn't 'run:scenario' or .lig file.".format(init))
+            return False
+        return True
 
-        self.iface.messageBar().clearWidgets()
-        self.mgis.add_info("Simulation finished")
-        return
+    def fin_init(self, job, ctx):
+        """ Load the results of the initialization and use them as initial water line"""
+        if not self.lit_opt(ctx['run'], job['scen'] + '_init', None,
+                            self.baseName + '_init', ctx['comments']):
+            # no initial water line : the scenario isn't run
+            job['steps'] = []
+            return
+        self.lig_init(job, ctx)
+
+    def lig_init(self, job, ctx):
+        """ initial water line of the scenario from the initialization results"""
+        self.opt_to_lig(ctx['run'], job['scen'] + '_init', self.baseName)
+        tab = {"LigEauInit": {'valeur': 'true',
+                              'balise1': 'parametresConditionsInitiales',
+                              'balise2': 'ligneEau'}
+               }
+        self.modif_xcas(tab, self.baseName + '.xcas')
+
+    def fin_scen(self, job, ctx):
+        """ Load the results of the scenario"""
+        self.lit_opt(ctx['run'], job['scen'], job['date_debut'], self.baseName, ctx['comments'],
+                     ctx['par']['presenceTraceurs'], ctx['casier'])
+
+    def nb_proc(self, nb_scen):
+        """ number of simulations run at the same time (option nb_proc, 0 : number of processors)"""
+        nb = getattr(self.mgis, 'nb_proc', 0)
+        if not nb or nb < 0:
+            try:
+                nb = multiprocessing.cpu_count()
+            except NotImplementedError:
+                nb = 1
+        return max(1, min(nb, nb_scen))
+
+    def stage_dir(self, num, parallel):
+        """ run folder of the scenario num"""
+        if not parallel:
+            return self.dossierFileMasc
+        return os.path.join(self.dossierFileStage, 'scen_{0}'.format(num))
+
+    def set_dossier(self, dossier):
+        """ change the run folder"""
+        self.dossierFileMasc = dossier
+        self.wq.dossierFileMasc = dossier
+
+    def stage(self, dossier):
+        """ copy the files of the model (geometry, xcas, laws, executable) in a scenario run folder"""
+        if dossier == self.dossierFileMasc:
+            return
+        if os.path.isdir(dossier):
+            shutil.rmtree(dossier)
+        os.makedirs(dossier)
+        copy_dir_to_dir(self.dossierFileMasc, dossier)
 
-    def lance_mascaret(self, fichier_cas,tracer=False, casier=False):
+    def run_jobs(self, jobs, ctx, nb_proc):
         """
-        Run mascaret
+        Run the scenarios, nb_proc simulations at the same time.
+        A scenario is prepared just before its first simulation and
+        its results are loaded in the database when the simulation is finished.
+        QGIS isn't frozen during the simulations : the progress is shown
+        in the message bar and the simulations can be canceled.
         """
-        os.chdir(self.dossierFileMasc)
-
-        with open('FichierCas.txt', 'w') as fichier:
-            fichier.write("'" + fichier_cas + "'\n")
-        test = sys.platform
-
-        if 'linux' in test or test == 'cygwin':
-            soft = "./mascaret_linux"
-        elif test == 'win32':
-            soft = "mascaret.exe"
-        else:
-            self.mgis.add_info("{0} platform  doesn't allow to run simulation.".format(test))
-            return False
-
-        # Linux(2.x and 3.x) ='linux2'
-        # Windows = 'win32'
-        # Windows / Cygwin = 'cygwin'
-        # MacOSX = 'darwin'
-        # OS / 2 = 'os2'
-        # OS / 2  EMX ='os2emx'
-        # RiscOS ='riscos'
-        # AtheOS= 'atheos
-        p = subprocess.Popen(soft, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-                             , stdin=subprocess.PIPE)
-        p.wait()
-        self.mgis.add_info("{0}".format(p.communicate()[0].decode("utf-8")))
-        return True
+        base = self.dossierFileMasc
+        attente = list(jobs)
+        en_cours = []
+        nb_fin = 0
+        stop = False
+        self.annule = False
+
+        loop = QEventLoop()
+        # the loop is also left periodically to update the progress bar
+        timer = QTimer()
+        timer.timeout.connect(loop.quit)
+        progress, bouton = self.progress_bar()
+
+        def annule():
+            self.annule = True
+            for job, step, runner in en_cours:
+                runner.cancel()
+            loop.quit()
+
+        if progress is not None:
+            bouton.clicked.connect(annule)
+        timer.start(500)
+        try:
+            while en_cours or (attente and not stop and not self.annule):
+                while attente and not stop and not self.annule and len(en_cours) < nb_proc:
+                    job = attente.pop(0)
+                    if not job.get('prepare'):
+                        self.set_dossier(base)
+                        try:
+                            self.stage(job['dossier'])
+                            self.set_dossier(job['dossier'])
+                            job['prepare'] = True
+                            ok = self.prepare_scen(job, ctx)
+                        except Exception as e:
+                            # the other scenarios are run
+                            self.mgis.add_info("Error: preparation of the scenario {0}".format(job['scen']))
+                            self.mgis.add_info(str(e))
+                            nb_fin += 1
+                            continue
+                        if not ok:
+                            stop = True
+                            break
+                    step = job['steps'].pop(0)
+                    if step['xcas'] == self.baseName + '.xcas':
+                        self.mgis.add_info("========== Run case  =========")
+                    else:
+                        self.mgis.add_info("========== Run initialization =========")
+                    self.mgis.add_info("Run = {} ;  Scenario = {} ; Kernel= {}".format(ctx['run'], step['scen'],
+                                                                                        ctx['noyau']))
+                    label = '[{0}] '.format(step['scen']) if nb_proc > 1 else ''
+                    runner = ClassMascRun(self.mgis, job['dossier'], step['xcas'], label)
+                    runner.proc.finished.connect(loop.quit)
+                    if not runner.start():
+                        self.mgis.add_info("Simulation error")
+                        stop = True
+                        break
+                    en_cours.append((job, step, runner))
+
+                if en_cours:
+                    loop.exec_()
+
+                for job, step, runner in list(en_cours):
+                    if not runner.termine:
+                        continue
+                    en_cours.remove((job, step, runner))
+                    if runner.annule:
+                        continue
+                    if runner.erreur:
+                        self.mgis.add_info("Simulation error")
+                        stop = True
+                        continue
+                    self.set_dossier(job['dossier'])
+                    try:
+                        step['fin'](job, ctx)
+                    except Exception as e:
+                        # the results of this scenario aren't loaded, the other ones are run
+                        self.mgis.add_info("Error: results of the scenario {0}".format(step['scen']))
+                        self.mgis.add_info(str(e))
+                        job['steps'] = []
+                    if job['steps']:
+                        # the scenario after its initialization
+                        attente.insert(0, job)
+                    else:
+                        nb_fin += 1
+
+                val = nb_fin + sum(runner.progress for job, step, runner in en_cours)
+                if progress is not None:
+                    progress.setValue(int(100. * val / len(jobs)))
+        finally:
+            timer.stop()
+            # no kernel left running in the scenario folders after an error
+            for job, step, runner in en_cours:
+                runner.cancel()
+                runner.proc.waitForFinished(3000)
+            self.set_dossier(base)
+        if self.annule:
+            self.mgis.add_info("Simulation canceled")
+
+    def progress_bar(self):
+        """ progress bar and cancel button of the simulations in the message bar"""
+        if self.iface is None:
+            return None, None
+        self.iface.messageBar().clearWidgets()
+        message = self.iface.messageBar().createMessage("Run ...")
+        progress = QProgressBar()
+        progress.setMaximum(100)
+        bouton = QPushButton("Cancel")
+        message.layout().addWidget(progress)
+        message.layout().addWidget(bouton)
+        self.iface.messageBar().pushWidget(message)
+        return progress, bouton
 
     def lit_opt(self, run, scen, date_debut, base_namefile, comments='', tracer=False, casier=False):
         nom_fich = os.path.join(self.dossierFileMasc, base_namefile + '.opt')
@@ -1561,31 +1735,33 @@ class ClassMascaret:
             self.mgis.add_info("Simulation Error: there aren't results")
             return False
 
-        t, pk, col, value = self.read_opt(nom_fich, date_debut, scen, run)
+        t = set([])
+        pk = set([])
+        reader = self.reader_opt(nom_fich)
+        col = list(reader.col)
+        batches = reader.batches()
         if tracer:
             nom_fich_tra = os.path.join(self.dossierFileMasc, base_namefile + '.tra_opt')
 
             if not os.path.isfile(nom_fich_tra):
                 self.mgis.add_info("Simulation Error: there aren't results for tracer")
                 return False
-            t_tra, pk_tra, col_tra, value_tra = self.read_opt(nom_fich_tra, date_debut, scen, run)
-            lind = []
-            for i, c in enumerate(col_tra):
-                if c not in col:
-                    col.append(c)
-                    lind.append(i)
-            # add value_tra in value list
-            for j, lignval in enumerate(value):
-                for i in lind:
-                    lignval.append(value_tra[j][i])
+            reader_tra = self.reader_opt(nom_fich_tra)
+            lcol = [c for c in reader_tra.col if c not in col]
+            col += lcol
+            # add tracer values in the batches
+            batches = merge_tracer(batches, reader_tra.batches(), lcol, self.mgis.add_info)
+        if date_debut:
+            col.append("date")
+        col.append("run")
+        col.append("scenario")
+
         maintenant = datetime.datetime.utcnow()
 
         tab = {run: {"scenario": scen,
-                     "date": "{:%Y-%m-%d %H:%M}".format(maintenant),
-                     "t": list(t),
-                     "pk": list(pk)}}
+                     "date": "{:%Y-%m-%d %H:%M}".format(maintenant)}}
 
-        listimport = ["run", "date", "pk", "scenario", "t"]
+        listimport = ["run", "date", "scenario"]
         if comments != '':
             tab[run]["comments"] = comments
             listimport.insert(1, "comments")
@@ -1593,66 +1769,99 @@ class ClassMascaret:
             tab[run]['wq'] = self.wq.cur_wq_mod
             listimport.append("wq")
 
-        self.mdb.insert("runs",
-                        tab,
-                        listimport,
-                        ",")
-        liste_col = self.mdb.list_columns("resultats")
-        for c in col:
-            if c.lower() not in liste_col:
-                self.mdb.add_columns("resultats", c.lower())
-
-        self.mdb.insert_res("resultats", value, col)
-
-        if casier:
-            nom_fich_bas = os.path.join(self.dossierFileMasc, base_namefile + '.cas_opt')
-            nom_fich_link = os.path.join(self.dossierFileMasc, base_namefile + '.liai_opt')
-
-            t_bas, pk_bas, col_bas, value_bas = self.read_opt(nom_fich_bas, date_debut, scen, run,
-                                                              init_col=['t', 'bnum'])
-            t_link, pk_link, col_link, value_link = self.read_opt(nom_fich_link, date_debut, scen, run,
-                                                                  init_col=['t', 'lnum'])
+        # the run, its results and its basins and links results are loaded in one transaction
+        with self.mdb.transaction():
+            self.mdb.insert("runs",
+                            tab,
+                            listimport,
+                            ",")
+            id_runs = self.mdb.get_id_run(run, scen)
+
+            # rows are streamed from the file to the partition of the run
+            var = self.mdb.load_results(id_runs, self.rows_opt(batches, date_debut, scen, run, t, pk), col)
+            if var is not None:
+                tab = {id_runs: {"t": ",".join(t),
+                                 "pk": ",".join(pk),
+                                 "var": ",".join(var)}}
+                self.mdb.update("runs", tab, var="id")
+
+            if casier and var is not None:
+                nom_fich_bas = os.path.join(self.dossierFileMasc, base_namefile + '.cas_opt')
+                nom_fich_link = os.path.join(self.dossierFileMasc, base_namefile + '.liai_opt')
+
+                for table, nom, init_col in [("resultats_basin", nom_fich_bas, ['t', 'bnum']),
+                                             ("resultats_links", nom_fich_link, ['t', 'lnum'])]:
+                    reader = self.reader_opt(nom, init_col)
+                    col = list(reader.col)
+                    if date_debut:
+                        col.append("date")
+                    col += ["run", "scenario"]
+                    self.mdb.insert_res(table, self.rows_opt(reader.batches(), date_debut, scen, run), col)
+                    if reader.rejets:
+                        self.mgis.add_info("Warning: {0} rows of {1} not loaded, unknown numbers : {2}".format(
+                            reader.rejets, os.path.basename(nom), sorted(reader.inconnus)))
+            echec = var is None or self.mdb.transaction_failed()
+        if echec:
+            self.mgis.add_info("Error: the results of {0} {1} are not loaded".format(run, scen))
+            return False
 
-            self.mdb.insert_res("resultats_basin", value_bas, col_bas)
-            self.mdb.insert_res("resultats_links", value_link, col_link)
+        return True
 
+    def lit_tracer(self, run, scen, base_namefile):
+        """ Import again the tracer results (.tra_opt) of a (run, scenario) already loaded"""
+        id_runs = self.mdb.get_id_run(run, scen)
+        if id_runs is None:
+            self.mgis.add_info("Error: there aren't results for {0} {1}".format(run, scen))
+            return False
+        nom_fich_tra = os.path.join(self.dossierFileMasc, base_namefile + '.tra_opt')
+        if not os.path.isfile(nom_fich_tra):
+            self.mgis.add_info("Simulation Error: there aren't results for tracer")
+            return False
+        reader = self.reader_opt(nom_fich_tra)
+        rows = (row for batch in reader.batches() for row in batch.tolist())
+        res = self.mdb.update_res(id_runs, rows, list(reader.col))
+        if res is None:
+            self.mgis.add_info("Error: the tracer results are not loaded")
+            return False
+        if self.mgis.DEBUG:
+            self.mgis.add_info("Tracer results of {0} {1} : {2} values updated, "
+                               "{3} values added".format(run, scen, res[0], res[1]))
         return True
 
     def opt_to_lig(self, run, scen, base_namefiles):
         """Creation of .lig file """
-        condition = "run='{0}' AND scenario='{1}'".format(run, scen)
+        id_runs = self.mdb.get_id_run(run, scen)
+        if id_runs is None:
+            self.mgis.add_info("No previous results to create the .lig file.")
+            return
+        condition = "id_runs={0}".format(id_runs)
 
-        t_max = self.mdb.select_max("t", "resultats", condition)
+        t_max = self.mdb.select_max("t", "results", condition)
         if t_max is None:
             self.mgis.add_info("No previous results to create the .lig file.")
-        condition = condition + " AND t=" + str(t_max)
-
-        result = self.mdb.select("resultats", condition, 'pk')
-        if not result:
-            self.mgis.add('No results for initialisation')
+            return
+        result = self.mdb.results_columns(id_runs, ['z', 'q'], "t = %s", 'pk', [t_max])
+        if result is None or result['pk'].shape[0] == 0:
+            self.mgis.add_info('No results for initialisation')
             return
 
         result["X"] = result.pop("pk")
         result["Z"] = result.pop("z")
         result["Q"] = result.pop("q")
 
-        i1 = {}
-        i2 = {}
-        for section, branche in zip(result["section"], result["branche"]):
-            if branche not in i1.keys():
-                i1[branche] = 9999999
-            if branche not in i2.keys():
-                i2[branche] = -9999999
-            i1[branche] = min(i1[branche], section)
-            i2[branche] = max(i2[branche], section)
-
-        nb_bief = len(set(result['branche']))
-        section = sorted(set(result['section']))
-        imax = len(section)
+        # first and last sections of the branchs
+        branche = result["branche"].astype(int)
+        section = result["section"].astype(int)
+        biefs = np.unique(branche)
+        i1 = [section[branche == b].min() for b in biefs]
+        i2 = [section[branche == b].max() for b in biefs]
+
+        nb_bief = biefs.shape[0]
+        imax = np.unique(section).shape[0]
         i1i2 = []
-        for b in sorted(i1.keys()):
-            i1i2.append(str(i1[b]))
-            i1i2.append(str(i2[b]))
+        for deb, fin in zip(i1, i2):
+            i1i2.append(str(deb))
+            i1i2.append(str(fin))
 
         with open(os.path.join(self.dossierFileMasc, base_namefiles + '.lig'), 'w') as fich:
             date = datetime.datetime.utcnow()
@@ -1675,16 +1884,9 @@ class ClassMascaret:
 
             for k in ['X', 'Z', 'Q']:
                 fich.write(' ' + k + '\n')
-                long = 0
-                for x in result[k]:
-                    fich.write('{:13.2f}'.format(x))
-                    long += 1
-                    if long == 5:
-                        fich.write('\n')
-                        long = 0
-
-                if long != 0:
-                    fich.write('\n')
+                valeurs = ['{:13.2f}'.format(x) for x in result[k].tolist()]
+                for i in range(0, len(valeurs), 5):
+                    fich.write(''.join(valeurs[i:i + 5]) + '\n')
 
             fich.write(' FIN\n')
 
@@ -1787,7 +1989,7 @@ class ClassMascaret:
     def check_scenar(self, nom_scen, run):
         """if true :not exist nomScen and results """
         # kernel=self.listeState[self.Klist.index(kernel)]
-        condition = "run LIKE '{0}'".format(run)
+        condition = "run = '{0}'".format(run)
         allscen = self.mdb.select_distinct("scenario", "runs", condition)
         if allscen:
             if nom_scen in allscen['scenario'] or nom_scen + "_init" in allscen['scenario']:
@@ -1796,17 +1998,18 @@ class ClassMascaret:
                 info = False
 
             if info:
-                ok = self.box.yes_no_q('Do you want to remove the {} results for a new simulation? ?'.format(nom_scen))
+                if self.batch is not None:
+                    ok = self.batch.get('overwrite', False)
+                else:
+                    ok = self.box.yes_no_q('Do you want to remove the {} results for a new simulation? ?'.format(nom_scen))
 
                 if ok:
                     # delete case initalization
                     # TODO condition = "scenario LIKE '{0}' OR AND scenario LIKE '{0}_init' run LIKE '{1}'
                     # AND kernel LIKE '{2}'".format(nomScen, run,kernel)
-                    condition = "(scenario LIKE '{0}' OR  scenario " \
-                                "LIKE '{0}_init') AND run LIKE '{1}' ".format(nom_scen,
-                                                                              run)
-                    self.mdb.delete('runs', condition)
-                    self.mdb.delete('resultats', condition)
+                    condition = "run = '{1}' AND scenario IN ('{0}', " \
+                                "'{0}_init')".format(nom_scen, run)
+                    self.mdb.delete_runs(condition)
                     if self.mgis.DEBUG:
                         self.mgis.add_info("Deletion of {0} scenario for {1} is done".format(nom_scen, run))
                     return True
@@ -1818,85 +2021,36 @@ class ClassMascaret:
         else:
             return True
 
-    def read_opt(self, nom_fich, date_debut, scen, run, init_col=[]):
-        """ Read opt file"""
-        t = set([])
-        pk = set([])
-        if init_col == []:
-            col = ['t', 'branche', 'section', 'pk']
-        else:
-            col = init_col
-
-        with open(nom_fich, 'r') as source:
-            var = source.readline()
-            if var[:2] == '/*':
-                # comment
-                var = source.readline()
-
-            ligne = source.readline()
+    def reader_opt(self, nom_fich, init_col=None):
+        """ streaming reader of opt file"""
+        dico_num = {'bnum': getattr(self, 'dico_basinnum', {}),
+                    'lnum': getattr(self, 'dico_linknum', {})}
+        return ClassReadOpt(nom_fich, init_col, dico_num)
 
-            while '[resultats]' not in ligne:
-                temp = ligne.replace('"', '').replace('NaN', "'NULL'").split(';')
-                col.append(temp[1].lower())
-                ligne = source.readline()
-
-            data = csv.DictReader(source, delimiter=';', fieldnames=col)
+    @staticmethod
+    def rows_opt(batches, date_debut, scen, run, t=None, pk=None):
+        """
+        Generator of the rows to load in database from batches of results.
+        t and pk sets are filled during the reading.
+        """
+        if date_debut:
+            debut = np.datetime64(date_debut, 'us')
+        for batch in batches:
             if date_debut:
-                col.append("date")
-            col.append("run")
-            col.append("scenario")
-
-            value = []
-            for ligne in data:
-                if date_debut:
-                    d = date_debut + datetime.timedelta(
-                        seconds=float(ligne["t"]))
-                    ligne["date"] = d
-                    t.add("{:%Y-%m-%d %H:%M}".format(d))
-                else:
-                    t.add(ligne["t"])
-                ligne["run"] = run
-                ligne["scenario"] = scen
-
-                if 'pk' in ligne.keys():
-                    tempo = str(round(float(ligne["pk"]), 2))
-                    pk.add(tempo)
-                if "section" in ligne.keys():
-                    ligne["section"] = ligne["section"].replace('"', '')
-                if "branche" in ligne.keys():
-                    ligne["branche"] = ligne["branche"].replace('"', '')
-
-                ligne_list = []
-                delcond_qtot = False
-
-                for k in col:
-                    if k == 'qtot':
-                        delcond_qtot = True
-                    elif k == 'pk':
-                        tempo = str(round(float(ligne[k]), 2))
-                        ligne_list.append(tempo)
-                    elif k == 'bnum':
-                        # extrait le numero mascaret de casier
-                        numero_masca = re.findall('\d+', ligne[k])[0]
-
-                        # convertit le numero masca en qgis (different si un casier inactif)
-                        numero_qgis = str(self.dico_basinnum[int(numero_masca)])
-                        ligne_list.append(numero_qgis)
-                    elif k == 'lnum':
-                        # extrait le numero mascaret de liaison
-                        numero_masca = re.findall('\d+', ligne[k])[0]
-                        # convertit le numero masca en qgis (different si une liaison inactive)
-                        numero_qgis = str(self.dico_linknum[int(numero_masca)])
-                        ligne_list.append(numero_qgis)
-                    else:
-                        ligne_list.append(ligne[k])
-
-                value.append(ligne_list)
-        # delete 'qtot' because of the same that 'q'
-        if delcond_qtot:
-            col.remove("qtot")
-
-        return t, pk, col, value
+                dates = (debut + np.around(batch['t'] * 1e6).astype('timedelta64[us]')).tolist()
+                if t is not None:
+                    t.update(["{:%Y-%m-%d %H:%M}".format(d)
+                              for d in (debut + np.around(np.unique(batch['t']) * 1e6).astype(
+                                  'timedelta64[us]')).tolist()])
+                for row, d in zip(batch.tolist(), dates):
+                    yield list(row) + [d, run, scen]
+            else:
+                if t is not None:
+                    t.update([str(x) for x in np.unique(batch['t']).tolist()])
+                for row in batch.tolist():
+                    yield list(row) + [run, scen]
+            if pk is not None and 'pk' in batch.dtype.names:
+                pk.update([str(x) for x in np.unique(batch['pk']).tolist()])
 
     @staticmethod
     def around(x):
@@ -20,6 +20,9 @@ email                :
 
 import datetime
 import os
+import re
+
+import numpy as np
 from qgis.core import *
 from qgis.gui import *
 from qgis.utils import *
@@ -33,28 +36,16 @@ class ClassObservation:
     def evt_to_obs(self, data_file):
 
         try:
-            obs = {}
-
             # self.mgis.add_info("{} ".format(dataFile))
             for file in data_file:
                 if os.path.isfile(file):
                     with open(file, 'r') as fichier:
-
-                        codes = fichier.readline().strip().split(';')[1:]
-                        types = fichier.readline().strip().split(';')[1:]
-                        nom_stat = fichier.readline().strip().split(';')[1:]
-                        obs = {'code': [], 'date': [], 'type': [], 'comment': [], 'valeur': []}
-                        for ligne in fichier:
-                            temp = ligne.strip().split(';')
-                            for i, val in enumerate(temp[1:]):
-                                if float(val) != -99.99:
-                                    obs['code'].append("'{}'".format(codes[i]))
-                                    obs['date'].append("'{}'".format(self.fmt_date(temp[0])))
-                                    obs['type'].append("'{}'".format(types[i]))
-                                    obs['comment'].append("'{}'".format(nom_stat[i]))
-                                    obs['valeur'].append(val)
-
-                self.mdb.insert2('observations', obs)
+                        res = self.mdb.copy_observations(self.lit_obs(fichier))
+                    if res is None:
+                        raise ValueError("Error: import of {0}".format(file))
+                    self.mdb.obs.clear()
+                    if res[1] > 0:
+                        self.mgis.add_info("{0} : {1} duplicated observations (code, type, date) are ignored".format(file, res[1]))
                 if self.mgis.DEBUG:
                     self.mgis.add_info("File {0} loads".format(file))
             return True
@@ -64,6 +55,87 @@ class ClassObservation:
                 self.mgis.add_info(repr(e))
             return False
 
+    def lit_obs(self, fichier):
+        """ rows (code, type, comment, valeur, date) of the file, read line by line"""
+        codes = fichier.readline().strip().split(';')[1:]
+        types = fichier.readline().strip().split(';')[1:]
+        nom_stat = fichier.readline().strip().split(';')[1:]
+        for ligne in fichier:
+            temp = ligne.strip().split(';')
+            if len(temp) < 2:
+                continue
+            date = self.fmt_date(temp[0])
+            for i, val in enumerate(temp[1:]):
+                if not val.strip():
+                    continue
+                val = float(val)
+                if val != -99.99:
+                    yield codes[i], types[i], nom_stat[i], val, date
+
     @staticmethod
     def fmt_date(date):
         return datetime.datetime.strptime(date, '%d/%m/%Y %H:%M')
+
+
+class ClassObsFormule(object):
+    """
+    Formula of a law built with observations, ex: A1234567[t-2]*0.8 + B7654321[t].
+    The formula is compiled once and evaluated on the aligned series of the stations.
+    """
+    PATTERN = re.compile('([A-Z][0-9]{7})\\[t([+-][0-9]+)?\\]')
+
+    def __init__(self, formule):
+        self.formule = formule
+        # (station, shift in hours) of each term of the formula
+        self.termes = [(code, int(delta) if delta else 0) for code, delta in self.PATTERN.findall(formule)]
+        self.num = 0
+        expr = self.PATTERN.sub(self.variable, formule)
+        try:
+            self.code = compile(expr, '<formule>', 'eval')
+        except SyntaxError:
+            self.code = None
+
+    def variable(self, match):
+        """ the term i of the formula is replaced by _v[i]"""
+        var = '_v[{0}]'.format(self.num)
+        self.num += 1
+        return var
+
+    def stations(self):
+        """ stations and their shifts (hours)"""
+        dico = {}
+        for code, delta in self.termes:
+            dico.setdefault(code, set()).add(delta)
+        return dico
+
+    def evalue(self, valeurs):
+        """
+        Evaluation of the formula
+
+        Args:
+            valeurs (list): numpy arrays of the values of each term (NaN if missing)
+
+        Returns:
+            numpy array: NaN where a value is missing or the formula fails
+        """
+        if not valeurs:
+            return np.zeros(0)
+        nb = valeurs[0].shape[0]
+        res = np.full(nb, np.nan)
+        if self.code is None:
+            return res
+        valide = np.all(np.isfinite(np.vstack(valeurs)), axis=0)
+        env = {'np': np}
+        try:
+            with np.errstate(all='ignore'):
+                calc = np.asarray(eval(self.code, env, {'_v': valeurs}), dtype=float)
+            res = np.broadcast_to(calc, (nb,)).copy()
+        except Exception:
+            # formula not vectorisable (max, if ...), evaluated point by point
+            for i in np.where(valide)[0]:
+                try:
+                    res[i] = float(eval(self.code, env, {'_v': [v[i] for v in valeurs]}))
+                except Exception:
+                    pass
+        res[~valide | ~np.isfinite(res)] = np.nan
+        return res
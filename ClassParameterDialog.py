@@ -316,6 +316,7 @@ class ClassParameterDialog(QDialog):
         if ok:
             where = "code = '{0}'".format(event)
             self.mdb.delete("observations", where)
+            self.mdb.obs.clear(event)
             if self.mgis.DEBUG:
                 self.mgis.add_info('{} is deleted.'.format(event))
         else:
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+Name                 : Mascaret
+Description          : Pre and Postprocessing for Mascaret for QGIS
+Date                 : June,2017
+copyright            : (C) 2017 by Artelia
+email                :
+***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+import re
+from itertools import islice
+
+import numpy as np
+
+try:  # python2
+    from StringIO import StringIO
+except ImportError:  # python3
+    from io import StringIO
+
+NUMBER = re.compile(r'\d+')
+
+
+def conv_num(txt):
+    """ extract the number of basin or link (ex: "C  12" -> 12)"""
+    if isinstance(txt, bytes):
+        txt = txt.decode('utf-8')
+    return float(NUMBER.search(txt).group())
+
+
+def merge_tracer(batches, batches_tra, lcol, info=None):
+    """
+    Join the tracer columns (lcol) to the hydraulic batches
+    with the key (t, branche, section).
+    The tracer rows are read as far as the last time of the hydraulic batch.
+    This last time step can continue in the next hydraulic batch,
+    so its tracer rows not found are kept for the next batch.
+
+    Args:
+        batches (iterable): hydraulic batches (record arrays)
+        batches_tra (iterable): tracer batches
+        lcol (list): tracer columns
+        info (function): called with the warning message if the rows don't match
+    """
+    cles = ['t', 'branche', 'section']
+    batches_tra = iter(batches_tra)
+    reste = None
+    fin_tra = False
+    nb_miss = 0
+    nb_unused = 0
+    for batch in batches:
+        dtype = batch.dtype.descr + [(c, '<f8') for c in lcol]
+        new = np.empty(batch.shape[0], dtype=dtype)
+        for c in batch.dtype.names:
+            new[c] = batch[c]
+        if batch.shape[0] == 0:
+            yield new
+            continue
+        tmax = batch['t'].max()
+        # tracer rows up to tmax
+        liste = [] if reste is None else [reste]
+        while not fin_tra and (not liste or liste[-1].shape[0] == 0 or liste[-1]['t'][-1] <= tmax):
+            try:
+                liste.append(next(batches_tra))
+            except StopIteration:
+                fin_tra = True
+        cur = np.concatenate(liste) if liste else None
+        reste = None
+        if cur is not None:
+            cond = cur['t'] <= tmax
+            reste = cur[~cond]
+            cur = cur[cond]
+
+        if cur is not None and cur.shape[0] == batch.shape[0] and \
+                all(np.array_equal(cur[c], batch[c]) for c in cles):
+            # same order
+            for c in lcol:
+                new[c] = cur[c]
+            used = np.ones(cur.shape[0], dtype=bool)
+        else:
+            idx, trouve = join_index(batch, cur)
+            nb_miss += int(batch.shape[0] - trouve.sum())
+            for c in lcol:
+                new[c] = np.nan
+                if cur is not None:
+                    new[c][trouve] = cur[c][idx[trouve]]
+            used = np.zeros(0 if cur is None else cur.shape[0], dtype=bool)
+            used[idx[trouve]] = True
+        if cur is not None:
+            # the rows of the last time step not used wait for the next hydraulic batch
+            garde = ~used & (cur['t'] == tmax)
+            nb_unused += int((~used & ~garde).sum())
+            reste = np.concatenate((cur[garde], reste))
+        if reste is not None and reste.shape[0] == 0:
+            reste = None
+        yield new
+
+    nb_left = nb_unused + (0 if reste is None else reste.shape[0])
+    for b in batches_tra:
+        nb_left += b.shape[0]
+    if (nb_miss > 0 or nb_left > 0) and info is not None:
+        info("Warning: hydraulic and tracer results are not aligned "
+             "({} rows without tracer, {} tracer rows not used).".format(nb_miss, nb_left))
+
+
+def join_index(batch, cur):
+    """
+    Index in cur of the (t, branche, section) keys of batch.
+    Returns the index array and the boolean array of the found keys.
+    """
+    nb = batch.shape[0]
+    if cur is None or cur.shape[0] == 0:
+        return np.zeros(nb, dtype=np.int64), np.zeros(nb, dtype=bool)
+    tu = np.unique(np.concatenate((batch['t'], cur['t'])))
+    bmax = int(max(batch['branche'].max(), cur['branche'].max())) + 1
+    smax = int(max(batch['section'].max(), cur['section'].max())) + 1
+
+    def cle(tab):
+        it = np.searchsorted(tu, tab['t']).astype(np.int64)
+        return (it * bmax + tab['branche']) * smax + tab['section']
+
+    cle_cur = cle(cur)
+    ordre = np.argsort(cle_cur, kind='mergesort')
+    cle_tri = cle_cur[ordre]
+    cle_batch = cle(batch)
+    pos = np.clip(np.searchsorted(cle_tri, cle_batch), 0, cle_tri.shape[0] - 1)
+    trouve = cle_tri[pos] == cle_batch
+    return ordre[pos], trouve
+
+
+class ClassReadOpt(object):
+    """
+    Streaming reader of Mascaret results files (.opt, .tra_opt, .cas_opt, .liai_opt).
+    The header is read once, the rows are returned by batches
+    of numpy record arrays.
+    The rows whose basin or link number isn't in dico_num are rejected
+    (counted in self.rejets, the numbers are kept in self.inconnus).
+    """
+    # integer columns
+    COL_INT = ['branche', 'section', 'bnum', 'lnum']
+    # columns which need a conversion
+    COL_NUM = ['bnum', 'lnum']
+    # columns not loaded ('qtot' is the same that 'q')
+    COL_EXCLU = ['qtot']
+
+    def __init__(self, nom_fich, init_col=None, dico_num=None, chunk=20000):
+        """
+        Args:
+            nom_fich (str): path of the file
+            init_col (list): first columns of the file, default ['t', 'branche', 'section', 'pk']
+            dico_num (dict): {'bnum': {num mascaret: num qgis}, 'lnum': {...}}
+            chunk (int): number of rows by batch
+        """
+        self.nom_fich = nom_fich
+        self.chunk = chunk
+        if dico_num is None:
+            dico_num = {}
+        self.dico_num = dico_num
+        if not init_col:
+            self.fields = ['t', 'branche', 'section', 'pk']
+        else:
+            self.fields = list(init_col)
+        self.offset = 0
+        self.rejets = 0
+        self.inconnus = set()
+        self.read_header()
+
+        self.usecols = [i for i, c in enumerate(self.fields) if c not in self.COL_EXCLU]
+        self.col = [self.fields[i] for i in self.usecols]
+        self.converters = {}
+        for i, c in enumerate(self.fields):
+            if c in self.COL_NUM:
+                self.converters[i] = conv_num
+        self.dtype = np.dtype([(str(c), np.int32 if c in self.COL_INT else np.float64)
+                               for c in self.col])
+        # lookup arrays mascaret number -> qgis number, -1 for the unknown numbers
+        self.lookup = {}
+        for c in self.COL_NUM:
+            if c in self.col and c in self.dico_num and self.dico_num[c]:
+                dico = self.dico_num[c]
+                tab = np.full(max(dico.keys()) + 1, -1, dtype=np.int32)
+                for k, v in dico.items():
+                    tab[k] = v
+                self.lookup[c] = tab
+
+    def read_header(self):
+        """ read the name of the variables"""
+        with open(self.nom_fich, 'r') as source:
+            var = source.readline()
+            if var[:2] == '/*':
+                # comment
+                var = source.readline()
+
+            ligne = source.readline()
+            while ligne and '[resultats]' not in ligne:
+                temp = ligne.replace('"', '').split(';')
+                self.fields.append(temp[1].strip().lower())
+                ligne = source.readline()
+            self.offset = source.tell()
+
+    def batches(self):
+        """ generator of the batches of results"""
+        with open(self.nom_fich, 'r') as source:
+            source.seek(self.offset)
+            while True:
+                lines = list(islice(source, self.chunk))
+                if not lines:
+                    break
+                batch = self.parse(lines)
+                if batch is not None:
+                    yield batch
+
+    def parse(self, lines):
+        """ convert text lines in numpy record array"""
+        txt = ''.join(lines).replace('"', '')
+        if not txt.strip():
+            return None
+        data = np.loadtxt(StringIO(txt), delimiter=';', dtype=np.float64,
+                          converters=self.converters, usecols=self.usecols, ndmin=2)
+        batch = np.empty(data.shape[0], dtype=self.dtype)
+        valide = np.ones(data.shape[0], dtype=bool)
+        for i, c in enumerate(self.col):
+            if c in self.lookup:
+                num = data[:, i].astype(np.int64)
+                batch[c] = self.convert_num(c, num)
+                inconnu = batch[c] < 0
+                if inconnu.any():
+                    self.inconnus.update(np.unique(num[inconnu]).tolist())
+                    valide &= ~inconnu
+            else:
+                batch[c] = data[:, i]
+        if not valide.all():
+            self.rejets += int((~valide).sum())
+            batch = batch[valide]
+        if 'pk' in self.col:
+            batch['pk'] = np.around(batch['pk'], 2)
+        return batch
+
+    def convert_num(self, c, num):
+        """ mascaret numbers -> qgis numbers of the column c, -1 if unknown"""
+        tab = self.lookup[c]
+        res = np.full(num.shape[0], -1, dtype=np.int32)
+        dedans = (num >= 0) & (num < tab.shape[0])
+        res[dedans] = tab[num[dedans]]
+        return res
+
+    def read_all(self):
+        """ read all file in one record array"""
+        liste = list(self.batches())
+        if not liste:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(liste)
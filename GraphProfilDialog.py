@@ -440,12 +440,12 @@ class GraphProfil(GraphCommon):
                 self.tab[l] = None
         self.mnt = {'x': [], 'z': []}
 
-        if self.feature["x"] and self.feature["z"]:
-            # self.tab['x'] = list(map(float, self.feature["x"].split()))
-            # self.tab['z'] = list(map(float, self.feature["z"].split()))
-            self.tab['x'] = [float(var) for var in self.feature["x"].split()]
-            self.tab['z'] = [float(var) for var in self.feature["z"].split()]
+        if self.feature["tab_x"] is not None and self.feature["tab_z"] is not None:
+            # numpy arrays of the database
+            self.tab['x'] = self.feature["tab_x"].tolist()
+            self.tab['z'] = self.feature["tab_z"].tolist()
 
+        if self.tab['x']:
             mini = min(self.tab['x'])
             maxi = max(self.tab['x'])
             for l in liste:
@@ -453,11 +453,9 @@ class GraphProfil(GraphCommon):
                 if val and mini < val < maxi:
                     self.tab[l] = val
 
-        if self.feature["xmnt"] and self.feature["zmnt"]:
-            self.mnt['x'] = [float(var) for var in self.feature["xmnt"].split()]
-            self.mnt['z'] = [float(var) for var in self.feature["zmnt"].split()]
-            # self.mnt['x'] = list(map(float, self.feature["xmnt"].split()))
-            # self.mnt['z'] = list(map(float, self.feature["zmnt"].split()))
+        if self.feature["tab_xmnt"] is not None and self.feature["tab_zmnt"] is not None:
+            self.mnt['x'] = self.feature["tab_xmnt"].tolist()
+            self.mnt['z'] = self.feature["tab_zmnt"].tolist()
 
     def extrait_topo(self):
 
@@ -533,16 +531,18 @@ class GraphProfil(GraphCommon):
 
     def sauve_profil(self):
 
+        # x and z are saved in the arrays tab_x and tab_z, the text follows in the database
+        tab = {}
         for k, v in self.tab.items():
             if isinstance(v, list):
-                self.liste[k][self.position] = " ".join([str(var) for var in v])
-            else:
-                self.liste[k][self.position] = v
+                k = 'tab_' + k
+                v = np.array(v, dtype=float) if v else None
+            self.liste[k][self.position] = v
+            tab[k] = v
 
         self.feature = {k: v[self.position] for k, v in self.liste.items()}
 
-        tab = {self.nom: self.tab}
-        self.mdb.update("profiles", tab, var="name")
+        self.mdb.update("profiles", {self.nom: tab}, var="name")
 
     def sauve_topo(self):
         """ Save les modification du à la translation de la topo"""
@@ -582,7 +582,9 @@ class GraphProfil(GraphCommon):
                     "rightminbed": None, "leftstock": None,
                     "rightstock": None}
 
-        self.mdb.update("profiles", {self.nom: self.tab}, var='name')
+        self.mdb.update("profiles", {self.nom: {"tab_x": None, "tab_z": None, "leftminbed": None,
+                                                "rightminbed": None, "leftstock": None,
+                                                "rightstock": None}}, var='name')
 
         self.maj_graph()
 
@@ -1387,10 +1389,9 @@ class GraphProfilRes(GraphCommon):
         self.date = False
         self.type = 't'
         self.listeTime = {'t': [], 'date': []}
-        condition = "run='{0}' AND scenario='{1}'".format(self.run,
-                                                          self.scenario)
-        temp = self.mdb.select_distinct("date", "resultats", condition, 'date')
-        if temp["date"][0]:
+        self.id_runs = self.mdb.get_id_run(self.run, self.scenario)
+        temp = self.mdb.cubes.times(self.id_runs)
+        if temp["date"] and temp["date"][0]:
             self.date = True
             if self.type == 't':
                 self.type = 'date'
@@ -1399,7 +1400,6 @@ class GraphProfilRes(GraphCommon):
                 self.type = 't'
 
         self.listeTime['date'] = temp['date']
-        temp = self.mdb.select_distinct("t", "resultats", condition, 't')
         self.listeTime['t'] = temp['t']
         self.comboTime.addItem('Hmax')
         for x in self.listeTime[self.type]:
@@ -1584,13 +1584,12 @@ class GraphProfilRes(GraphCommon):
         else:
             return
 
-        if self.feature['x'] and self.feature['z']:
+        if self.feature['tab_x'] is not None and self.feature['tab_z'] is not None:
             condition = "name='{0}'".format(self.nom)
             requete = self.mdb.select("profiles", condition)
-            # self.tab[self.nom]['x'] = list(map(float, requete["x"][0].split()))
-            # self.tab[self.nom]['z'] = list(map(float, requete["z"][0].split()))
-            self.tab[self.nom]['x'] = [float(var) for var in requete["x"][0].split()]
-            self.tab[self.nom]['z'] = [float(var) for var in requete["z"][0].split()]
+            if requete["tab_x"][0] is not None and requete["tab_z"][0] is not None:
+                self.tab[self.nom]['x'] = requete["tab_x"][0].tolist()
+                self.tab[self.nom]['z'] = requete["tab_z"][0].tolist()
 
     def onpick(self, event):
         legline = event.artist
@@ -1647,20 +1646,17 @@ class GraphProfilRes(GraphCommon):
         # get value for graphic
         abscisse = self.feature['abscissa']
 
-        condition = "run='{0}' AND scenario='{1}' AND pk={2}".format(self.run,
-                                                                     self.scenario,
-                                                                     abscisse)
-        self.zmax = self.mdb.select_max("z", "resultats", condition)
+        env = self.mdb.select_envelope(self.id_runs, 'z', "pk={0}".format(abscisse))
+        self.zmax = max(env['vmax']) if env.get('vmax') else None
 
         if self.posit == 'Hmax':
             self.zH = self.zmax
         elif isinstance(self.posit, datetime):
-            condition += """ AND date='{:%Y-%m-%d %H:%M:%S.%f}'""".format(
-                self.posit)
-            self.zH = self.mdb.select("resultats", condition, "t")
+            self.zH = self.mdb.cubes.at_time(self.id_runs, date=self.posit,
+                                             pk=abscisse)
         else:
-            condition += " AND t={0}".format(self.posit)
-            self.zH = self.mdb.select("resultats", condition, "t")
+            self.zH = self.mdb.cubes.at_time(self.id_runs, t=self.posit,
+                                             pk=abscisse)
 
     def avance(self, val):
 
@@ -1827,7 +1823,7 @@ class GraphHydro(GraphCommon):
             seuils = []
 
         self.comboTimePK.clear()
-        columns_tmp = self.mdb.list_columns("resultats")[8:]
+        columns_tmp = self.mdb.results_var()
         self.columns = []
         for col in columns_tmp:
             if not col in ['bnum', 'lnum']:
@@ -2131,11 +2127,10 @@ class GraphHydro(GraphCommon):
 
     def maj_liste(self):
         self.date = False
-        condition = "run='{0}' AND scenario='{1}'".format(self.run,
-                                                          self.scenario)
-        temp = self.mdb.select_distinct("date", "resultats", condition, 'date')
+        self.id_runs = self.mdb.get_id_run(self.run, self.scenario)
+        temp = self.mdb.cubes.times(self.id_runs)
 
-        if temp["date"][0]:
+        if temp["date"] and temp["date"][0]:
             self.date = True
             if self.type == 't':
                 self.type = 'date'
@@ -2144,16 +2139,10 @@ class GraphHydro(GraphCommon):
                 self.type = 't'
 
         self.liste['date']['abs'] = temp["date"]
-
-        temp = self.mdb.select_distinct("t", "resultats", condition, 't')
         self.liste['t']['abs'] = temp["t"]
 
-        temp = self.mdb.select_distinct('pk', "resultats", condition, 'pk')
         # TODO delete round in future
-        self.liste['pk']['abs'] = []
-        for elem in temp['pk']:
-            if elem is not None:
-                self.liste['pk']['abs'].append(round(elem, 2))
+        self.liste['pk']['abs'] = self.mdb.cubes.pk(self.id_runs)
         # self.liste['pk']['abs'] = [round(elem, 2) for elem in temp['pk']]
         ss = self.liste['selection']
 
@@ -2228,24 +2217,18 @@ class GraphHydro(GraphCommon):
 
 
     def maj_tab(self):
-        condition = """run='{0}' AND scenario='{1}' """.format(self.run,
-                                                               self.scenario)
-
-        if self.type == "pk":
-            condition += """AND branche={} """.format(self.branche)
-
-        if isinstance(self.position, datetime):
-            condition += """AND date='{:%Y-%m-%d %H:%M:%S.%f}'""".format(
-                self.position)
+        if self.type != "pk":
+            self.tab = self.mdb.cubes.at_pk(self.id_runs, self.position)
+        elif isinstance(self.position, datetime):
+            self.tab = self.mdb.cubes.at_time(self.id_runs, date=self.position,
+                                              branche=self.branche)
         else:
-            condition += """AND {0}={1}""".format(self.inv, self.position)
-
-        # self.mgis.add_info(condition)
-        self.tab = self.mdb.select("resultats", condition, self.type )
+            self.tab = self.mdb.cubes.at_time(self.id_runs, t=self.position,
+                                              branche=self.branche)
 
         self.listeTab = [self.tab[self.type]]
         for c in self.columns:
-            if self.tab[c] != [None] * len(self.tab[c]):
+            if c in self.tab and self.tab[c] != [None] * len(self.tab[c]):
                 self.listeTab.append(self.tab[c])
                 self.courbeHydro[c].set_data(self.tab[self.type], self.tab[c])
             else:
@@ -2309,13 +2292,10 @@ class GraphHydro(GraphCommon):
             elif self.var1 in self.debVar:
                 gg = 'Q'
 
-            condition = """code = '{0}'
-                        AND date>'{1}'
-                        AND date<'{2}'
-                        AND type='{3}'
-                        AND valeur > -99.9""".format(code, mini, maxi, gg)
-
-            self.obs = self.mdb.select("observations", condition, "date")
+            # observations kept in memory between the profiles
+            dates, valeurs = self.mdb.obs.serie(code, gg, mini, maxi)
+            cond = (dates > np.datetime64(mini)) & (dates < np.datetime64(maxi)) & (valeurs > -99.9)
+            self.obs = {'date': dates[cond].tolist(), 'valeur': valeurs[cond].tolist()}
 
             if self.obs["valeur"]:
                 if self.var1 in self.coteVar:
@@ -2467,11 +2447,13 @@ class GraphHydro(GraphCommon):
         zz = [v for i, v in enumerate(lai['z']) if lai[self.type][i]]
         if isinstance(xx[0], date):
             return
-        if self.tab["zmax"]:
+        # enveloppe des cotes max de la branche
+        env = self.mdb.select_envelope(self.id_runs, 'z', "branche={0}".format(self.branche))
+        if env.get("vmax"):
             couleurs = []
             taille = []
             for x, z in zip(xx, zz):
-                val = interpole(x, self.tab["pk"], self.tab["zmax"])
+                val = interpole(x, env["pk"], env["vmax"])
                 if val:
                     diff = z - val
                     if diff < 0:
@@ -2823,7 +2805,7 @@ class GraphBasin(GraphCommon):
         couleur.append('black')
 
         for col in self.colVal:
-            if self.tab[col] and self.courbe_hydro[col].get_visible():
+            if len(self.tab[col]) > 0 and self.courbe_hydro[col].get_visible():
                 index = self.tab[self.type].index(absc)
                 val = self.tab[col][index]
                 nom = self.variables[col]['nom']
@@ -2956,21 +2938,25 @@ class GraphBasin(GraphCommon):
             condition += """AND {0}={1}""".format('lnum', numero)
 
         # self.mgis.add_info(condition)
+        # numpy array by column, only the displayed columns
         if self.type == 'basins':
-            self.tab = self.mdb.select("resultats_basin", condition, "t")
+            self.tab = self.mdb.select_columns("resultats_basin", ['date'] + self.columns, condition, "t")
 
         else:
-            self.tab = self.mdb.select("resultats_links", condition, "t")
+            self.tab = self.mdb.select_columns("resultats_links", ['date'] + self.columns, condition, "t")
+        if self.tab is None:
+            return
+        self.tab['date'] = self.tab['date'].tolist()
 
         # Alimentation de la colonne des dates dans le tableau
         self.liste_tab = [self.tab['date']]
         for c in self.columns:
-            if self.tab[c] != [None] * len(self.tab[c]):
+            if not np.isnan(self.tab[c]).all():
                 self.liste_tab.append(self.tab[c])
                 # Valeurs en milliers pour barea et bvol passees dans les courbes
                 #  pour ameliorer la visibilite des graphes
                 if c == 'surcas' or c == 'volcas':
-                    self.courbe_hydro[c].set_data(self.tab['date'], [valeur / 1000 for valeur in self.tab[c]])
+                    self.courbe_hydro[c].set_data(self.tab['date'], self.tab[c] / 1000.)
                 else:
                     self.courbe_hydro[c].set_data(self.tab['date'], self.tab[c])
             else:
@@ -2999,7 +2985,7 @@ class GraphBasin(GraphCommon):
         """add courbe for visualization"""
         for col in self.columns:
             vv = self.variables[col]
-            if self.tab[col] and vv['code'] == var:
+            if len(self.tab[col]) > 0 and vv['code'] == var:
                 self.colVal.append(col)
                 self.courbe_hydro[col].set_visible(True)
                 self.courbe_hydro[col].set_label(vv['nom'])
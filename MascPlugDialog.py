@@ -65,6 +65,9 @@ class MascPlugDialog(QMainWindow):
         self.iface = iface
 
         self.map_tool = None
+        # DTM extraction
+        self.mnt_thread = None
+        self.mnt_worker = None
 
         # self.pathPostgres = self.masplug_path
         # emplacement objet sql
@@ -417,9 +420,43 @@ class MascPlugDialog(QMainWindow):
 
         if self.DEBUG:
             self.add_info("Raster and Profile Selection, and Unit are Ok")
-        # create a new worker instance
-        worker = ClassMNT(self, profil, raster, facteur)
-        worker.run()
+        if self.mnt_thread is not None:
+            self.add_info("A DTM extraction is already running.")
+            return
+        # create a new worker instance, run in a thread
+        self.mnt_worker = ClassMNT(self, profil, raster, facteur)
+        self.mnt_thread = QThread()
+        self.mnt_worker.moveToThread(self.mnt_thread)
+        self.mnt_thread.started.connect(self.mnt_worker.run)
+        self.mnt_worker.info.connect(self.add_info)
+        self.mnt_worker.resultat.connect(self.mnt_sauve)
+        self.mnt_worker.finished.connect(self.mnt_fin)
+
+        self.iface.messageBar().clearWidgets()
+        message = self.iface.messageBar().createMessage("DTM extraction ...")
+        progress = QProgressBar()
+        progress.setMaximum(100)
+        bouton = QPushButton("Cancel")
+        message.layout().addWidget(progress)
+        message.layout().addWidget(bouton)
+        self.iface.messageBar().pushWidget(message)
+        self.mnt_worker.progress.connect(progress.setValue)
+        bouton.clicked.connect(self.mnt_worker.cancel, Qt.DirectConnection)
+
+        self.mnt_thread.start()
+
+    def mnt_sauve(self, modif):
+        """ save the results of one chunk of profiles (GUI thread)"""
+        if self.mnt_worker is not None:
+            self.mnt_worker.sauve(modif)
+
+    def mnt_fin(self):
+        """ end of the DTM extraction"""
+        self.mnt_thread.quit()
+        self.mnt_thread.wait()
+        self.mnt_thread = None
+        self.mnt_worker = None
+        self.iface.messageBar().clearWidgets()
         if self.DEBUG:
             self.add_info("Extraction is done")
 
@@ -19,14 +19,18 @@ email                :
 comment:
 
 """
+import multiprocessing
 import os
+from multiprocessing.pool import ThreadPool
+
 from qgis.PyQt.QtCore import qVersion
 from qgis.core import *
 from qgis.gui import *
 from qgis.utils import *
 
+from .ClassMeteoSeries import comble, ecrit_loi, pivot
 from .ClassTableWQ import ClassTableWQ
-from ..Function import interpole, del_symbol
+from ..Function import del_symbol
 
 if int(qVersion()[0]) < 5:  # qt4
     from qgis.PyQt.QtGui import *
@@ -74,8 +78,35 @@ class ClassMascWQ:
                 # print(result['value'][idx],result['text'][idx])
                 fich.write('{} : {}\n'.format(result['value'][idx], result['text'][idx]))
 
-    def law_tracer(self, dossier=None):
-        """creation of law file for tracer"""
+    def lois_tracer(self, names):
+        """
+        Values of the tracer laws read in one query (one row by law)
+
+        Returns:
+            dict: name -> (times, matrix time x tracer), None if error
+        """
+        sql = "WITH conf AS (SELECT DISTINCT ON (name) id, name FROM {0}.tracer_config " \
+              "WHERE type = %s AND name = ANY(%s) ORDER BY name, id) " \
+              "SELECT conf.name, array_agg(l.time) AS time, array_agg(l.id_trac::float) AS id_trac, " \
+              "array_agg(l.value) AS value " \
+              "FROM conf JOIN {0}.laws_wq l ON l.id_config = conf.id GROUP BY conf.name;"
+        rows = self.mdb.run_query(sql.format(self.mdb.SCHEMA), fetch=True,
+                                  params=[self.cur_wq_mod_int, list(set(names))])
+        if rows is None:
+            return None
+        lois = {}
+        for name, temps, trac, valeurs in rows:
+            # matrix time x tracer
+            temps, trac, tab = pivot(temps, trac, valeurs)
+            lois[name.strip()] = (temps, comble(temps, tab))
+        return lois
+
+    def law_tracer(self, dossier=None, nb_thread=1):
+        """
+        creation of law file for tracer
+
+        :param nb_thread: files written at the same time (0 : number of processors)
+        """
         if dossier is None:
             dossier = self.dossierFileMasc
         # init_case=True
@@ -94,70 +125,43 @@ class ClassMascWQ:
         for i, cond in enumerate(lateral['active']):
             if cond:
                 list_loi.append(lateral['law_wq'][i])
-                dict_loi_tr[extrem['law_wq'][i]] = {"source": True,
-                                                    'type': lateral['typesources'][i]}
+                dict_loi_tr[lateral['law_wq'][i]] = {"source": True,
+                                                     'type': lateral['typesources'][i]}
 
         if list_loi:
             where = "type = '{}'".format(self.cur_wq_mod)
             order = "id"
             list_trac = self.mdb.select('tracer_name', where, order)
+            header = '# Times (s) '
+            for sigle in list_trac['sigle']:
+                header += 'C_{} '.format(sigle)
+            header += '\n         S\n'
+            lois = self.lois_tracer(list_loi)
+            if lois is None:
+                return dict_loi_tr
             for name in list_loi:
-
-                order = "id"
-                where = "type = '{}' AND name = '{}'".format(self.cur_wq_mod_int, name)
-                loi_trac = self.mdb.select('tracer_config', where, order)
-                if not loi_trac['id']:
+                if name not in lois:
                     self.mgis.add_info(u"The <<{}>> law doesn't exist. Please check  laws. ".format(name))
-                else:
-                    order = 'ORDER BY "time",id_trac'
-                    where = "WHERE id_config= '{}' ".format(loi_trac['id'][0])
-                    sql = """SELECT DISTINCT id_trac,time,value FROM {0}.{1} {2} {3}"""
-                    loi_val, col = self.mdb.run_query(sql.format(self.mdb.SCHEMA, 'laws_wq', where, order),
-                                                      fetch=True, namvar=True)
-                    # write law
-                    fich = open(os.path.join(dossier, del_symbol(name.lower()) + '_tra.loi'), 'w')
-                    header = '# {}\n'.format(name)
-                    header += '# Times (s) '
-                    for sigle in list_trac['sigle']:
-                        header += 'C_{} '.format(sigle)
-
-                    header += '\n'
-                    header += '         S\n'
-                    fich.write(header)
-                    t_pre = loi_val[0][1]
-                    ligne = '{} '.format(t_pre)
-                    for id, temps, val in loi_val:
-                        if t_pre != temps:
-                            fich.write(ligne + '\n')
-                            t_pre = temps
-                            ligne = '{} {} '.format(t_pre, val)
-                        else:
-                            ligne += '{} '.format(val)
-                    fich.write(ligne)
-                    fich.close()
-                    # # case Steady
-                    # if init_case:
-                    #     # initial_ law with first value
-                    #
-                    #     fich = open(os.path.join(dossier, del_symbol(name.lower()) + '_init_tra.loi'), 'w')
-                    #     header = '# {}\n'.format(name)
-                    #     header += '# Times (s) '
-                    #     for sigle in list_trac['sigle']:
-                    #         header += 'C_{} '.format(sigle)
-                    #
-                    #     header += '\n'
-                    #     header += '         S\n'
-                    #     fich.write(header)
-                    #     t_w=[0, 3600]
-                    #     maxid=len(list_trac['sigle'])
-                    #     vals=loi_val[0:maxid]
-                    #     for time in t_w:
-                    #         ligne = '{} '.format(time)
-                    #         for id, temps, val in vals:
-                    #             ligne += '{} '.format(val)
-                    #         ligne += '\n'
-                    #         fich.write(ligne)
-                    #     fich.close()
+            lois = [(name, lois[name]) for name in sorted(set(list_loi)) if name in lois]
+
+            def ecrit(loi):
+                name, (temps, valeurs) = loi
+                with open(os.path.join(dossier, del_symbol(name.lower()) + '_tra.loi'), 'w') as fich:
+                    fich.write('# {}\n'.format(name) + header)
+                    ecrit_loi(fich, temps, valeurs)
+
+            if nb_thread != 1 and len(lois) > 1:
+                if nb_thread <= 0:
+                    nb_thread = multiprocessing.cpu_count()
+                pool = ThreadPool(min(nb_thread, len(lois)))
+                try:
+                    pool.map(ecrit, lois)
+                finally:
+                    pool.close()
+                    pool.join()
+            else:
+                for loi in lois:
+                    ecrit(loi)
         return dict_loi_tr
 
     def init_conc_tracer(self, dossier=None):
@@ -172,7 +176,7 @@ class ClassMascWQ:
             return
         order = 'ORDER BY bief,abscissa,id_trac'
         where = "WHERE id_config= '{}' ".format(init_trac['id'][0])
-        sql = """SELECT DISTINCT id_trac,bief,abscissa,value FROM {0}.{1} {2} {3}"""
+        sql = """SELECT id_trac,bief,abscissa,value FROM {0}.{1} {2} {3}"""
 
         init_val, col = self.mdb.run_query(sql.format(self.mdb.SCHEMA, 'init_conc_wq', where, order),
                                            fetch=True, namvar=True)
@@ -229,22 +233,12 @@ class ClassMascWQ:
             deb_time = dif_time
             end_time = dif_time + duree
 
-        order = 'ORDER BY time,id_var'
-        where = "WHERE id_config= '{}' ".format(meteo_trac['id'][0])
-        if deb_time is not None and end_time is not None:
-            where += "AND time >= {} AND time < {} ".format(deb_time, end_time)
-        else:
-            deb_time = 0
-        sql = """SELECT DISTINCT id_var,time,value FROM {0}.{1} {2} {3}"""
-        #
-        meteo_val, col = self.mdb.run_query(sql.format(self.mdb.SCHEMA, 'laws_meteo', where, order),
-                                            fetch=True, namvar=True)
-
-        if meteo_val == [] or meteo_val is None:
+        # config cached by mdb.meteo for the next scenarios
+        serie = self.mdb.meteo.fenetre(meteo_trac['id'][0], deb_time, end_time)
+        if serie is None or serie[0].shape[0] == 0:
             self.mgis.add_info("Warning: Please fill the meteo conditions for tracers")
             return
-
-        fich = open(os.path.join(dossier, 'mascaret.met'), 'w')
+        temps, valeurs = serie
 
         header = '# {}\n'.format(meteo_trac['name'][0])
         header += '# Times (s) '
@@ -253,42 +247,6 @@ class ClassMascWQ:
 
         header += '\n'
         header += '         S\n'
-        fich.write(header)
-
-        t_pre = meteo_val[0][1] - deb_time
-        if t_pre > 0:
-
-            order = 'ORDER BY time'
-            sql = """SELECT DISTINCT time FROM {0}.{1} {2}"""
-            #
-            temps_list = self.mdb.run_query(sql.format(self.mdb.SCHEMA, 'laws_meteo', order),
-                                            fetch=True)
-            time_inter = 0
-            for i, time in enumerate(temps_list):
-                if time[0] >= deb_time:
-                    time_inter = temps_list[i - 1][0]
-                    break
-            where = "WHERE id_config= '{}' AND time= '{}'".format(meteo_trac['id'][0], time_inter)
-            order = 'ORDER BY id_var'
-            sql = """SELECT DISTINCT  id_var,value FROM {0}.{1} {2} {3}"""
-
-            val = self.mdb.run_query(sql.format(self.mdb.SCHEMA, 'laws_meteo', where, order),
-                                     fetch=True)
-            list_val = []
-            for id, valu in val:
-                valf = interpole(deb_time, [time_inter, meteo_val[0][1]], [valu, meteo_val[0][2]])
-                # valf= (deb_time-time_inter)/(meteo_val[0][1]-time_inter) *(meteo_val[0][2]-valu)+ valu
-                list_val.append([id, deb_time, valf])
-            meteo_val = list_val + meteo_val
-
-        t_pre = meteo_val[0][1] - deb_time
-        ligne = '{} '.format(t_pre)
-        for id, temps, val in meteo_val:
-            if t_pre != temps - deb_time:
-                fich.write(ligne + '\n')
-                t_pre = temps - deb_time
-                ligne = '{} {} '.format(t_pre, val)
-            else:
-                ligne += '{} '.format(val)
-        fich.write(ligne)
-        fich.close()
+        with open(os.path.join(dossier, 'mascaret.met'), 'w') as fich:
+            fich.write(header)
+            ecrit_loi(fich, temps, valeurs)
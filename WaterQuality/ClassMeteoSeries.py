@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+Name                 : Mascaret
+Description          : Pre and Postprocessing for Mascaret for QGIS
+Date                 : June,2017
+copyright            : (C) 2017 by Artelia
+email                :
+***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+import numpy as np
+
+
+def pivot(temps, cles, valeurs):
+    """
+    Pivot of (time, key, value) rows in a matrix time x key,
+    the times and the keys are sorted, NaN for the missing values.
+
+    Returns:
+        tuple: (times, keys, matrix time x key)
+    """
+    temps, lig = np.unique(temps, return_inverse=True)
+    cles, col = np.unique(cles, return_inverse=True)
+    tab = np.full((temps.shape[0], cles.shape[0]), np.nan)
+    tab[lig, col] = valeurs
+    return temps, cles, tab
+
+
+def comble(temps, tab):
+    """
+    Fill the missing values (NaN) of each column of the matrix time x key
+    by linear interpolation in time (first/last value outside, 0 for an empty column)
+    """
+    for col in range(tab.shape[1]):
+        manque = np.isnan(tab[:, col])
+        if not manque.any():
+            continue
+        if manque.all():
+            tab[:, col] = 0.
+        else:
+            tab[manque, col] = np.interp(temps[manque], temps[~manque], tab[~manque, col])
+    return tab
+
+
+def ecrit_loi(fich, temps, tab):
+    """ write the rows 'time value ...' of a law, the numbers formatted with str()"""
+    lignes = np.column_stack((temps, tab)).tolist()
+    fich.write('\n'.join(''.join('{} '.format(val) for val in ligne) for ligne in lignes))
+
+
+class ClassMeteoSeries(object):
+    """
+    Cache of the meteo laws (laws_meteo) by configuration,
+    as a matrix time x variable sorted by time.
+    A configuration is loaded in one query and kept for the next scenarios.
+    """
+
+    def __init__(self, mdb):
+        self.mdb = mdb
+        self.configs = {}
+
+    def clear(self, id_config=None):
+        """ clear the cache (or the configuration id_config)"""
+        if id_config is None:
+            self.configs.clear()
+        else:
+            self.configs.pop(id_config, None)
+
+    def charge(self, id_config):
+        """
+        Load the configuration
+
+        Returns:
+            tuple: (times, variables id, matrix time x variable), None if error
+        """
+        if id_config in self.configs:
+            return self.configs[id_config]
+        sql = "SELECT array_agg(time) AS time, array_agg(id_var::float) AS id_var, array_agg(value) AS value " \
+              "FROM {0}.laws_meteo WHERE id_config = %s;"
+        rows = self.mdb.run_query(sql.format(self.mdb.SCHEMA), fetch=True, params=[id_config])
+        if rows is None:
+            return None
+        temps, var, valeurs = rows[0]
+        if temps is None:
+            serie = (np.zeros(0), np.zeros(0, dtype=int), np.zeros((0, 0)))
+        else:
+            temps, var, tab = pivot(temps, var, valeurs)
+            serie = (temps, var.astype(int), comble(temps, tab))
+        self.configs[id_config] = serie
+        return serie
+
+    def fenetre(self, id_config, debut=None, fin=None):
+        """
+        Values of the configuration between debut (included) and fin (excluded), in s,
+        all the values if debut is None.
+        The times are relative to debut and the values at debut are
+        interpolated between the surrounding times if needed.
+
+        Returns:
+            tuple: (times, matrix time x variable), None if error
+        """
+        serie = self.charge(id_config)
+        if serie is None:
+            return None
+        temps, var, tab = serie
+        if debut is None:
+            return temps, tab
+        i0 = np.searchsorted(temps, debut, 'left')
+        i1 = temps.shape[0] if fin is None else np.searchsorted(temps, fin, 'left')
+        t_win = temps[i0:i1] - debut
+        v_win = tab[i0:i1]
+        if t_win.shape[0] > 0 and t_win[0] > 0 and i0 > 0:
+            poids = (debut - temps[i0 - 1]) / (temps[i0] - temps[i0 - 1])
+            ligne = tab[i0 - 1] + poids * (tab[i0] - tab[i0 - 1])
+            t_win = np.r_[0., t_win]
+            v_win = np.vstack((ligne, v_win))
+        return t_win, v_win
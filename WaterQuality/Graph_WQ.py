@@ -53,10 +53,7 @@ class GraphWaterQ(GraphCommon):
         for t, trac in enumerate(self.list_trac):
             lst = [[], []]
             if config is not None:
-                sql = "SELECT time, value FROM {0}.laws_wq " \
-                      "WHERE id_config = {1} and id_trac = {2}" \
-                      " ORDER BY time".format(self.mdb.SCHEMA, config, trac["id"])
-                rows = self.mdb.run_query(sql, fetch=True)
+                rows = self.mdb.run_prepared('law_wq', [config, trac["id"]])
                 if len(rows) > 0:
                     lst = list(zip(*rows))
 
@@ -98,10 +95,7 @@ class GraphMeteo(GraphCommon):
         for v, var in enumerate(self.lst_var):
             lst = [[], []]
             if config is not None:
-                sql = "SELECT time, value FROM {0}.laws_meteo " \
-                      "WHERE id_config = {1} and id_var = {2} " \
-                      "ORDER BY time".format(self.mdb.SCHEMA, config, var["id"])
-                rows = self.mdb.run_query(sql, fetch=True)
+                rows = self.mdb.run_prepared('law_meteo', [config, var["id"]])
                 if len(rows) > 0:
                     lst = list(zip(*rows))
 
@@ -326,19 +326,15 @@ class InitConcDialog(QDialog):
                 self.mdb.execute(
                     "UPDATE {0}.init_conc_config SET name = '{1}' WHERE id = {2}".format(self.mdb.SCHEMA, name_law,
                                                                                          self.cur_wq_law))
-                self.mdb.execute(
-                    "DELETE FROM {0}.init_conc_wq WHERE id_config = {1}".format(self.mdb.SCHEMA, self.cur_wq_law))
 
             recs = []
             for r in range(self.ui.tab_laws.model().rowCount()):
                 for c in range(2, self.ui.tab_laws.model().columnCount()):
-                    recs.append([self.cur_wq_law, self.list_trac[c - 2][0], self.ui.tab_laws.model().item(r, 0).data(0),
+                    recs.append([self.list_trac[c - 2][0], self.ui.tab_laws.model().item(r, 0).data(0),
                                  self.ui.tab_laws.model().item(r, 1).data(0),
                                  self.ui.tab_laws.model().item(r, c).data(0)])
-            self.mdb.run_query(
-                "INSERT INTO {0}.init_conc_wq (id_config, id_trac, bief, abscissa, value)"
-                " VALUES (%s, %s, %s, %s, %s)".format(
-                    self.mdb.SCHEMA), many=True, list_many=recs)
+            # only the changed values are written
+            self.mdb.save_law('init_conc_wq', self.cur_wq_law, recs)
         else:
             self.reject_page2()
         self.accept()
@@ -214,9 +214,7 @@ class ClassMeteoDialog(QDialog):
         if self.cur_set != -1:
             c = 0
             for var in self.list_var:
-                sql = "SELECT time, value FROM {0}.laws_meteo WHERE id_config = {1} AND id_var = {2} " \
-                      "ORDER BY time".format(self.mdb.SCHEMA, self.cur_set, var[0])
-                rows = self.mdb.run_query(sql, fetch=True)
+                rows = self.mdb.run_prepared('law_meteo', [self.cur_set, var[0]])
 
                 if c == 0:
                     model.insertRows(0, len(rows))
@@ -458,6 +456,7 @@ class ClassMeteoDialog(QDialog):
                     self.mgis.add_info("Deletion of {} Meteo Setting".format(name_set))
                 self.mdb.execute("DELETE FROM {0}.laws_meteo WHERE id_config = {1}".format(self.mdb.SCHEMA, id_set))
                 self.mdb.execute("DELETE FROM {0}.meteo_config WHERE id = {1}".format(self.mdb.SCHEMA, id_set))
+                self.mdb.meteo.clear(id_set)
                 self.fill_lst_conf()
 
     def new_time(self):
@@ -525,16 +524,15 @@ class ClassMeteoDialog(QDialog):
                 "UPDATE {0}.meteo_config SET name = '{1}', starttime = {2} WHERE id = {3}".format(self.mdb.SCHEMA,
                                                                                                   name_set, date_set,
                                                                                                   self.cur_set))
-            self.mdb.execute("DELETE FROM {0}.laws_meteo WHERE id_config = {1}".format(self.mdb.SCHEMA, self.cur_set))
 
         recs = []
         for r in range(self.ui.tab_sets.model().rowCount()):
             for c in range(5, self.ui.tab_sets.model().columnCount()):
-                recs.append([self.cur_set, self.list_var[c - 5][0], self.ui.tab_sets.model().item(r, 0).data(0),
+                recs.append([self.list_var[c - 5][0], self.ui.tab_sets.model().item(r, 0).data(0),
                              self.ui.tab_sets.model().item(r, c).data(0)])
-
-        self.mdb.run_query("INSERT INTO {0}.laws_meteo (id_config, id_var, time, value) VALUES (%s, %s, %s, %s)".format(
-            self.mdb.SCHEMA), many=True, list_many=recs)
+        # only the changed values are written
+        self.mdb.save_law('laws_meteo', self.cur_set, recs)
+        self.mdb.meteo.clear(self.cur_set)
 
         self.fill_lst_conf(self.cur_set)
         self.ui.meteo_pages.setCurrentIndex(0)
@@ -153,9 +153,7 @@ class ClassTracerLawsDialog(QDialog):
         if self.cur_wq_law != -1:
             c = 0
             for trac in self.list_trac:
-                sql = "SELECT time, value FROM {0}.laws_wq WHERE id_config = {1} AND id_trac = {2} " \
-                      "ORDER BY time".format(self.mdb.SCHEMA, self.cur_wq_law, trac[0])
-                rows = self.mdb.run_query(sql, fetch=True)
+                rows = self.mdb.run_prepared('law_wq', [self.cur_wq_law, trac[0]])
 
                 if c == 0:
                     model.insertRows(0, len(rows))
@@ -396,17 +394,14 @@ class ClassTracerLawsDialog(QDialog):
                 self.mdb.execute(
                     "UPDATE {0}.tracer_config SET name = '{1}' WHERE id = {2}".format(self.mdb.SCHEMA, name_law,
                                                                                       self.cur_wq_law))
-                self.mdb.execute(
-                    "DELETE FROM {0}.laws_wq WHERE id_config = {1}".format(self.mdb.SCHEMA, self.cur_wq_law))
 
             recs = []
             for r in range(self.ui.tab_laws.model().rowCount()):
                 for c in range(4, self.ui.tab_laws.model().columnCount()):
-                    recs.append([self.cur_wq_law, self.list_trac[c - 4][0], self.ui.tab_laws.model().item(r, 0).data(0),
+                    recs.append([self.list_trac[c - 4][0], self.ui.tab_laws.model().item(r, 0).data(0),
                                  self.ui.tab_laws.model().item(r, c).data(0)])
-            self.mdb.run_query(
-                "INSERT INTO {0}.laws_wq (id_config, id_trac, time, value) VALUES (%s, %s, %s, %s)".format(
-                    self.mdb.SCHEMA), many=True, list_many=recs)
+            # only the changed values are written
+            self.mdb.save_law('laws_wq', self.cur_wq_law, recs)
 
             self.fill_lst_conf(self.cur_wq_law)
             self.ui.Law_pages.setCurrentIndex(0)
@@ -17,14 +17,27 @@ email                :
  *                                                                         *
  ***************************************************************************/
 """
+import datetime
 import os
 import subprocess
+import threading
+from contextlib import contextmanager
 
+try:  # python2
+    from StringIO import StringIO
+except ImportError:  # python3
+    from io import StringIO
+
+import numpy as np
 import psycopg2
 import psycopg2.extras
+import psycopg2.pool
 from qgis.core import QgsVectorLayer, QgsProject
 
 from . import MasObject as Maso
+from .ClassObsSeries import ClassObsSeries
+from ..WaterQuality.ClassMeteoSeries import ClassMeteoSeries
+from .ClassResultCube import ClassResultCache
 from ..WaterQuality import ClassTableWQ
 from ..ui.custom_control import ClassWarningBox
 
@@ -40,6 +53,44 @@ except:  # qgis3
 from qgis.gui import QgsMessageBar
 
 
+def cast_float_array(value, cur):
+    """ double precision[] -> numpy array"""
+    if value is None:
+        return None
+    value = value.strip('{}')
+    if not value:
+        return np.zeros(0)
+    valeurs = value.split(',')
+    try:
+        return np.array(valeurs, dtype=float)
+    except ValueError:
+        return np.array([np.nan if v == 'NULL' else float(v) for v in valeurs])
+
+
+FLOAT8ARRAY_NUMPY = psycopg2.extensions.new_type((1022,), 'FLOAT8ARRAY_NUMPY', cast_float_array)
+
+
+def adapt_array(value):
+    """ numpy array -> ARRAY[...] (written in the double precision[] columns)"""
+    return psycopg2.extensions.adapt(value.tolist())
+
+
+psycopg2.extensions.register_adapter(np.ndarray, adapt_array)
+
+# type oid -> columns read as numpy arrays by query_columns
+OID_FLOAT = (20, 21, 23, 26, 700, 701, 1700)
+OID_DATE = (1082, 1114)
+OID_CHAR = (1042,)
+
+
+class MasConnection(psycopg2.extensions.connection):
+    """ connection of the pool which keeps its prepared statements : (schema, name) -> statement"""
+
+    def __init__(self, *args, **kwargs):
+        super(MasConnection, self).__init__(*args, **kwargs)
+        self.prepared = {}
+
+
 class ClassMasDatabase(object):
     """
     Class for PostgreSQL database and hydrodynamic models handling.
@@ -50,6 +101,34 @@ class ClassMasDatabase(object):
     OVERWRITE = True
     LOAD_ALL = True
     CHECK_URI = True
+    COPY_CHUNK = 20000
+    # connections of the pool (one by thread)
+    MAX_CON = 10
+    # rows by fetch of the server side cursors
+    FETCH_BATCH = 10000
+    # law tables (config x variable x time) : key columns, value column is "value"
+    LAW_TABLES = {'laws_wq': ['id_config', 'id_trac', 'time'],
+                  'laws_meteo': ['id_config', 'id_var', 'time'],
+                  'init_conc_wq': ['id_config', 'id_trac', 'bief', 'abscissa']}
+    # queries executed in the loops of the graphs and of the runs,
+    # prepared once by connection : name -> (parameters types, query)
+    RES_SQL = "SELECT t, date, branche, section, pk, array_agg(var) AS var, array_agg(val) AS val " \
+              "FROM {0}.results WHERE id_runs=$1 AND "
+    RES_GROUP = " GROUP BY t, date, branche, section, pk ORDER BY "
+    PREPARED = {'get_id_run': (['text', 'text'],
+                               "SELECT id FROM {0}.runs WHERE run=$1 AND scenario=$2 ORDER BY id DESC LIMIT 1"),
+                'results_t': (['integer', 'double precision'], RES_SQL + "t=$2" + RES_GROUP + "pk"),
+                'results_date': (['integer', 'timestamp without time zone'], RES_SQL + "date=$2" + RES_GROUP + "pk"),
+                'results_pk': (['integer', 'double precision'], RES_SQL + "pk=$2" + RES_GROUP + "t"),
+                'results_times': (['integer'],
+                                  "SELECT DISTINCT t, date FROM {0}.results WHERE id_runs=$1 "
+                                  "AND pk=(SELECT pk FROM {0}.results WHERE id_runs=$1 LIMIT 1) ORDER BY t"),
+                'law': (['text', 'integer'], "SELECT * FROM {0}.laws WHERE name=$1 AND type=$2"),
+                'law_wq': (['integer', 'integer'],
+                           "SELECT time, value FROM {0}.laws_wq WHERE id_config=$1 AND id_trac=$2 ORDER BY time"),
+                'law_meteo': (['integer', 'integer'],
+                              "SELECT time, value FROM {0}.laws_meteo WHERE id_config=$1 AND id_var=$2 "
+                              "ORDER BY time")}
 
     def __init__(self, mgis, dbname, host, port, user, password):
         """
@@ -69,7 +148,9 @@ class ClassMasDatabase(object):
         self.port = port
         self.user = user
         self.password = password
-        self.con = None
+        # pool of connections, each thread uses its own connection (self.con)
+        self.pool = None
+        self.local = threading.local()
         self.last_conn = None
         self.last_schema = None
         # liste des tables actuelle
@@ -80,11 +161,147 @@ class ClassMasDatabase(object):
         self.uris = []
         self.refresh_uris()
         self.box = ClassWarningBox(self.mgis)
+        # cache des résultats pour les graphiques
+        self.cubes = ClassResultCache(self)
+        self.obs = ClassObsSeries(self)
+        # meteo laws by configuration
+        self.meteo = ClassMeteoSeries(self)
+
+    @property
+    def con(self):
+        """ connection of the current thread, taken from the pool at its first use"""
+        con = getattr(self.local, 'con', None)
+        if con is None and self.pool is not None:
+            try:
+                con = self.checkout()
+            except psycopg2.Error as e:
+                self.mgis.add_info(u'{}'.format(repr(e)))
+        return con
+
+    @con.setter
+    def con(self, con):
+        self.local.con = con
+
+    @property
+    def prepared(self):
+        """ prepared statements of the connection of the thread : (schema, name) -> statement"""
+        con = self.con
+        if con is None:
+            return {}
+        if getattr(con, 'prepared', None) is None:
+            con.prepared = {}
+        return con.prepared
+
+    def checkout(self):
+        """ take a connection of the pool for the current thread"""
+        con = self.pool.getconn(threading.current_thread().ident)
+        # the arrays (profiles tab_x, tab_z, ...) are read as numpy arrays
+        psycopg2.extensions.register_type(FLOAT8ARRAY_NUMPY, con)
+        self.con = con
+        return con
+
+    def release(self):
+        """ give back the connection of the current thread to the pool (end of a worker thread)"""
+        con = getattr(self.local, 'con', None)
+        self.local.con = None
+        if con is not None and self.pool is not None:
+            try:
+                if not con.closed:
+                    # the statements of this thread aren't left to the next user of the connection
+                    con.rollback()
+                    if getattr(con, 'prepared', None):
+                        con.cursor().execute("DEALLOCATE ALL;")
+                        con.commit()
+                        con.prepared.clear()
+                self.pool.putconn(con, threading.current_thread().ident, close=bool(con.closed))
+            except Exception:
+                pass
+
+    def worker(self, fct):
+        """ fct for a worker thread : the connection of the thread is given back to the pool at the end"""
+        def run(*args, **kwargs):
+            try:
+                return fct(*args, **kwargs)
+            finally:
+                self.release()
+        return run
+
+    def reconnect(self):
+        """ replace the connection of the current thread (dropped connection)"""
+        con = getattr(self.local, 'con', None)
+        self.local.con = None
+        if self.pool is None:
+            return None
+        if con is not None:
+            try:
+                self.pool.putconn(con, threading.current_thread().ident, close=True)
+            except Exception:
+                pass
+        try:
+            return self.checkout()
+        except psycopg2.Error as e:
+            self.mgis.add_info(u'{}'.format(repr(e)))
+            return None
+
+    def check_con(self):
+        """ health check of the connection of the thread, reconnect if it was dropped"""
+        con = self.con
+        if con is not None and con.closed:
+            if self.in_transaction():
+                return con
+            self.mgis.add_info('The connection was lost, reconnection ...')
+            con = self.reconnect()
+        return con
+
+    def in_transaction(self):
+        return getattr(self.local, 'depth', 0) > 0
+
+    @contextmanager
+    def transaction(self):
+        """
+        Transaction scope : the queries of the block are committed once at the end.
+        After an error, the transaction is rolled back and the next queries
+        of the block are ignored.
+        """
+        if not self.in_transaction():
+            self.local.echec = False
+        self.local.depth = getattr(self.local, 'depth', 0) + 1
+        try:
+            yield
+        except Exception:
+            self.local.depth -= 1
+            if self.con is not None and not self.con.closed:
+                self.con.rollback()
+            if not self.in_transaction():
+                self.local.echec = False
+            raise
+        self.local.depth -= 1
+        if not self.in_transaction():
+            if not self.local.echec and self.con is not None:
+                self.con.commit()
+            self.local.echec = False
+
+    def commit(self):
+        """ commit, except in a transaction scope"""
+        if not self.in_transaction():
+            self.con.commit()
+
+    def rollback(self):
+        """ rollback (of the whole transaction scope)"""
+        if self.con is not None and not self.con.closed:
+            self.con.rollback()
+        if self.in_transaction():
+            self.local.echec = True
+
+    def transaction_failed(self):
+        """ True if a query of the current transaction scope failed"""
+        return self.in_transaction() and self.local.echec
 
     def connect_pg(self):
         """
         Method for setting up PostgreSQL connection object as MasDatabase class instance attribute.
         Connection parameters are passed using the dsn.
+        The connections are given by a pool, one by thread.
 
         Returns:
             str: String message.
@@ -93,12 +310,18 @@ class ClassMasDatabase(object):
         try:
             conn_params = 'dbname={0} host={1} port={2} user={3} password={4}'.format(self.dbname, self.host, self.port,
                                                                                       self.user, self.password)
-            self.con = psycopg2.connect(conn_params)
+            if self.pool is not None:
+                self.pool.closeall()
+                self.local = threading.local()
+            self.pool = psycopg2.pool.ThreadedConnectionPool(1, self.MAX_CON, conn_params,
+                                                             connection_factory=MasConnection)
+            self.checkout()
             msg = 'Connection established.'
         except psycopg2.OperationalError as e:
-            self.mgis.iface.messageBar().pushMessage("Error",
-                                                     'Can\'t connect to PostGIS database. Check connection details!',
-                                                     level=QgsMessageBar.CRITICAL, duration=10)
+            if self.mgis.iface is not None:
+                self.mgis.iface.messageBar().pushMessage("Error",
+                                                         'Can\'t connect to PostGIS database. Check connection details!',
+                                                         level=QgsMessageBar.CRITICAL, duration=10)
             msg = 'Error: Can\'t connect to PostGIS database "{}".'.format(self.dbname)
 
         finally:
@@ -109,20 +332,25 @@ class ClassMasDatabase(object):
         """
         Closing connection to database.
         """
-        if self.con:
-            self.con.close()
-            self.con = None
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+            self.local = threading.local()
             self.register.clear()
             self.queries.clear()
+            self.cubes.clear()
+            self.obs.clear()
+            self.meteo.clear()
         else:
             self.mgis.add_info('Can not disconnect. There is no opened connection!')
 
     def execute(self, sql):
-        cur = self.con.cursor()
+        cur = self.check_con().cursor()
         cur.execute(sql)
-        self.con.commit()
+        self.commit()
 
-    def run_query(self, qry, fetch=False, arraysize=-1, be_quiet=False, namvar=False, many=False, list_many=[]):
+    def run_query(self, qry, fetch=False, arraysize=-1, be_quiet=False, namvar=False, many=False, list_many=[],
+                  params=None):
         """
         Running PostgreSQL queries
 
@@ -134,6 +362,7 @@ class ClassMasDatabase(object):
             namvar (bool): Flag if returning variables name of returning results
             many(bool): True :executemany
             list_many: list value
+            params (list/dict): parameters bound to the %s or %(name)s placeholders of the query
 
         Returns:
             list/generator/None: Returned value depends on the 'fetch' and 'arraysize' parameters.
@@ -142,26 +371,22 @@ class ClassMasDatabase(object):
         result = None
         descr = None
         try:
-            if self.con:
-                cur = self.con.cursor(cursor_factory=psycopg2.extras.DictCursor)
-                if many:
-                    cur.executemany(qry, list_many)
-                else:
-                    cur.execute(qry)
-                if fetch is True and arraysize <= 0:
-                    result = cur.fetchall()
-                    descr = cur.description
-                elif fetch is True and arraysize > 0:
-                    result = self.result_iter(cur, arraysize)
-                    descr = cur.description
-                else:
-                    descr = []
-                    result = []
-                self.con.commit()
+            if self.transaction_failed():
+                # a previous query of the transaction failed
+                pass
+            elif self.check_con():
+                try:
+                    result, descr = self.execute_query(qry, fetch, arraysize, many, list_many, params)
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    # connection dropped : new connection and second try (out of a transaction)
+                    if not self.con.closed or self.in_transaction() or self.reconnect() is None:
+                        raise
+                    result, descr = self.execute_query(qry, fetch, arraysize, many, list_many, params)
+                self.commit()
             else:
                 self.mgis.add_info('There is no opened connection! Use "connect_pg" method before running query.')
         except Exception as e:
-            self.con.rollback()
+            self.rollback()
             if be_quiet is False:
                 txt = u'{}'.format(repr(e))
                 self.mgis.add_info(txt)
@@ -174,6 +399,50 @@ class ClassMasDatabase(object):
             else:
                 return result
 
+    def execute_query(self, qry, fetch, arraysize, many, list_many, params):
+        """ execution of the query on the connection of the thread, return (result, description)"""
+        cur = self.con.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        if many:
+            cur.executemany(qry, list_many)
+        elif params is not None:
+            cur.execute(qry, params)
+        else:
+            cur.execute(qry)
+        if fetch is True and arraysize <= 0:
+            return cur.fetchall(), cur.description
+        elif fetch is True and arraysize > 0:
+            return self.result_iter(cur, arraysize), cur.description
+        return [], []
+
+    def run_prepared(self, name, params, fetch=True, namvar=False):
+        """
+        Execute a query of PREPARED, the statement is prepared
+        on the connection at its first use for the current schema.
+
+        Args:
+            name (str): name of the query in PREPARED
+            params (list): parameters of the query
+
+        Returns:
+            see run_query
+        """
+        cle = (self.SCHEMA, name)
+        if cle not in self.prepared:
+            stmt = 'mas_stmt_{0}'.format(len(self.prepared))
+            types, sql = self.PREPARED[name]
+            qry = "PREPARE {0} ({1}) AS {2};".format(stmt, ", ".join(types), sql.format(self.SCHEMA))
+            if self.run_query(qry) is None:
+                return (None, None) if namvar else None
+            self.prepared[cle] = stmt
+        sql = "EXECUTE {0} ({1});".format(self.prepared[cle], ", ".join(['%s'] * len(params)))
+        return self.run_query(sql, fetch=fetch, namvar=namvar, params=list(params))
+
+    def deallocate(self):
+        """ remove the prepared statements (structure of the tables changed)"""
+        if self.prepared and self.con:
+            self.run_query("DEALLOCATE ALL;")
+        self.prepared.clear()
+
     @staticmethod
     def result_iter(cursor, arraysize):
         """
@@ -415,7 +684,8 @@ class ClassMasDatabase(object):
             tables = [Maso.events, Maso.lateral_inflows, Maso.lateral_weirs, Maso.extremities,
                       Maso.flood_marks, Maso.hydraulic_head, Maso.outputs,
                       Maso.weirs, Maso.profiles, Maso.topo, Maso.branchs,
-                      Maso.observations, Maso.parametres, Maso.resultats, Maso.runs, Maso.laws,
+                      Maso.observations, Maso.parametres, Maso.runs, Maso.laws,
+                      Maso.results_envelope,
                       # bassin
                       Maso.basins, Maso.links, Maso.resultats_basin, Maso.resultats_links,
                       # qualite d'eau
@@ -436,6 +706,8 @@ class ClassMasDatabase(object):
                     # ajout variable fichier parameter
                     # req = """COPY {0}.parametres FROM '{1}' DELIMITER ',' CSV HEADER;"""
                     # req = """COPY {0}.parametres FROM '{1}' DELIMITER ',' CSV;"""
+            # results table partitioned by run
+            self.create_results_table()
             fichparam = os.path.join(dossier, "parametres.csv")
             # self.run_query(req.format(self.SCHEMA, fichparam))
             liste_value = []
@@ -576,12 +848,13 @@ class ClassMasDatabase(object):
         """
         try:
             self.run_query("CREATE EXTENSION postgis;")
-            self.disconnect_pg()
-            self.connect_pg()
+            self.reconnect()
 
             listefct = ['pg_create_calcul_abscisse',
                         'pg_create_calcul_abscisse_profil',
-                        'pg_create_calcul_abscisse_branche']
+                        'pg_create_calcul_abscisse_branche',
+                        'pg_create_calcul_tab_profil',
+                        'pg_create_calcul_tab_basin']
             for fct in listefct:
                 try:
                     obj = self.process_masobject(Maso.calcul_abscisse, fct)
@@ -721,12 +994,16 @@ $BODY$
     def load_model(self):
         """ Load model"""
         self.register.clear()
+        self.cubes.clear()
+        self.obs.clear()
+        self.meteo.clear()
+        self.deallocate()
         if self.last_schema:
             self.remove_group__layer("Mas_{}".format(self.last_schema))
         self.mgis.add_info('Current DB schema is: {0}'.format(self.SCHEMA))
         # crée index spatial si non existant
         self.create_spatial_index()
-        self.register_existing(Maso)
+        self.check_model()
         reg = [self.register[k].name for k in sorted(self.register.keys())]
         if self.mgis.DEBUG:
             self.mgis.add_info('Objects registered in the database:<br>  {0}'.format('<br>  '.join(reg)))
@@ -739,6 +1016,19 @@ $BODY$
         #
         self.load_gis_layer()
 
+    def check_model(self):
+        """ Update of the model tables (old models) and register of its objects,
+        used by load_model and the batch run"""
+        # arrays of the profiles and of the basins
+        self.check_tabs()
+        # results table and migration of the old results
+        self.check_results()
+        # key of the law tables
+        self.check_laws()
+        # index of the results tables
+        self.create_index_res()
+        self.register_existing(Maso)
+
     def remove_group__layer(self, name):
         root = QgsProject.instance().layerTreeRoot()
         group1 = root.findGroup(name)
@@ -776,15 +1066,16 @@ $BODY$
         return liste_x
 
     # PRBOLEM DESRIPTION
-    def select(self, table, where="", order=""):
-        """ Select variables of table"""
+    def select(self, table, where="", order="", params=None):
+        """ Select variables of table (params : values of the %s of where)"""
         if where:
             where = " WHERE " + where + " "
         if order:
             order = " ORDER BY " + order
 
         sql = "SELECT * FROM {0}.{1} {2} {3};"
-        (results, namCol) = self.run_query(sql.format(self.SCHEMA, table, where, order), fetch=True, namvar=True)
+        (results, namCol) = self.run_query(sql.format(self.SCHEMA, table, where, order), fetch=True, namvar=True,
+                                           params=params)
         cols = [col[0] for col in namCol]
         dico = {}
         for col in cols:
@@ -798,8 +1089,97 @@ $BODY$
                     dico[cols[i]].append(val)
         return dico
 
+    def select_columns(self, table, columns=None, where="", order="", params=None, batch=None):
+        """
+        Select the columns of table as numpy arrays (see query_columns)
+
+        Args:
+            columns (list): columns name, all the columns if None
+        """
+        if where:
+            where = " WHERE " + where + " "
+        if order:
+            order = " ORDER BY " + order
+        if columns:
+            cols = ", ".join('"{0}"'.format(c) for c in columns)
+        else:
+            cols = "*"
+        sql = "SELECT {0} FROM {1}.{2} {3} {4};"
+        return self.query_columns(sql.format(cols, self.SCHEMA, table, where, order), params, batch)
+
+    def query_columns(self, sql, params=None, batch=None):
+        """
+        Columnar select : the rows are read by batches with a server side cursor
+        and returned as one numpy array by column.
+        The numbers are float arrays (None -> NaN), the timestamps datetime64 arrays,
+        the other types object arrays (character stripped).
+
+        Args:
+            sql (str): query
+            params (list/dict): parameters of the query
+            batch (int): number of rows by fetch
+
+        Returns:
+            dict: column name -> numpy array, None if error
+        """
+        if batch is None:
+            batch = self.FETCH_BATCH
+        if self.transaction_failed() or not self.check_con():
+            return None
+        self.local.num_cur = getattr(self.local, 'num_cur', 0) + 1
+        try:
+            cur = self.con.cursor(name='mas_cur_{0}'.format(self.local.num_cur))
+            cur.itersize = batch
+            cur.execute(sql, params)
+            valeurs = None
+            while True:
+                rows = cur.fetchmany(batch)
+                if valeurs is None:
+                    valeurs = [[] for _ in cur.description]
+                if not rows:
+                    break
+                for val, col in zip(valeurs, zip(*rows)):
+                    val.extend(col)
+            descr = cur.description
+            cur.close()
+            self.commit()
+        except Exception as e:
+            self.rollback()
+            self.mgis.add_info(u'{}'.format(repr(e)))
+            return None
+        dico = {}
+        for col, val in zip(descr, valeurs):
+            if col.type_code in OID_FLOAT:
+                dico[col.name] = np.array(val, dtype=float)
+            elif col.type_code in OID_DATE:
+                dico[col.name] = np.array(val, dtype='datetime64[us]')
+            else:
+                if col.type_code in OID_CHAR:
+                    val = [v.strip() if v is not None else v for v in val]
+                tab = np.empty(len(val), dtype=object)
+                tab[:] = val
+                dico[col.name] = tab
+        return dico
+
+    def results_columns(self, id_runs, var, where="", order="", params=None):
+        """
+        Results of one (run, scenario) as numpy arrays (see query_columns) :
+        t, date, branche, section, pk and one column by variable of var.
+        The params (list) are bound to the %s placeholders of where.
+        """
+        if where:
+            where = " AND " + where + " "
+        if order:
+            order = " ORDER BY " + order
+        sql = "SELECT t, date, branche, section, pk, {0} FROM {1}.results WHERE id_runs = %s {2} " \
+              "GROUP BY t, date, branche, section, pk {3};"
+        cols = ", ".join('max(val) FILTER (WHERE var = %s) AS "{0}"'.format(v.replace('"', '""'))
+                         for v in var)
+        return self.query_columns(sql.format(cols, self.SCHEMA, where, order),
+                                  list(var) + [id_runs] + list(params or []))
+
     #
-    def select_one(self, table, where="", order=""):
+    def select_one(self, table, where="", order="", params=None):
         """select one variable"""
 
         if where:
@@ -810,7 +1190,7 @@ $BODY$
         sql = "SELECT * FROM {0}.{1} {2} {3};"
         # self.mgis.add_info(sql.format(self.SCHEMA, table, where, order))
         (results, namCol) = self.run_query(sql.format(self.SCHEMA, table, where, order),
-                                           fetch=True, arraysize=1, namvar=True)
+                                           fetch=True, arraysize=1, namvar=True, params=params)
 
         cols = [col[0] for col in namCol]
         results = [col[0] for col in results]
@@ -824,14 +1204,15 @@ $BODY$
         return dico
 
     #
-    def select_distinct(self, var, table, where="", ordre=None):
+    def select_distinct(self, var, table, where="", ordre=None, params=None):
         """select the "where" variable which is multiple"""
         if ordre is None:
             ordre = var
         if where:
             where = "WHERE " + where
         sql = "SELECT DISTINCT {0} FROM {1}.{2} {3} ORDER BY {4};"
-        (results, namCol) = self.run_query(sql.format(var, self.SCHEMA, table, where, ordre), fetch=True, namvar=True)
+        (results, namCol) = self.run_query(sql.format(var, self.SCHEMA, table, where, ordre), fetch=True, namvar=True,
+                                           params=params)
         cols = [col[0] for col in namCol]
         dico = {}
         for row in results:
@@ -845,24 +1226,26 @@ $BODY$
         return dico
 
     #
-    def select_max(self, var, table, where=None):
+    def select_max(self, var, table, where=None, params=None):
         """select the max in the table for the "where" variable"""
         if where:
             sql = "SELECT MAX({0}) FROM {1}.{2} WHERE {3};".format(var, self.SCHEMA, table, where)
         else:
             sql = "SELECT MAX({0}) FROM {1}.{2};".format(var, self.SCHEMA, table)
-        results = self.run_query(sql, fetch=True, arraysize=1)
+        results = self.run_query(sql, fetch=True, arraysize=1, params=params)
         # results obj: generator
         for row in results:
             var = row[0][0]
         return var
 
-    def delete(self, table, where=None):
+    def delete(self, table, where=None, params=None):
         """ Delete table information"""
         if where:
             where = "WHERE {0}".format(where)
+        else:
+            where = ""
         sql = "DELETE FROM {0}.{1} {2} ;".format(self.SCHEMA, table, where)
-        self.run_query(sql)
+        self.run_query(sql, params=params)
         # if self.mgis.DEBUG:
         #     self.mgis.add_info('function delete end')
 
@@ -914,62 +1297,605 @@ $BODY$
                                                             ",".join(valeurs))
         self.run_query(sql)
 
-    def insert_res(self, table, liste_value, colonnes):
-        var = ",".join(colonnes)
-        temp = []
-        for k in colonnes:
-            temp.append('%s')
-        valeurs = "({})".format(",".join(temp))
+    def insert_res(self, table, liste_value, colonnes, chunk=None):
+        """ insert results (list or generator of rows) with COPY"""
+        return self.copy_res(table, liste_value, colonnes, chunk)
 
-        sql = "INSERT INTO {0}.{1}({2}) VALUES {3};".format(self.SCHEMA,
-                                                            table,
-                                                            var,
-                                                            valeurs)
-        self.run_query(sql, many=True, list_many=liste_value)
+    def copy_res(self, table, rows, colonnes, chunk=None):
+        """
+        Streaming of rows in table with COPY ... FROM STDIN.
+        The rows are written by chunks in a text buffer, so the memory
+        doesn't depend on the number of rows.
 
-    def update_res(self, table, liste_value, colonnes):
-
-        sql = ''
-        for value in liste_value:
-            condition = """run='{0}' AND scenario='{1}' """.format(value[colonnes.index('run')],
-                                                                   value[colonnes.index('scenario')])
-            condition += """AND branche='{}' """.format(value[colonnes.index('branche')])
-            condition += """AND t='{}' """.format(value[colonnes.index('t')])
-            condition += """AND section='{}' """.format(value[colonnes.index('section')])
-            condition += """AND pk='{}' """.format(value[colonnes.index('pk')])
-            if "date" in colonnes:
-                condition += """AND date='{:%Y-%m-%d %H:%M:%S}' """.format(value[colonnes.index("date")])
-            list_exclu = ['run', 'scenario', 'date', 't', 'branche', 'section', 'pk']
-            values = ''
-            for i, col in enumerate(colonnes):
-                if col not in list_exclu:
-                    values += "{}='{}' ,".format(col, value[i])
-            values = values[:-1]
-            sql += "UPDATE  {0}.{1} SET {2} WHERE {3};\n".format(self.SCHEMA, table, values, condition)
+        Args:
+            table (str): table name
+            rows (iterable): rows (list of values ordered as colonnes)
+            colonnes (list): columns name
+            chunk (int): number of rows by COPY
 
-        self.run_query(sql)
+        Returns:
+            int: number of rows copied, None if error
+        """
+        if not self.check_con():
+            self.mgis.add_info('There is no opened connection! Use "connect_pg" method before running query.')
+            return None
+        try:
+            cur = self.con.cursor()
+            nb = self.copy_cursor(cur, "{0}.{1}".format(self.SCHEMA, table), rows, colonnes, chunk)
+            self.commit()
+        except Exception as e:
+            self.rollback()
+            self.mgis.add_info(u'{}'.format(repr(e)))
+            return None
+        return nb
+
+    def check_laws(self):
+        """ Unique index on the key of the law tables (the duplicates of the old models are removed)"""
+        tables = self.list_tables()
+        sql = "SELECT count(*) FROM pg_index WHERE indrelid = %s::regclass AND indisunique;"
+        for table, cles in self.LAW_TABLES.items():
+            if table not in tables:
+                continue
+            res = self.run_query(sql, fetch=True, params=['{0}.{1}'.format(self.SCHEMA, table)])
+            if not res or res[0][0] > 0:
+                continue
+            qry = "DELETE FROM {0}.{1} a USING {0}.{1} b WHERE {2} AND a.ctid < b.ctid;\n" \
+                  "CREATE UNIQUE INDEX IF NOT EXISTS {1}_cle ON {0}.{1} ({3});"
+            self.run_query(qry.format(self.SCHEMA, table,
+                                      " AND ".join("a.{0} = b.{0}".format(c) for c in cles),
+                                      ", ".join(cles)))
+
+    def save_law(self, table, id_config, rows, chunk=None):
+        """
+        Save the law id_config of a law table (see LAW_TABLES).
+        The rows are copied in a temporary table and only the differences
+        are written : the rows removed are deleted, the new or changed rows
+        are inserted or updated (ON CONFLICT on the key of the table).
+
+        Args:
+            table (str): law table
+            id_config (int): id of the law
+            rows (iterable): rows (key columns without id_config, value)
+            chunk (int): number of rows by COPY
+
+        Returns:
+            tuple: (rows deleted, rows written), None if error
+        """
+        cles = self.LAW_TABLES[table]
+        colonnes = cles + ['value']
+        if not self.check_con():
+            self.mgis.add_info('There is no opened connection! Use "connect_pg" method before running query.')
+            return None
+        try:
+            cur = self.con.cursor()
+            cur.execute("DROP TABLE IF EXISTS pg_temp.law_stage;")
+            cur.execute("CREATE TEMP TABLE law_stage ON COMMIT DROP AS "
+                        "SELECT {0} FROM {1}.{2} WITH NO DATA;".format(", ".join(colonnes), self.SCHEMA, table))
+            self.copy_cursor(cur, 'law_stage', ([id_config] + list(row) for row in rows), colonnes, chunk)
+            sql = "DELETE FROM {0}.{1} t WHERE t.id_config = %s " \
+                  "AND NOT EXISTS (SELECT 1 FROM law_stage s WHERE {2});"
+            cur.execute(sql.format(self.SCHEMA, table, " AND ".join("s.{0} = t.{0}".format(c) for c in cles)),
+                        [id_config])
+            nb_del = cur.rowcount
+            # last row of the duplicated keys
+            sql = "INSERT INTO {0}.{1} ({2}) " \
+                  "SELECT DISTINCT ON ({3}) {2} FROM law_stage ORDER BY {3}, ctid DESC " \
+                  "ON CONFLICT ({3}) DO UPDATE SET value = EXCLUDED.value " \
+                  "WHERE {1}.value IS DISTINCT FROM EXCLUDED.value;"
+            cur.execute(sql.format(self.SCHEMA, table, ", ".join(colonnes), ", ".join(cles)))
+            nb = cur.rowcount
+            self.commit()
+        except Exception as e:
+            self.rollback()
+            self.mgis.add_info(u'{}'.format(repr(e)))
+            return None
+        return nb_del, nb
+
+    def copy_observations(self, rows, chunk=None):
+        """
+        Import of observations with COPY in a staging table.
+        The observations already in the table (same code, type and date)
+        and the duplicates of the rows aren't inserted.
+
+        Args:
+            rows (iterable): rows (code, type, comment, valeur, date)
+            chunk (int): number of rows by COPY
+
+        Returns:
+            tuple: (rows inserted, duplicates), None if error
+        """
+        if not self.check_con():
+            self.mgis.add_info('There is no opened connection! Use "connect_pg" method before running query.')
+            return None
+        colonnes = ['code', 'type', 'comment', 'valeur', 'date']
+        try:
+            cur = self.con.cursor()
+            cur.execute("DROP TABLE IF EXISTS pg_temp.observations_stage;")
+            cur.execute("CREATE TEMP TABLE observations_stage (code character(10), type character(1), "
+                        "comment character varying(50), valeur float, date timestamp without time zone) "
+                        "ON COMMIT DROP;")
+            nb = self.copy_cursor(cur, 'observations_stage', rows, colonnes, chunk)
+            sql = "INSERT INTO {0}.observations ({1}) " \
+                  "SELECT DISTINCT ON (s.code, s.type, s.date) {2} FROM observations_stage s " \
+                  "WHERE NOT EXISTS (SELECT 1 FROM {0}.observations o " \
+                  "WHERE o.code = s.code AND o.type = s.type AND o.date = s.date) " \
+                  "ORDER BY s.code, s.type, s.date, s.ctid;"
+            cur.execute(sql.format(self.SCHEMA, ", ".join(colonnes), ", ".join("s." + c for c in colonnes)))
+            nb_ins = cur.rowcount
+            self.commit()
+        except Exception as e:
+            self.rollback()
+            self.mgis.add_info(u'{}'.format(repr(e)))
+            return None
+        return nb_ins, nb - nb_ins
+
+    def copy_query(self, sql, fich):
+        """
+        Write the rows of the query in the file object fich with COPY ... TO STDOUT
+
+        Returns:
+            bool: False if error
+        """
+        if not self.check_con():
+            self.mgis.add_info('There is no opened connection! Use "connect_pg" method before running query.')
+            return False
+        try:
+            cur = self.con.cursor()
+            cur.copy_expert("COPY ({0}) TO STDOUT;".format(sql.strip().rstrip(';')), fich)
+            self.commit()
+        except Exception as e:
+            self.rollback()
+            self.mgis.add_info(u'{}'.format(repr(e)))
+            return False
+        return True
+
+    def copy_cursor(self, cur, table, rows, colonnes, chunk=None):
+        """ COPY of rows by chunks with the cursor (without commit)"""
+        if chunk is None:
+            chunk = self.COPY_CHUNK
+        sql = "COPY {0}({1}) FROM STDIN;".format(table, ",".join(colonnes))
+        nb = 0
+        buf = StringIO()
+        size = 0
+        for row in rows:
+            buf.write(self.copy_line(row))
+            size += 1
+            if size >= chunk:
+                buf.seek(0)
+                cur.copy_expert(sql, buf)
+                nb += size
+                buf = StringIO()
+                size = 0
+        if size > 0:
+            buf.seek(0)
+            cur.copy_expert(sql, buf)
+            nb += size
+        return nb
+
+    @staticmethod
+    def copy_line(row):
+        """ format one row for COPY text format"""
+        txt = []
+        for val in row:
+            if val is None:
+                txt.append('\\N')
+            elif isinstance(val, datetime.datetime):
+                txt.append('{:%Y-%m-%d %H:%M:%S}'.format(val))
+            else:
+                val = str(val).strip()
+                if val == '':
+                    txt.append('\\N')
+                else:
+                    txt.append(val.replace('\\', '\\\\').replace('\t', ' '))
+        return '\t'.join(txt) + '\n'
+
+    def update_res(self, id_runs, rows, colonnes, chunk=None):
+        """
+        Merge new values in the results of one (run, scenario),
+        for example the tracer results imported again.
+        The rows are copied in a temporary table, the values of the existing
+        (t, branche, section, var) are updated and the other ones are inserted
+        with the date and pk of the section at the same time, in one query.
+        The variables of the run and its envelope are updated.
+
+        Args:
+            id_runs (int): id of runs table
+            rows (iterable): rows of results (t, branche, section, [pk], variables)
+            colonnes (list): columns name of the rows
+            chunk (int): number of rows by COPY
+
+        Returns:
+            tuple: (values updated, values inserted), None if error
+        """
+        cles = ['t', 'branche', 'section']
+        types = {'branche': 'integer', 'section': 'integer'}
+        var = [c for c in colonnes if c not in cles + ['pk', 'date', 'run', 'scenario']]
+        if not var:
+            return 0, 0
+        if not self.check_con():
+            self.mgis.add_info('There is no opened connection! Use "connect_pg" method before running query.')
+            return None
+        obj = self.results_obj()
+        part = obj.partition_name(id_runs)
+        try:
+            cur = self.con.cursor()
+            cur.execute(obj.pg_create_update_index(id_runs))
+            cur.execute("DROP TABLE IF EXISTS pg_temp.update_stage;")
+            cur.execute("CREATE TEMP TABLE update_stage ({0}) ON COMMIT DROP;".format(
+                ", ".join('"{0}" {1}'.format(c, types.get(c, 'float')) for c in colonnes)))
+            self.copy_cursor(cur, 'update_stage', rows, ['"{0}"'.format(c) for c in colonnes], chunk)
+            cur.execute("ANALYZE update_stage;")
+            # the update and the insert see the partition before the query
+            sql = "WITH v AS (SELECT s.t, s.branche, s.section, {2} AS pk, v.var, v.val FROM update_stage s " \
+                  "           CROSS JOIN LATERAL (VALUES {3}) AS v(var, val) " \
+                  "           WHERE v.val IS NOT NULL AND v.val <> 'NaN'), " \
+                  "upd AS (UPDATE {0} AS r SET val = v.val FROM v " \
+                  "        WHERE r.t = v.t AND r.section = v.section AND r.var = v.var " \
+                  "        AND r.branche = v.branche RETURNING 1), " \
+                  "ins AS (INSERT INTO {0} (id_runs, t, date, branche, section, pk, var, val) " \
+                  "        SELECT {1}, v.t, h.date, v.branche, v.section, COALESCE(v.pk, h.pk), v.var, v.val " \
+                  "        FROM v LEFT JOIN LATERAL (SELECT date, pk FROM {0} AS h " \
+                  "                                  WHERE h.t = v.t AND h.section = v.section " \
+                  "                                  AND h.branche = v.branche LIMIT 1) AS h ON TRUE " \
+                  "        WHERE NOT EXISTS (SELECT 1 FROM {0} AS r WHERE r.t = v.t AND r.section = v.section " \
+                  "                          AND r.var = v.var AND r.branche = v.branche) RETURNING 1) " \
+                  "SELECT (SELECT count(*) FROM upd), (SELECT count(*) FROM ins);"
+            cur.execute(sql.format(part, id_runs,
+                                   's.pk' if 'pk' in colonnes else 'NULL::float',
+                                   ", ".join("('{0}', s.\"{0}\")".format(c) for c in var)))
+            nb_upd, nb_ins = cur.fetchone()
+            cur.execute("SELECT var FROM {0}.runs WHERE id = %s;".format(self.SCHEMA), [id_runs])
+            row = cur.fetchone()
+            variables = row[0].split(',') if row and row[0] else []
+            variables += [v for v in var if v not in variables]
+            cur.execute("UPDATE {0}.runs SET var = %s WHERE id = %s;".format(self.SCHEMA),
+                        [",".join(variables), id_runs])
+            cur.execute("ANALYZE {0};".format(part))
+            cur.execute(self.envelope_obj().pg_fill(id_runs, part))
+            self.commit()
+        except Exception as e:
+            self.rollback()
+            self.mgis.add_info(u'{}'.format(repr(e)))
+            return None
+        return nb_upd, nb_ins
+
+    def partitioned(self):
+        """ True if the server has the declarative partitioning (PostgreSQL >= 10)"""
+        return self.con is not None and self.con.server_version >= 100000
+
+    def results_obj(self):
+        """ results object with the current schema"""
+        self.setup_hydro_object(Maso.results)
+        return Maso.results()
+
+    def envelope_obj(self):
+        """ results_envelope object with the current schema"""
+        self.setup_hydro_object(Maso.results_envelope)
+        return Maso.results_envelope()
+
+    def create_results_table(self):
+        """ Create the results table partitioned by id_runs"""
+        return self.process_masobject(Maso.results, 'pg_create_table', declarative=self.partitioned())
+
+    def check_tabs(self):
+        """ Add the arrays of the profiles (tab_x, tab_z, tab_xmnt, tab_zmnt)
+        and of the basins (tab_level, tab_area, tab_volume) to the old models"""
+        tables = self.list_tables()
+        for obj, fct in ((Maso.profiles, 'pg_create_calcul_tab_profil'),
+                         (Maso.basins, 'pg_create_calcul_tab_basin')):
+            if obj.__name__ not in tables:
+                continue
+            # function of the trigger (replaced for the models with the former function)
+            self.run_query(getattr(Maso.calcul_abscisse(), fct)())
+            self.setup_hydro_object(obj)
+            obj = obj()
+            if 'tab_' + obj.tabs[0] in self.list_columns(obj.name):
+                continue
+            self.mgis.add_info('Migration of the {0} ...'.format(obj.name))
+            self.run_query(obj.pg_update_tab())
+
+    def check_results(self):
+        """ Create the results table if it doesn't exist and migrate the old resultats table"""
+        tables = self.list_tables()
+        if 'runs' not in tables:
+            return
+        sql = """ALTER TABLE {}.runs ADD COLUMN IF NOT EXISTS var text;"""
+        self.run_query(sql.format(self.SCHEMA))
+        if 'results' not in tables:
+            self.create_results_table()
+        if 'resultats' in tables:
+            self.migrate_results()
+        if 'results_envelope' not in tables:
+            self.create_envelope()
+
+    def create_envelope(self):
+        """ Create the results_envelope table and compute the envelope of the existing runs"""
+        self.process_masobject(Maso.results_envelope, 'pg_create_table')
+        tables = self.list_tables()
+        obj = self.results_obj()
+        env = self.envelope_obj()
+        sql = "SELECT id FROM {0}.runs ORDER BY id;"
+        rows = self.run_query(sql.format(self.SCHEMA), fetch=True)
+        if not rows:
+            return
+        qry = ''
+        for row in rows:
+            if '{0}_{1}'.format(obj.name, row[0]) in tables:
+                qry += env.pg_fill(row[0], obj.partition_name(row[0]))
+        if qry:
+            self.run_query(qry)
+
+    def migrate_results(self):
+        """
+        Copy the results of the old resultats table in the results partitions.
+        The migration is done in one transaction, the old table is kept
+        as resultats_old (backup which can be deleted by the user).
+        """
+        self.mgis.add_info('Migration of the results in the new results table ...')
+        if 'resultats_old' in self.list_tables():
+            self.mgis.add_info('Migration of the results canceled : the resultats_old table already exists.')
+            return
+        cles = ['id', 'run', 'scenario', 'date', 't', 'branche', 'section', 'pk', 'bnum', 'lnum']
+        cols = [c for c in self.list_columns('resultats') if c not in cles]
+        obj = self.results_obj()
+        sql = "SELECT id, run, scenario FROM {0}.runs ORDER BY id;"
+        rows = self.run_query(sql.format(self.SCHEMA), fetch=True)
+        if rows is None:
+            return
+        values = ", ".join("('{0}', r.{0}::float)".format(c) for c in cols)
+        with self.transaction():
+            # the rows of one run are read with the index
+            self.run_query("CREATE INDEX IF NOT EXISTS resultats_run_scen ON {0}.resultats (run, scenario);"
+                           .format(self.SCHEMA))
+            for id_runs, run, scen in rows:
+                self.run_query(obj.pg_create_partition(id_runs, self.partitioned()))
+                # one pass : the variables are returned by the insert
+                sql = "WITH ins AS (INSERT INTO {0} (id_runs, t, date, branche, section, pk, var, val) " \
+                      "SELECT %s, r.t, r.date, r.branche, r.section, r.pk, v.var, v.val " \
+                      "FROM {1}.resultats r CROSS JOIN LATERAL (VALUES {2}) AS v(var, val) " \
+                      "WHERE r.run = %s AND r.scenario = %s AND v.val IS NOT NULL RETURNING var) " \
+                      "SELECT var FROM ins GROUP BY var;"
+                res = self.run_query(sql.format(obj.partition_name(id_runs), self.SCHEMA, values),
+                                     fetch=True, params=[id_runs, run, scen]) if cols else []
+                if res is None:
+                    break
+                var = [c for c in cols if c in [v[0] for v in res]]
+                self.run_query(obj.pg_create_partition_index(id_runs))
+                self.run_query("UPDATE {0}.runs SET var=%s WHERE id=%s;".format(self.SCHEMA),
+                               params=[",".join(var), id_runs])
+            self.run_query("ALTER TABLE {0}.resultats RENAME TO resultats_old;".format(self.SCHEMA))
+            ok = not self.transaction_failed()
+        if ok:
+            self.mgis.add_info('Migration of the results is done, '
+                               'the old results are kept in the resultats_old table.')
+        else:
+            self.mgis.add_info('Migration of the results failed, the resultats table is kept.')
+
+    def get_id_run(self, run, scenario):
+        """ id of (run, scenario) in runs table"""
+        rows = self.run_prepared('get_id_run', [run, scenario])
+        if rows:
+            return rows[0][0]
+        return None
+
+    def load_results(self, id_runs, rows, colonnes):
+        """
+        Load the results of one (run, scenario) in its partition.
+        The rows are copied in a temporary table and converted
+        in (var, val) rows by the server, then the envelope
+        of the run is computed.
+
+        Args:
+            id_runs (int): id of runs table
+            rows (iterable): rows of results
+            colonnes (list): columns name of the rows
+
+        Returns:
+            list: variables loaded, None if error
+        """
+        cles = ['t', 'date', 'branche', 'section', 'pk']
+        types = {'date': 'timestamp without time zone', 'branche': 'integer',
+                 'section': 'integer', 'run': 'text', 'scenario': 'text'}
+        var = [c for c in colonnes if c not in cles + ['run', 'scenario']]
+        obj = self.results_obj()
+        try:
+            cur = self.con.cursor()
+            cur.execute(obj.pg_create_partition(id_runs, self.partitioned()))
+            cur.execute("DROP TABLE IF EXISTS pg_temp.results_stage;")
+            cur.execute("CREATE TEMP TABLE results_stage ({0}) ON COMMIT DROP;".format(
+                ", ".join('"{0}" {1}'.format(c, types.get(c, 'float')) for c in colonnes)))
+            self.copy_cursor(cur, 'results_stage', rows, ['"{0}"'.format(c) for c in colonnes])
+            sql = "INSERT INTO {0} (id_runs, t, date, branche, section, pk, var, val) " \
+                  "SELECT {1}, {2}, v.var, v.val FROM results_stage s " \
+                  "CROSS JOIN LATERAL (VALUES {3}) AS v(var, val) " \
+                  "WHERE v.val IS NOT NULL AND v.val <> 'NaN';"
+            cur.execute(sql.format(obj.partition_name(id_runs),
+                                   id_runs,
+                                   ", ".join('s."{0}"'.format(c) if c in colonnes else 'NULL' for c in cles),
+                                   ", ".join("('{0}', s.\"{0}\")".format(c) for c in var)))
+            cur.execute(obj.pg_create_partition_index(id_runs))
+            cur.execute("ANALYZE {0};".format(obj.partition_name(id_runs)))
+            # max, min of the variables by section
+            cur.execute(self.envelope_obj().pg_fill(id_runs, obj.partition_name(id_runs)))
+            self.commit()
+        except Exception as e:
+            self.rollback()
+            self.mgis.add_info(u'{}'.format(repr(e)))
+            return None
+        return var
+
+    def create_index_res(self):
+        """ Create the missing indexes of the results and observations tables (old models)"""
+        tables = self.list_tables()
+        qry = ''
+        for masobj_class in [Maso.runs, Maso.resultats_basin, Maso.resultats_links, Maso.observations]:
+            self.setup_hydro_object(masobj_class)
+            obj = masobj_class()
+            if obj.name in tables:
+                qry += obj.pg_create_index_res()
+        if 'results' in tables and 'runs' in tables:
+            obj = self.results_obj()
+            sql = "SELECT id FROM {0}.runs;"
+            rows = self.run_query(sql.format(self.SCHEMA), fetch=True)
+            for row in rows or []:
+                if '{0}_{1}'.format(obj.name, row[0]) in tables:
+                    qry += obj.pg_create_partition_index(row[0])
+        if qry:
+            self.run_query(qry)
+
+    def delete_runs(self, where, progress=None):
+        """
+        Delete the runs selected by where (condition on runs table) and their results.
+        The results partition is dropped, the basin and link results
+        are deleted with the (run, scenario) index.
+
+        Args:
+            where (str): condition on runs table
+            progress (function): called with the percentage after each run
+        """
+        sql = "SELECT id, run, scenario FROM {0}.runs WHERE {1};"
+        rows = self.run_query(sql.format(self.SCHEMA, where), fetch=True)
+        if not rows:
+            return
+        tables = self.list_tables()
+        obj = self.results_obj()
+        # one transaction : the runs are all deleted or none
+        with self.transaction():
+            for i, (id_runs, run, scen) in enumerate(rows):
+                qry = obj.pg_drop_partition(id_runs)
+                condition = "run='{0}' AND scenario='{1}'".format(run, scen)
+                for table in ['resultats_basin', 'resultats_links']:
+                    if table in tables:
+                        qry += "DELETE FROM {0}.{1} WHERE {2};\n".format(self.SCHEMA, table, condition)
+                if 'results_envelope' in tables:
+                    qry += "DELETE FROM {0}.results_envelope WHERE id_runs={1};\n".format(self.SCHEMA, id_runs)
+                qry += "DELETE FROM {0}.runs WHERE id={1};\n".format(self.SCHEMA, id_runs)
+                self.run_query(qry)
+                self.cubes.clear(id_runs)
+                if progress:
+                    progress(int((i + 1) * 100. / len(rows)))
+
+    def select_results(self, id_runs, where="", order="", params=None):
+        """
+        Select the results of one (run, scenario).
+        Same format than select : one list by key column and by variable.
+        """
+        if where:
+            where = " AND " + where + " "
+        if order:
+            order = " ORDER BY " + order
+        sql = "SELECT t, date, branche, section, pk, array_agg(var) AS var, array_agg(val) AS val " \
+              "FROM {0}.results WHERE id_runs={1} {2} " \
+              "GROUP BY t, date, branche, section, pk {3};"
+        rows = self.run_query(sql.format(self.SCHEMA, id_runs, where, order), fetch=True, params=params)
+        return self.results_dico(rows)
+
+    def results_at(self, id_runs, t=None, date=None):
+        """ results of one (run, scenario) at the time t (or date), sorted by pk"""
+        if date is not None:
+            rows = self.run_prepared('results_date', [id_runs, date])
+        else:
+            rows = self.run_prepared('results_t', [id_runs, t])
+        return self.results_dico(rows)
+
+    def results_at_pk(self, id_runs, pk):
+        """ results of one (run, scenario) at pk, sorted by t"""
+        return self.results_dico(self.run_prepared('results_pk', [id_runs, pk]))
+
+    @staticmethod
+    def results_dico(rows):
+        """ rows (t, date, branche, section, pk, var, val) -> one list by key column and by variable"""
+        cles = ['t', 'date', 'branche', 'section', 'pk']
+        dico = {c: [] for c in cles}
+        if not rows:
+            return dico
+        variables = []
+        for row in rows:
+            for v in row['var']:
+                if v not in variables:
+                    variables.append(v)
+        for v in variables:
+            dico[v] = []
+        for row in rows:
+            for c in cles:
+                dico[c].append(row[c])
+            val = dict(zip(row['var'], row['val']))
+            for v in variables:
+                dico[v].append(val.get(v))
+        return dico
+
+    def select_envelope(self, id_runs, var, where="", order="pk"):
+        """ envelope (vmax, vmin, tmax, datemax) of var for one (run, scenario)"""
+        condition = "id_runs=%s AND var=%s"
+        if where:
+            condition += " AND " + where
+        return self.select("results_envelope", condition, order, params=[id_runs, var])
+
+    def results_times(self, id_runs):
+        """ times and dates of the results of one (run, scenario)"""
+        rows = self.run_prepared('results_times', [id_runs])
+        dico = {'t': [], 'date': []}
+        if rows:
+            for t, date in rows:
+                dico['t'].append(t)
+                dico['date'].append(date)
+        return dico
+
+    def results_pk(self, id_runs):
+        """ sorted pk of the results of one (run, scenario)"""
+        sql = "SELECT pk FROM {0}.runs WHERE id={1};"
+        rows = self.run_query(sql.format(self.SCHEMA, id_runs), fetch=True)
+        liste = []
+        if rows and rows[0][0]:
+            liste = sorted(set(round(float(v), 2) for v in rows[0][0].split(',') if v.strip()))
+        return liste
+
+    def results_var(self, where=""):
+        """ list of the variables of the runs"""
+        if where:
+            where = "WHERE " + where
+        sql = "SELECT var FROM {0}.runs {1} ORDER BY id;"
+        rows = self.run_query(sql.format(self.SCHEMA, where), fetch=True)
+        liste = []
+        if rows:
+            for row in rows:
+                if row[0]:
+                    for v in row[0].split(','):
+                        if v not in liste:
+                            liste.append(v)
+        return liste
+
+    def select_law(self, name, type):
+        """ law of the laws table (prepared query), same format than select_one, None if not found or error"""
+        rows, descr = self.run_prepared('law', [name, type], namvar=True)
+        if not rows:
+            return None
+        return dict(zip([col[0] for col in descr], rows[0]))
 
     def update(self, table, tab, var="nom"):
         """update info"""
         for nom, t in tab.items():
             tab_var = []
+            valeurs = []
             for k, v in tab[nom].items():
-                if not v:
-                    tab_var.append("{0}=NULL".format(k))
-                elif isinstance(v, str):
-                    tab_var.append("{0}='{1}'".format(k, v))
+                tab_var.append("{0}=%s".format(k))
+                if isinstance(v, np.ndarray):
+                    # double precision[] column
+                    valeurs.append(v)
+                elif not v:
+                    valeurs.append(None)
                 elif isinstance(v, list):
-                    tab_var.append("{0}='{1}'".format(k, " ".join(map(str, v))))
+                    valeurs.append(" ".join(map(str, v)))
                 else:
-                    tab_var.append("{0}={1}".format(k, v))
+                    valeurs.append(v)
 
-            sql = """UPDATE {0}.{1} SET {2}  WHERE {3}='{4}'"""
+            sql = """UPDATE {0}.{1} SET {2}  WHERE {3}=%s"""
 
             self.run_query(sql.format(self.SCHEMA,
                                       table,
                                       ", ".join(tab_var),
-                                      var,
-                                      nom))
+                                      var),
+                           params=valeurs + [nom])
             if self.mgis.DEBUG:
                 self.mgis.add_info('function update end')
 
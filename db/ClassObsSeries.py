@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+Name                 : Mascaret
+Description          : Pre and Postprocessing for Mascaret for QGIS
+Date                 : June,2017
+copyright            : (C) 2017 by Artelia
+email                :
+***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+import numpy as np
+
+
+class ClassObsSeries(object):
+    """
+    Cache of the observations by (code, type), as numpy arrays sorted by date.
+    The stations are loaded in one query and kept for the next scenarios or graphs.
+    """
+
+    def __init__(self, mdb):
+        self.mdb = mdb
+        self.series = {}
+
+    def clear(self, code=None):
+        """ clear the cache (or the series of the station code)"""
+        if code is None:
+            self.series.clear()
+        else:
+            for cle in [cle for cle in self.series if cle[0] == code]:
+                del self.series[cle]
+
+    def charge(self, codes, type, debut, fin):
+        """
+        Load the observations of the stations between debut and fin (datetime)
+        in one query. The stations already loaded on the period aren't requested.
+        """
+        manque = []
+        for code in set(codes):
+            serie = self.series.get((code, type))
+            if serie is None or serie['debut'] > debut or serie['fin'] < fin:
+                manque.append(code)
+                if serie is not None:
+                    debut = min(debut, serie['debut'])
+                    fin = max(fin, serie['fin'])
+        if not manque:
+            return
+        sql = """SELECT code, date, valeur FROM {0}.observations
+                 WHERE type = %s AND code = ANY(%s)
+                 AND date >= %s AND date <= %s
+                 ORDER BY code, date;"""
+        rows = self.mdb.run_query(sql.format(self.mdb.SCHEMA), fetch=True,
+                                  params=[type, sorted(manque), debut, fin])
+        if rows is None:
+            return
+        codes = np.array([row[0].strip() for row in rows], dtype=object)
+        dates = np.array([row[1] for row in rows], dtype='datetime64[us]')
+        valeurs = np.array([row[2] for row in rows], dtype=float)
+        for code in manque:
+            cond = codes == code
+            self.series[(code, type)] = {'debut': debut, 'fin': fin,
+                                         'date': dates[cond], 'valeur': valeurs[cond]}
+
+    def serie(self, code, type, debut=None, fin=None):
+        """ dates and values of the station (loaded if needed)"""
+        if debut is not None and fin is not None:
+            self.charge([code], type, debut, fin)
+        serie = self.series.get((code, type))
+        if serie is None:
+            return np.zeros(0, dtype='datetime64[us]'), np.zeros(0)
+        dates, valeurs = serie['date'], serie['valeur']
+        cond = np.ones(dates.shape[0], dtype=bool)
+        if debut is not None:
+            cond &= dates >= np.datetime64(debut)
+        if fin is not None:
+            cond &= dates <= np.datetime64(fin)
+        return dates[cond], valeurs[cond]
+
+    def valeurs(self, code, type, dates, interpole=False):
+        """
+        Values of the station at the dates (numpy datetime64 array)
+
+        Args:
+            interpole (bool): False : value observed at the date,
+                              True : linear interpolation between the observations
+
+        Returns:
+            numpy array: NaN where there isn't value
+        """
+        obs_dates, obs_val = self.serie(code, type)
+        res = np.full(dates.shape[0], np.nan)
+        if obs_dates.shape[0] == 0 or dates.shape[0] == 0:
+            return res
+        if interpole:
+            sec = (dates - obs_dates[0]) / np.timedelta64(1, 's')
+            obs_sec = (obs_dates - obs_dates[0]) / np.timedelta64(1, 's')
+            dedans = (sec >= obs_sec[0]) & (sec <= obs_sec[-1])
+            res[dedans] = np.interp(sec[dedans], obs_sec, obs_val)
+        else:
+            idx = np.minimum(np.searchsorted(obs_dates, dates), obs_dates.shape[0] - 1)
+            res = np.where(obs_dates[idx] == dates, obs_val[idx], np.nan)
+        return res
+
+    def resample(self, code, type, debut, fin, pas):
+        """
+        Observations interpolated on a regular grid
+
+        Args:
+            pas (float): time step (s)
+
+        Returns:
+            tuple: (dates, values)
+        """
+        self.charge([code], type, debut, fin)
+        dates = np.arange(np.datetime64(debut), np.datetime64(fin) + np.timedelta64(1, 'us'),
+                          np.timedelta64(int(pas * 1e6), 'us'))
+        return dates, self.valeurs(code, type, dates, interpole=True)
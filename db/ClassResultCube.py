@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+Name                 : Mascaret
+Description          : Pre and Postprocessing for Mascaret for QGIS
+Date                 : June,2017
+copyright            : (C) 2017 by Artelia
+email                :
+***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 3 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ***************************************************************************/
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+try:  # python2
+    from StringIO import StringIO
+except ImportError:  # python3
+    from io import StringIO
+
+
+def to_list(tab):
+    """ numpy array to list, NaN -> None"""
+    return [None if v != v else v for v in tab.tolist()]
+
+
+class CubeWriter(object):
+    """ File object for COPY TO STDOUT, the lines are sent to the cube by blocks"""
+    BLOCK = 1 << 20
+
+    def __init__(self, cube):
+        self.cube = cube
+        self.buf = []
+        self.taille = 0
+
+    def write(self, data):
+        # psycopg2 calls write for each row
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        self.buf.append(data)
+        self.taille += len(data)
+        if self.taille >= self.BLOCK:
+            self.flush()
+
+    def flush(self):
+        if self.buf:
+            self.cube.fill(''.join(self.buf))
+            self.buf = []
+            self.taille = 0
+
+
+class ClassResultCube(object):
+    """
+    Results of one (run, scenario) in a numpy array [time, section, variable]
+    """
+
+    def __init__(self, mdb, id_runs):
+        self.mdb = mdb
+        self.id_runs = id_runs
+        self.var = mdb.results_var("id={0}".format(id_runs))
+        temp = mdb.results_times(id_runs)
+        self.t = np.array(temp['t'], dtype=np.float64)
+        if temp['date'] and temp['date'][0] is not None:
+            self.date = temp['date']
+        else:
+            self.date = None
+        self.branche = np.zeros(0, dtype=np.int32)
+        self.section = np.zeros(0, dtype=np.int32)
+        self.pk = np.zeros(0, dtype=np.float64)
+        if self.t.shape[0] > 0:
+            sql = "SELECT DISTINCT branche, section, pk FROM {0} WHERE t={1} ORDER BY section;"
+            rows = mdb.run_query(sql.format(mdb.results_obj().partition_name(id_runs), self.t[0]), fetch=True)
+            if rows:
+                self.branche = np.array([row[0] for row in rows], dtype=np.int32)
+                self.section = np.array([row[1] for row in rows], dtype=np.int32)
+                self.pk = np.array([row[2] for row in rows], dtype=np.float64)
+        self.data = None
+
+    def size(self):
+        """ memory size (bytes) of the data"""
+        return self.t.shape[0] * self.section.shape[0] * len(self.var) * 8
+
+    def load(self):
+        """ Load the values with COPY TO STDOUT"""
+        self.data = np.full((self.t.shape[0], self.section.shape[0], len(self.var)), np.nan)
+        if self.data.size == 0:
+            return True
+        self.index_sec = np.full(int(self.section.max()) + 1, -1, dtype=np.int64)
+        self.index_sec[self.section] = np.arange(self.section.shape[0])
+        sql = "COPY (SELECT t, section, array_position(ARRAY[{0}]::text[], var), val " \
+              "FROM {1}) TO STDOUT;".format(",".join("'{0}'".format(v) for v in self.var),
+                                            self.mdb.results_obj().partition_name(self.id_runs))
+        try:
+            cur = self.mdb.check_con().cursor()
+            writer = CubeWriter(self)
+            cur.copy_expert(sql, writer)
+            writer.flush()
+            self.mdb.commit()
+        except Exception as e:
+            self.mdb.rollback()
+            self.mdb.mgis.add_info(u'{}'.format(repr(e)))
+            self.data = None
+            return False
+        return True
+
+    def fill(self, txt):
+        """ fill the cube with lines 't  section  num_var  val'"""
+        tab = np.loadtxt(StringIO(txt), delimiter='\t', ndmin=2)
+        if tab.shape[0] == 0:
+            return
+        it = np.searchsorted(self.t, tab[:, 0])
+        it = np.clip(it, 0, self.t.shape[0] - 1)
+        isec = self.index_sec[tab[:, 1].astype(np.int64)]
+        ivar = tab[:, 2].astype(np.int64) - 1
+        cond = (isec >= 0) & (ivar >= 0) & (self.t[it] == tab[:, 0])
+        self.data[it[cond], isec[cond], ivar[cond]] = tab[cond, 3]
+
+    def index_time(self, t=None, date=None):
+        """ index of the time (t or date)"""
+        if date is not None:
+            if self.date is None or date not in self.date:
+                return None
+            return self.date.index(date)
+        idx = np.where(self.t == t)[0]
+        if idx.shape[0] == 0:
+            return None
+        return int(idx[0])
+
+    def index_pk(self, pk):
+        """ index of the sections at pk"""
+        return np.where(np.around(self.pk, 2) == round(pk, 2))[0]
+
+    def dico(self, it, isec):
+        """ results (same format than select_results) for index arrays of time and section"""
+        dico = {'t': self.t[it].tolist(),
+                'date': [self.date[i] for i in it] if self.date else [None] * len(it),
+                'branche': self.branche[isec].tolist(),
+                'section': self.section[isec].tolist(),
+                'pk': self.pk[isec].tolist()}
+        for i, v in enumerate(self.var):
+            dico[v] = to_list(self.data[it, isec, i])
+        return dico
+
+    def at_pk(self, pk):
+        """ results of the sections at pk for all times"""
+        isec = self.index_pk(pk)
+        it = np.repeat(np.arange(self.t.shape[0]), isec.shape[0])
+        isec = np.tile(isec, self.t.shape[0])
+        return self.dico(it, isec)
+
+    def at_time(self, t=None, date=None, branche=None, pk=None):
+        """ results of the sections (of branche, at pk) at one time, sorted by pk"""
+        idx = self.index_time(t, date)
+        if idx is None:
+            return self.dico(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        cond = np.ones(self.section.shape[0], dtype=bool)
+        if branche is not None:
+            cond &= self.branche == int(branche)
+        if pk is not None:
+            cond &= np.around(self.pk, 2) == round(pk, 2)
+        isec = np.where(cond)[0]
+        isec = isec[np.argsort(self.pk[isec], kind='mergesort')]
+        it = np.full(isec.shape[0], idx, dtype=np.int64)
+        return self.dico(it, isec)
+
+
+class ClassResultCache(object):
+    """
+    Cache of the results cubes of the (run, scenario), with LRU eviction.
+    If a cube is bigger than the memory cap, the queries are sent to the database.
+    """
+    MAX_MEM = 500
+    MAX_CUBES = 5
+
+    def __init__(self, mdb, max_mem=None, max_cubes=None):
+        self.mdb = mdb
+        # memory cap (Mo)
+        self.max_mem = max_mem if max_mem is not None else self.MAX_MEM
+        self.max_cubes = max_cubes if max_cubes is not None else self.MAX_CUBES
+        self.cubes = OrderedDict()
+
+    def clear(self, id_runs=None):
+        """ clear the cache (or the cube of id_runs)"""
+        if id_runs is None:
+            self.cubes.clear()
+        elif id_runs in self.cubes:
+            del self.cubes[id_runs]
+
+    def mem_cap(self):
+        """ memory cap (octets), option 'cube_mem' (Mo) of the plugin"""
+        return getattr(self.mdb.mgis, 'cube_mem', self.max_mem) * 1024 * 1024
+
+    def memory(self):
+        """ memory used by the cubes (octets)"""
+        return sum(cube.size() for cube in self.cubes.values() if cube is not None)
+
+    def get(self, id_runs):
+        """ cube of id_runs, None if too big or not loaded (a failed load isn't cached)"""
+        if id_runs is None:
+            return None
+        if id_runs in self.cubes:
+            cube = self.cubes.pop(id_runs)
+            self.cubes[id_runs] = cube
+            return cube
+        cube = ClassResultCube(self.mdb, id_runs)
+        cap = self.mem_cap()
+        if cube.size() > cap:
+            # the queries of this run are sent to the database
+            cube = None
+        elif not cube.load():
+            return None
+        self.cubes[id_runs] = cube
+        while len(self.cubes) > self.max_cubes or self.memory() > cap:
+            if len(self.cubes) == 1:
+                break
+            self.cubes.popitem(last=False)
+        return cube
+
+    def times(self, id_runs):
+        """ times and dates"""
+        cube = self.get(id_runs)
+        if cube is None:
+            return self.mdb.results_times(id_runs)
+        return {'t': cube.t.tolist(),
+                'date': list(cube.date) if cube.date else [None] * cube.t.shape[0]}
+
+    def pk(self, id_runs):
+        """ sorted pk"""
+        cube = self.get(id_runs)
+        if cube is None:
+            return self.mdb.results_pk(id_runs)
+        return sorted(set(np.around(cube.pk, 2).tolist()))
+
+    def at_pk(self, id_runs, pk):
+        """ results at pk for all times"""
+        cube = self.get(id_runs)
+        if cube is None:
+            return self.mdb.results_at_pk(id_runs, pk)
+        return cube.at_pk(pk)
+
+    def at_time(self, id_runs, t=None, date=None, branche=None, pk=None):
+        """ results at one time (t or date)"""
+        cube = self.get(id_runs)
+        if cube is None:
+            if branche is None and pk is None:
+                return self.mdb.results_at(id_runs, t, date)
+            condition = []
+            params = []
+            if branche is not None:
+                condition.append("branche=%s")
+                params.append(branche)
+            if pk is not None:
+                condition.append("pk=%s")
+                params.append(pk)
+            if date is not None:
+                condition.append("date=%s")
+                params.append(date)
+            else:
+                condition.append("t=%s")
+                params.append(t)
+            return self.mdb.select_results(id_runs, " AND ".join(condition), "pk", params=params)
+        return cube.at_time(t, date, branche, pk)
@@ -19,6 +19,34 @@ email                :
 """
 
 
+def sql_tab(col):
+    """ text col (numbers separated by spaces) as a double precision array, NULL if it isn't a list of numbers"""
+    nombre = r'[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?'
+    liste = r'^\s*{0}(\s+{0})*\s*$'.format(nombre)
+    return "CASE WHEN {0} ~ '{1}' THEN regexp_split_to_array(trim({0}), '\\s+')::double precision[] END".format(col,
+                                                                                                          liste)
+
+
+
+def pg_update_tab(obj):
+    """
+    Migration of the table of obj : add the arrays tab_<col> of the text columns obj.tabs
+    and fill them in one update, without the triggers of the table (abscissa, arrays)
+    """
+    qry = ''
+    for col in obj.tabs:
+        qry += 'ALTER TABLE {0}.{1} ADD COLUMN IF NOT EXISTS tab_{2} double precision[];\n'.format(obj.schema,
+                                                                                                 obj.name, col)
+    qry += 'ALTER TABLE {0}.{1} DISABLE TRIGGER USER;\n'.format(obj.schema, obj.name)
+    qry += 'UPDATE {0}.{1} SET {2};\n'.format(obj.schema, obj.name,
+                                               ', '.join('tab_{0} = {1}'.format(col, sql_tab(col))
+                                                         for col in obj.tabs))
+    qry += 'ALTER TABLE {0}.{1} ENABLE TRIGGER USER;\n'.format(obj.schema, obj.name)
+    qry += 'DROP TRIGGER IF EXISTS {0}_calcul_tab ON {1}.{0};\n'.format(obj.name, obj.schema)
+    qry += obj.pg_create_calcul_tab()
+    return qry
+
+
 class MasObject(object):
     """
     Class for Mascaret geometry objects processing.
@@ -38,6 +66,7 @@ class MasObject(object):
         self.name = self.__class__.__name__
         self.geom_type = None
         self.attrs = None
+        self.index_res = []
 
     def pg_create_table(self):
         schema_name = '{0}.{1}'.format(self.schema, self.name)
@@ -66,6 +95,16 @@ class MasObject(object):
         qry = 'CREATE INDEX {1}_geom_idx\n  ON {0}.{1} \n  USING gist \n  (geom);\n'.format(self.schema, self.name)
         return qry
 
+    def pg_create_index_res(self):
+        """ indexes used by the selection and the deletion of the runs"""
+        qry = ''
+        for cols in self.index_res:
+            qry += 'CREATE INDEX IF NOT EXISTS {1}_{2}_idx\n  ON {0}.{1} \n  ({3});\n'.format(self.schema,
+                                                                                          self.name,
+                                                                                          '_'.join(cols),
+                                                                                          ', '.join(cols))
+        return qry
+
     def pg_create_calcul_abscisse(self):
         qry = 'CREATE TRIGGER {1}_calcul_abscisse\n' \
               '  BEFORE INSERT OR UPDATE\n  ON {0}.{1}\n'.format(self.schema, self.name)
@@ -322,31 +361,6 @@ class lateral_weirs(MasObject):
         return qry
 
 
-# *********** Water quality ***************
-class tracer_lateral_inflows(MasObject):
-    def __init__(self):
-        super(tracer_lateral_inflows, self).__init__()
-        self.order = 10
-        self.geom_type = 'Point'
-        self.attrs = [('gid', ' serial NOT NULL'),
-                      ('name', ' character varying(30)'),
-                      ('branchnum', ' integer'),
-                      ('abscissa', ' float'),
-                      ('length', ' float'),
-                      ('law_wq', ' text'),
-                      ('typeSources', ' integer'),
-                      ('active', ' boolean'),
-                      ('CONSTRAINT tracer_lateral_inflows_pkey', ' PRIMARY KEY (gid)')]
-
-    def pg_create_table(self):
-        qry = super(self.__class__, self).pg_create_table()
-        qry += '\n'
-        qry += self.pg_create_index()
-        qry += '\n'
-        qry += self.pg_create_calcul_abscisse()
-        return qry
-
-
 # *********** Water quality ***************
 class tracer_lateral_inflows(MasObject):
     def __init__(self):
@@ -386,14 +400,31 @@ class basins(MasObject):
                       ('area', 'text'),
                       ('volume', 'text'),
                       ('active', 'boolean'),
+                      ('tab_level', 'double precision[]'),
+                      ('tab_area', 'double precision[]'),
+                      ('tab_volume', 'double precision[]'),
                       ('CONSTRAINT basins_pkey', 'PRIMARY KEY (gid)'),
                       ('CONSTRAINT basin_name_unique', 'UNIQUE (name)'),
                       ('CONSTRAINT basin_num_unique', 'UNIQUE (basinnum)')]
+        self.tabs = ('level', 'area', 'volume')
+
+    def pg_create_calcul_tab(self):
+        """ the text level, area, volume follow the arrays tab_level, tab_area, tab_volume"""
+        qry = 'CREATE TRIGGER {1}_calcul_tab\n' \
+              '  BEFORE INSERT OR UPDATE\n  ON {0}.{1}\n'.format(self.schema, self.name)
+        qry += '   FOR EACH ROW\nEXECUTE PROCEDURE calcul_tab_basin();\n'
+        return qry
+
+    def pg_update_tab(self):
+        """ migration : add and fill the arrays of the existing basins"""
+        return pg_update_tab(self)
 
     def pg_create_table(self):
         qry = super(self.__class__, self).pg_create_table()
         qry += '\n'
         qry += self.pg_create_index()
+        qry += '\n'
+        qry += self.pg_create_calcul_tab()
         return qry
 
 
@@ -460,8 +491,13 @@ class profiles(MasObject):
                       ('xmnt', 'text'),
                       ('zmnt', 'text'),
                       ('active', 'boolean'),
+                      ('tab_x', 'double precision[]'),
+                      ('tab_z', 'double precision[]'),
+                      ('tab_xmnt', 'double precision[]'),
+                      ('tab_zmnt', 'double precision[]'),
                       ('CONSTRAINT profiles_pkey', 'PRIMARY KEY (gid)'),
                       ('CONSTRAINT profile_unique', 'UNIQUE (name)')]
+        self.tabs = ('x', 'z', 'xmnt', 'zmnt')
 
     def pg_create_calcul_abscisse(self):
         qry = 'CREATE TRIGGER {1}_calcul_abscisse\n' \
@@ -469,12 +505,25 @@ class profiles(MasObject):
         qry += '   FOR EACH ROW\nEXECUTE PROCEDURE calcul_abscisse_profil();\n'
         return qry
 
+    def pg_create_calcul_tab(self):
+        """ the text x, z, xmnt, zmnt follow the arrays tab_x, tab_z, tab_xmnt, tab_zmnt"""
+        qry = 'CREATE TRIGGER {1}_calcul_tab\n' \
+              '  BEFORE INSERT OR UPDATE\n  ON {0}.{1}\n'.format(self.schema, self.name)
+        qry += '   FOR EACH ROW\nEXECUTE PROCEDURE calcul_tab_profil();\n'
+        return qry
+
+    def pg_update_tab(self):
+        """ migration : add and fill the arrays of the existing profiles"""
+        return pg_update_tab(self)
+
     def pg_create_table(self):
         qry = super(self.__class__, self).pg_create_table()
         qry += '\n'
         qry += self.pg_create_index()
         qry += '\n'
         qry += self.pg_create_calcul_abscisse()
+        qry += '\n'
+        qry += self.pg_create_calcul_tab()
         return qry
 
 
@@ -521,38 +570,104 @@ class branchs(MasObject):
 
 # *******************************************
 # ******************************************
-class resultats(MasObject):
+class results(MasObject):
+    """
+    Results of the sections, one row by variable (var, val).
+    The table is partitioned by (run, scenario) with id_runs,
+    one partition results_<id_runs> by row of runs.
+    """
+
     def __init__(self):
-        super(resultats, self).__init__()
+        super(results, self).__init__()
         self.order = 16
         self.geom_type = None
-        self.attrs = [('id', ' serial NOT NULL'),
-                      ('run', ' character varying(30)'),
-                      ('scenario', ' character varying(30)'),
-                      ('date', ' timestamp without time zone'),
+        self.attrs = [('id_runs', ' integer NOT NULL'),
                       ('t', ' float'),
+                      ('date', ' timestamp without time zone'),
                       ('branche', ' integer'),
                       ('section', ' integer'),
                       ('pk', ' float'),
-                      ('zref', ' float'),
-                      ('z', ' float'),
-                      ('qmin', ' float'),
-                      ('qmaj', ' float'),
-                      ('kmin', ' float'),
-                      ('kmaj', ' float'),
-                      ('fr', ' float'),
-                      ('y', ' float'),
-                      ('zmax', ' float'),
-                      ('qmax', ' float'),
-                      ('q', ' float'),
-                      ('bnum', ' integer'),
-                      ('zcas', ' float'),
-                      ('surcas', ' float'),
-                      ('volcas', ' float'),
-                      ('lnum', ' integer'),
-                      ('qech', ' float'),
-                      ('vech', ' float'),
-                      ('CONSTRAINT projet_pkey', ' PRIMARY KEY (id)')]
+                      ('var', ' text'),
+                      ('val', ' float')]
+
+    def pg_create_table(self, declarative=True):
+        schema_name = '{0}.{1}'.format(self.schema, self.name)
+        attrs = [' '.join(field) for field in self.attrs]
+        qry = 'DROP TABLE IF EXISTS {0} CASCADE;\nCREATE TABLE {0}(\n\t{1})'.format(schema_name,
+                                                                                 ',\n\t'.join(attrs))
+        if declarative:
+            qry += '\nPARTITION BY LIST (id_runs)'
+        qry += ';\n'
+        qry += 'ALTER TABLE {0}.{1}\n\tOWNER TO postgres;\n'.format(self.schema, self.name)
+        return qry
+
+    def partition_name(self, id_runs):
+        return '{0}.{1}_{2}'.format(self.schema, self.name, id_runs)
+
+    def pg_create_partition(self, id_runs, declarative=True):
+        part = self.partition_name(id_runs)
+        qry = 'DROP TABLE IF EXISTS {0};\n'.format(part)
+        if declarative:
+            qry += 'CREATE TABLE {0} PARTITION OF {1}.{2} FOR VALUES IN ({3});\n'
+        else:
+            # PostgreSQL < 10 : partition by inheritance
+            qry += 'CREATE TABLE {0} (CHECK (id_runs = {3})) INHERITS ({1}.{2});\n'
+        return qry.format(part, self.schema, self.name, id_runs)
+
+    def pg_create_partition_index(self, id_runs):
+        part = self.partition_name(id_runs)
+        idx = '{0}_{1}'.format(self.name, id_runs)
+        qry = 'CREATE INDEX IF NOT EXISTS {1}_pk_t_idx ON {0} (pk, t);\n' \
+              'CREATE INDEX IF NOT EXISTS {1}_t_pk_idx ON {0} (t, pk);\n'
+        return qry.format(part, idx)
+
+    def pg_create_update_index(self, id_runs):
+        """ index of the merge of new values in the partition (see update_res)"""
+        part = self.partition_name(id_runs)
+        idx = '{0}_{1}'.format(self.name, id_runs)
+        return 'CREATE INDEX IF NOT EXISTS {1}_t_section_var_idx ON {0} (t, section, var);\n'.format(part, idx)
+
+    def pg_drop_partition(self, id_runs):
+        return 'DROP TABLE IF EXISTS {0};\n'.format(self.partition_name(id_runs))
+
+
+class results_envelope(MasObject):
+    """
+    Envelope of the results : maximum, minimum and time of the maximum
+    of each variable by section, one row by (id_runs, section, var).
+    """
+
+    def __init__(self):
+        super(results_envelope, self).__init__()
+        self.order = 31
+        self.geom_type = None
+        self.attrs = [('id_runs', ' integer NOT NULL'),
+                      ('branche', ' integer'),
+                      ('section', ' integer'),
+                      ('pk', ' float'),
+                      ('var', ' text'),
+                      ('vmax', ' float'),
+                      ('vmin', ' float'),
+                      ('tmax', ' float'),
+                      ('datemax', ' timestamp without time zone')]
+        self.index_res = [('id_runs', 'var', 'pk')]
+
+    def pg_create_table(self):
+        qry = super(self.__class__, self).pg_create_table()
+        qry += '\n'
+        qry += self.pg_create_index_res()
+        return qry
+
+    def pg_fill(self, id_runs, partition):
+        """ compute the envelope of one run from its results partition"""
+        qry = 'DELETE FROM {0}.{1} WHERE id_runs = {2};\n' \
+              'INSERT INTO {0}.{1} (id_runs, branche, section, pk, var, vmax, vmin, tmax, datemax)\n' \
+              'SELECT DISTINCT ON (branche, section, var) {2}, branche, section, pk, var,\n' \
+              '       max(val) OVER w, min(val) OVER w, t, date\n' \
+              'FROM {3}\n' \
+              'WINDOW w AS (PARTITION BY branche, section, var)\n' \
+              'ORDER BY branche, section, var, val DESC, t;\n'
+        return qry.format(self.schema, self.name, id_runs, partition)
 
 
 class resultats_basin(MasObject):
@@ -570,6 +685,13 @@ class resultats_basin(MasObject):
                       ('surcas', ' float'),
                       ('volcas', ' float'),
                       ('CONSTRAINT res_basinkey', ' PRIMARY KEY (id)')]
+        self.index_res = [('run', 'scenario', 'bnum', 't')]
+
+    def pg_create_table(self):
+        qry = super(self.__class__, self).pg_create_table()
+        qry += '\n'
+        qry += self.pg_create_index_res()
+        return qry
 
 
 class resultats_links(MasObject):
@@ -586,25 +708,15 @@ class resultats_links(MasObject):
                       ('qech', ' float'),
                       ('vech', ' float'),
                       ('CONSTRAINT res_linkkey', ' PRIMARY KEY (id)')]
+        self.index_res = [('run', 'scenario', 'lnum', 't')]
+
+    def pg_create_table(self):
+        qry = super(self.__class__, self).pg_create_table()
+        qry += '\n'
+        qry += self.pg_create_index_res()
+        return qry
 
 
-# TODO: Modifier la table de cette facon
-# class results(MasObject):
-#     def __init__(self):
-#         super(results, self).__init__()
-#         self.order = 14
-#         self.geom_type = None
-#         self.attrs = [('id', ' serial NOT NULL'),
-#                       ('run', ' character varying(30)'),
-#                       ('scenario', ' character varying(30)'),
-#                       ('date', ' timestamp without time zone'),
-#                       ('t', ' float'),
-#                       ('branche', ' integer'),
-#                       ('section', ' integer'),
-#                       ('pk', ' float'),
-#                       ('var', ' text'),
-#                       ('val', ' float'),
-#                       ('CONSTRAINT results_pkey', ' PRIMARY KEY (id)')]
 # *****************************************
 class runs(MasObject):
     def __init__(self):
@@ -619,7 +731,15 @@ class runs(MasObject):
                       ('pk', ' text'),
                       ('comments', 'text'),
                       ('wq', 'text'),
+                      ('var', 'text'),
                       ('CONSTRAINT cle_runs', 'PRIMARY KEY (id)')]
+        self.index_res = [('run', 'scenario')]
+
+    def pg_create_table(self):
+        qry = super(self.__class__, self).pg_create_table()
+        qry += '\n'
+        qry += self.pg_create_index_res()
+        return qry
 
 
 # *****************************************
@@ -635,6 +755,13 @@ class observations(MasObject):
                       ('valeur', 'float'),
                       ('date', 'timestamp without time zone'),
                       ('CONSTRAINT cle_obs ', 'PRIMARY KEY (id)')]
+        self.index_res = [('code', 'type', 'date')]
+
+    def pg_create_table(self):
+        qry = super(observations, self).pg_create_table()
+        qry += '\n'
+        qry += self.pg_create_index_res()
+        return qry
 
 
 # *****************************************
@@ -760,6 +887,43 @@ class calcul_abscisse(MasObject):
                   OWNER TO postgres;"""
         return qry.format('calcul_abscisse_profil')
 
+    def pg_create_calcul_tab_profil(self):
+        """ x, z, xmnt and zmnt of the profiles (text) from the arrays"""
+        return self.pg_create_calcul_tab('calcul_tab_profil', profiles().tabs)
+
+    def pg_create_calcul_tab_basin(self):
+        """ level, area and volume of the basins (text) from the arrays"""
+        return self.pg_create_calcul_tab('calcul_tab_basin', basins().tabs)
+
+    def pg_create_calcul_tab(self, nom, cols):
+        """
+        Function of the trigger which keeps the text cols and their arrays tab_<col> in sync :
+        the text is written from the array, or the array read from the text edited alone
+        (QGIS forms, NULL if the text isn't a list of numbers)
+        """
+        tab = ''
+        for col in cols:
+            tab += """IF TG_OP = 'INSERT' AND NEW.tab_{0} IS NULL THEN
+                            NEW.tab_{0} = {1};
+                        ELSIF TG_OP = 'INSERT' OR NEW.tab_{0} IS DISTINCT FROM OLD.tab_{0} THEN
+                            NEW.{0} = array_to_string(NEW.tab_{0}, ' ');
+                        ELSIF NEW.{0} IS DISTINCT FROM OLD.{0} THEN
+                            NEW.tab_{0} = {1};
+                        END IF;
+                        """.format(col, sql_tab('NEW.{0}'.format(col)))
+        qry = """CREATE OR REPLACE FUNCTION {0}()
+                  RETURNS trigger AS
+                $BODY$
+                    BEGIN
+                        {1}RETURN NEW;
+                    END;
+                $BODY$
+                  LANGUAGE plpgsql
+                  COST 100;
+                ALTER FUNCTION {0}()
+                  OWNER TO postgres;"""
+        return qry.format(nom, tab)
+
     def pg_create_calcul_abscisse_branche(self):
         qry = '''CREATE OR REPLACE FUNCTION calcul_abscisse_branche()
               RETURNS trigger AS
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the plugin parts which don't need QGIS.
+The tests of the database need QGIS and a PostgreSQL database given
+by the MASCARET_TEST_DB variable, they are skipped without them.
+The plugin folder is added to the path so the modules can be imported
+without the plugin package (folder name).
+"""
+import importlib
+import os
+import sys
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PLUGIN_DIR not in sys.path:
+    sys.path.insert(0, PLUGIN_DIR)
+
+
+class FakeMgis(object):
+    """ main object of the plugin for the tests of the database, the messages are kept"""
+    DEBUG = False
+    iface = None
+
+    def __init__(self):
+        self.masplugPath = PLUGIN_DIR
+        self.mdb = None
+        self.messages = []
+
+    def add_info(self, text):
+        self.messages.append(text)
+
+
+def database(schema):
+    """
+    ClassMasDatabase connected to the database of the MASCARET_TEST_DB variable
+    ("dbname host port user [password]") with the empty schema,
+    None if the variable isn't set or QGIS isn't available.
+    """
+    params = os.environ.get('MASCARET_TEST_DB', '').split()
+    if len(params) < 4:
+        return None
+    parent = os.path.dirname(PLUGIN_DIR)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    try:
+        module = importlib.import_module(os.path.basename(PLUGIN_DIR) + '.db.ClassMasDatabase')
+    except ImportError:
+        return None
+    mgis = FakeMgis()
+    mdb = module.ClassMasDatabase(mgis, params[0], params[1], params[2], params[3],
+                                  params[4] if len(params) > 4 else '')
+    mgis.mdb = mdb
+    mdb.connect_pg()
+    if mdb.con is None:
+        return None
+    mdb.SCHEMA = schema
+    mdb.run_query('DROP SCHEMA IF EXISTS {0} CASCADE;\nCREATE SCHEMA {0};'.format(schema))
+    return mdb
+
+
+def drop_database(mdb):
+    """ drop the schema of the test and close the connections"""
+    mdb.run_query('DROP SCHEMA IF EXISTS {0} CASCADE;'.format(mdb.SCHEMA))
+    mdb.pool.closeall()
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+""" Tests of the database (QGIS and MASCARET_TEST_DB needed)"""
+import datetime
+import threading
+import unittest
+
+import numpy as np
+
+from . import database, drop_database
+
+SCHEMA = 'mascaret_test'
+
+
+class TestDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.mdb = database(SCHEMA)
+        if self.mdb is None:
+            self.skipTest('QGIS or MASCARET_TEST_DB is not available')
+
+    def tearDown(self):
+        if self.mdb is not None:
+            drop_database(self.mdb)
+
+    def query(self, sql, params=None):
+        return self.mdb.run_query(sql.format(SCHEMA), fetch=True, params=params)
+
+    def create_runs(self, *scenarios):
+        self.mdb.run_query("CREATE TABLE {0}.runs (id serial PRIMARY KEY, run text, scenario text, "
+                           "date timestamp, t text, pk text, comments text, wq text, var text);".format(SCHEMA))
+        for scen in scenarios:
+            self.mdb.run_query("INSERT INTO {0}.runs (run, scenario) VALUES ('r', %s);".format(SCHEMA),
+                               params=[scen])
+        self.mdb.run_query(self.mdb.results_obj().pg_create_table(self.mdb.partitioned()))
+
+    def test_migrate_results(self):
+        self.create_runs('s1', 's2')
+        self.mdb.run_query("""CREATE TABLE {0}.resultats (id serial, run text, scenario text, date timestamp,
+                                  t float, branche int, section int, pk float, z float, q float, c1 float);
+                              INSERT INTO {0}.resultats (run, scenario, t, branche, section, pk, z, q)
+                              SELECT 'r', 's1', g, 1, g, g, g * 2, g * 3 FROM generate_series(1, 100) g;
+                              INSERT INTO {0}.resultats (run, scenario, t, branche, section, pk, z, c1)
+                              SELECT 'r', 's2', g, 1, g, g, g * 2, g * 4 FROM generate_series(1, 50) g;
+                           """.format(SCHEMA))
+        self.mdb.migrate_results()
+        tables = self.mdb.list_tables()
+        self.assertNotIn('resultats', tables)
+        # the old table is kept
+        self.assertIn('resultats_old', tables)
+        self.assertEqual(self.query("SELECT id, var FROM {0}.runs ORDER BY id;"), [[1, 'z,q'], [2, 'z,c1']])
+        self.assertEqual(self.query("SELECT id_runs, var, count(*), sum(val) FROM {0}.results "
+                                    "GROUP BY id_runs, var ORDER BY id_runs, var;"),
+                         [[1, 'q', 100, 15150.], [1, 'z', 100, 10100.],
+                          [2, 'c1', 50, 5100.], [2, 'z', 50, 2550.]])
+
+    def test_stage_tables_in_transaction(self):
+        self.mdb.run_query("CREATE TABLE {0}.observations (id serial, code character(10), type character(1), "
+                           "comment character varying(50), valeur float, "
+                           "date timestamp without time zone);".format(SCHEMA))
+        with self.mdb.transaction():
+            res1 = self.mdb.copy_observations([('A', 'H', '', 1., '2020-01-01 00:00')])
+            res2 = self.mdb.copy_observations([('A', 'H', '', 1., '2020-01-01 00:00'),
+                                               ('B', 'Q', '', 2., '2020-01-01 00:00')])
+        self.assertEqual((res1, res2), ((1, 0), (1, 1)))
+        self.assertEqual(self.query("SELECT count(*) FROM {0}.observations;"), [[2]])
+
+    def test_worker_release(self):
+        resultats = []
+        fct = self.mdb.worker(lambda: resultats.append(self.mdb.run_query("SELECT 1;", fetch=True)))
+        threads = [threading.Thread(target=fct) for i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(resultats, [[[1]]] * 3)
+        # only the connection of the main thread is still used
+        self.assertEqual(list(self.mdb.pool._used.values()), [self.mdb.con])
+
+    def test_prepared_statements_of_pooled_connections(self):
+        self.create_runs('s1', 's2')
+        ids = []
+        fct = self.mdb.worker(lambda scen: ids.append(self.mdb.get_id_run('r', scen)))
+        # the threads use the same connection of the pool one after the other
+        for scen in ['s1', 's2', 's1']:
+            thread = threading.Thread(target=fct, args=(scen,))
+            thread.start()
+            thread.join()
+        self.assertEqual(ids, [1, 2, 1])
+        self.assertEqual(self.mdb.get_id_run('r', 's2'), 2)
+
+    def test_tabs_of_basins(self):
+        self.mdb.run_query("""CREATE TABLE {0}.basins (gid serial, name text, level text, area text, volume text);
+                              INSERT INTO {0}.basins (name, level, area, volume)
+                              VALUES ('b1', '10 11 12', ' 100 2e2 300', '0 150.5 400'), ('b2', '1 abc', NULL, '');
+                              -- the migration doesn't fire the triggers of the table
+                              CREATE FUNCTION {0}.refuse() RETURNS trigger AS $$
+                              BEGIN RAISE EXCEPTION 'trigger fired'; END $$ LANGUAGE plpgsql;
+                              CREATE TRIGGER basins_refuse BEFORE UPDATE ON {0}.basins
+                              FOR EACH ROW EXECUTE PROCEDURE {0}.refuse();""".format(SCHEMA))
+        self.mdb.check_tabs()
+        rows = self.query("SELECT name, tab_level, tab_area, tab_volume FROM {0}.basins ORDER BY name;")
+        self.assertEqual([[tab if tab is None else tab.tolist() for tab in row[1:]] for row in rows],
+                         [[[10., 11., 12.], [100., 200., 300.], [0., 150.5, 400.]], [None, None, None]])
+
+        self.mdb.run_query("DROP TRIGGER basins_refuse ON {0}.basins;".format(SCHEMA))
+        # the text follows the array, the array follows the text edited alone
+        self.mdb.update("basins", {'b1': {'tab_level': np.array([1.5, 2.])}, 'b2': {'level': '3 4.5'}}, var='name')
+        self.mdb.run_query("INSERT INTO {0}.basins (name, level) VALUES ('b3', '7 8');".format(SCHEMA))
+        rows = self.query("SELECT name, level, tab_level FROM {0}.basins ORDER BY name;")
+        self.assertEqual([[row[0], row[1], row[2].tolist()] for row in rows],
+                         [['b1', '1.5 2', [1.5, 2.]], ['b2', '3 4.5', [3., 4.5]], ['b3', '7 8', [7., 8.]]])
+
+    def test_update_res(self):
+        self.create_runs('s1')
+        self.mdb.create_envelope()
+        colonnes = ['t', 'branche', 'section', 'pk', 'z', 'c1', 'date']
+        rows = [[t, 1, s, s * 10., 100. + s, 1. if s < 3 else None, datetime.datetime(2020, 1, 1, 0, t)]
+                for t in range(3) for s in range(1, 5)]
+        self.mdb.load_results(1, rows, colonnes)
+        self.mdb.run_query("UPDATE {0}.runs SET var = 'z,c1';".format(SCHEMA))
+        # tracer results imported again : c1 for all the sections, new variable c2
+        rows = [[t, 1, s, 2. * s, 3. * s] for t in range(3) for s in range(1, 5)]
+        res = self.mdb.update_res(1, iter(rows), ['t', 'branche', 'section', 'c1', 'c2'])
+        self.assertEqual(res, (6, 18))
+        self.assertEqual(self.query("SELECT var FROM {0}.runs WHERE id = 1;"), [['z,c1,c2']])
+        self.assertEqual(self.query("SELECT section, pk, date, val FROM {0}.results "
+                                    "WHERE var = 'c1' AND t = 2 ORDER BY section;"),
+                         [[s, s * 10., datetime.datetime(2020, 1, 1, 0, 2), 2. * s] for s in range(1, 5)])
+        self.assertEqual(self.query("SELECT count(*) FROM {0}.results WHERE var = 'z';"), [[12]])
+        self.assertEqual(self.query("SELECT vmax FROM {0}.results_envelope "
+                                    "WHERE var = 'c2' AND section = 4;"), [[12.]])
+
+
+if __name__ == '__main__':
+    unittest.main()
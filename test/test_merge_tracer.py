@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+""" Tests of the join of the tracer results to the hydraulic results"""
+import unittest
+
+import numpy as np
+
+from . import PLUGIN_DIR  # noqa: F401 (path of the plugin)
+from ClassReadOpt import join_index, merge_tracer
+
+DTYPE_HYD = [('t', '<f8'), ('branche', '<i4'), ('section', '<i4'), ('z', '<f8')]
+DTYPE_TRA = [('t', '<f8'), ('branche', '<i4'), ('section', '<i4'), ('c1', '<f8')]
+
+
+def resultats(nb_t, nb_sec, dtype, ordre=None):
+    """ rows sorted by time, the sections of a time step in ordre"""
+    tab = np.empty(nb_t * nb_sec, dtype=dtype)
+    tab['t'] = np.repeat(np.arange(nb_t) * 60., nb_sec)
+    section = np.arange(1, nb_sec + 1)
+    if ordre is not None:
+        section = section[ordre]
+    tab['section'] = np.tile(section, nb_t)
+    tab['branche'] = (tab['section'] - 1) // 100 + 1
+    tab[dtype[-1][0]] = tab['t'] * 1000 + tab['section']
+    return tab
+
+
+def decoupe(tab, taille):
+    """ batches of taille rows"""
+    return [tab[i:i + taille] for i in range(0, tab.shape[0], taille)]
+
+
+class TestMergeTracer(unittest.TestCase):
+
+    def merge(self, hyd, tra, taille_hyd, taille_tra):
+        messages = []
+        res = list(merge_tracer(decoupe(hyd, taille_hyd), decoupe(tra, taille_tra), ['c1'], messages.append))
+        return np.concatenate(res), messages
+
+    def test_same_batches(self):
+        hyd = resultats(20, 300, DTYPE_HYD)
+        tra = resultats(20, 300, DTYPE_TRA)
+        res, messages = self.merge(hyd, tra, 1000, 1000)
+        np.testing.assert_array_equal(res['c1'], hyd['z'])
+        self.assertEqual(messages, [])
+
+    def test_batches_cut_in_a_time_step(self):
+        # the hydraulic and tracer batches end at different rows, inside a time step
+        hyd = resultats(200, 300, DTYPE_HYD)
+        tra = resultats(200, 300, DTYPE_TRA)
+        res, messages = self.merge(hyd, tra, 20000, 7000)
+        self.assertEqual(res.shape[0], 60000)
+        self.assertFalse(np.isnan(res['c1']).any())
+        np.testing.assert_array_equal(res['c1'], hyd['z'])
+        self.assertEqual(messages, [])
+
+    def test_batches_cut_in_a_time_step_other_order(self):
+        # the sections of the tracer file aren't in the same order
+        ordre = np.random.RandomState(0).permutation(300)
+        hyd = resultats(50, 300, DTYPE_HYD)
+        tra = resultats(50, 300, DTYPE_TRA, ordre)
+        res, messages = self.merge(hyd, tra, 1234, 999)
+        np.testing.assert_array_equal(res['c1'], hyd['z'])
+        self.assertEqual(messages, [])
+
+    def test_missing_rows(self):
+        hyd = resultats(10, 50, DTYPE_HYD)
+        tra = resultats(10, 50, DTYPE_TRA)
+        tra = tra[tra['section'] != 7]
+        res, messages = self.merge(hyd, tra, 130, 70)
+        manque = hyd['section'] == 7
+        self.assertTrue(np.isnan(res['c1'][manque]).all())
+        np.testing.assert_array_equal(res['c1'][~manque], hyd['z'][~manque])
+        self.assertEqual(messages, ["Warning: hydraulic and tracer results are not aligned "
+                                    "(10 rows without tracer, 0 tracer rows not used)."])
+
+    def test_join_index(self):
+        hyd = resultats(3, 5, DTYPE_HYD)
+        tra = resultats(3, 5, DTYPE_TRA)[::-1]
+        idx, trouve = join_index(hyd, tra)
+        self.assertTrue(trouve.all())
+        np.testing.assert_array_equal(tra['c1'][idx], hyd['z'])
+        idx, trouve = join_index(hyd, None)
+        self.assertFalse(trouve.any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+""" Tests of the raster provider used by the threads of the DTM extraction (QGIS needed)"""
+import threading
+import unittest
+
+from . import PLUGIN_DIR  # noqa: F401 (path of the plugin)
+
+try:
+    from ClassMNT import ClassMNT
+except ImportError:
+    ClassMNT = None
+
+
+class FakeProvider(object):
+    def __init__(self, echec=False):
+        self.echec = echec
+        self.clones = []
+
+    def clone(self):
+        if self.echec:
+            return None
+        clone = FakeProvider()
+        self.clones.append(clone)
+        return clone
+
+
+@unittest.skipIf(ClassMNT is None, 'QGIS is not available')
+class TestProvider(unittest.TestCase):
+
+    def worker(self, provider, nb_thread):
+        mnt = ClassMNT.__new__(ClassMNT)
+        mnt.raster_provider = provider
+        mnt.nb_thread = nb_thread
+        mnt.local = threading.local()
+        return mnt
+
+    def test_one_clone_by_thread(self):
+        provider = FakeProvider()
+        mnt = self.worker(provider, 1)
+        # one thread : the worker thread doesn't use the provider of the layer
+        self.assertIsNot(mnt.provider(), provider)
+        self.assertIs(mnt.provider(), provider.clones[0])
+        autres = []
+        thread = threading.Thread(target=lambda: autres.append(mnt.provider()))
+        thread.start()
+        thread.join()
+        self.assertIs(autres[0], provider.clones[1])
+
+    def test_failed_clone(self):
+        mnt = self.worker(FakeProvider(echec=True), 4)
+        self.assertRaises(RuntimeError, mnt.provider)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+""" Tests of the pivot of the tracer and meteo laws"""
+import io
+import unittest
+
+import numpy as np
+
+from . import PLUGIN_DIR  # noqa: F401 (path of the plugin)
+from WaterQuality.ClassMeteoSeries import comble, ecrit_loi, pivot
+
+
+class TestPivot(unittest.TestCase):
+
+    def test_pivot(self):
+        # rows of array_agg, in any order
+        temps = np.array([3600., 0., 0., 3600., 1800.])
+        trac = np.array([2., 1., 2., 1., 1.])
+        valeurs = np.array([40., 10., 20., 30., 15.])
+        temps, trac, tab = pivot(temps, trac, valeurs)
+        np.testing.assert_array_equal(temps, [0., 1800., 3600.])
+        np.testing.assert_array_equal(trac, [1., 2.])
+        # no value of the tracer 2 at 1800 s
+        np.testing.assert_array_equal(tab, [[10., 20.], [15., np.nan], [30., 40.]])
+
+    def test_empty(self):
+        temps, trac, tab = pivot(np.zeros(0), np.zeros(0), np.zeros(0))
+        self.assertEqual(tab.shape, (0, 0))
+
+    def test_comble(self):
+        temps = np.array([0., 1800., 3600., 7200.])
+        tab = np.array([[np.nan, 20., np.nan],
+                        [15., np.nan, np.nan],
+                        [30., 40., np.nan],
+                        [np.nan, 60., np.nan]])
+        comble(temps, tab)
+        # interpolated in time, first/last value outside, 0 for an empty column
+        np.testing.assert_array_equal(tab, [[15., 20., 0.], [15., 30., 0.], [30., 40., 0.], [30., 60., 0.]])
+
+    def test_ecrit_loi(self):
+        fich = io.StringIO()
+        ecrit_loi(fich, np.array([0., 3600.]), np.array([[10., 0.5], [12.25, 1e-05]]))
+        # same lines as the former writer : str() of the values, trailing space, no last newline
+        self.assertEqual(fich.getvalue(), '0.0 10.0 0.5 \n3600.0 12.25 1e-05 ')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+""" Tests of the streaming reader of the Mascaret results files"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import PLUGIN_DIR  # noqa: F401 (path of the plugin)
+from ClassReadOpt import ClassReadOpt
+
+HEADER = ['/* comment', '[variables]', '"Cote de l eau";"Z";"m";2', '"Debit total";"Q";"m3/s";3',
+          '[resultats]']
+
+
+class TestReadOpt(unittest.TestCase):
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dossier)
+
+    def ecrit(self, nom, lignes, header=HEADER):
+        fich = os.path.join(self.dossier, nom)
+        with open(fich, 'w') as f:
+            f.write('\n'.join(header + lignes) + '\n')
+        return fich
+
+    def test_batches(self):
+        lignes = ['{0};1;{1};{2:.3f};{3};{4}'.format(t * 10., s, s * 1.005, 100 + s, t + s)
+                  for t in range(5) for s in range(1, 8)]
+        reader = ClassReadOpt(self.ecrit('res.opt', lignes), chunk=6)
+        self.assertEqual(reader.col, ['t', 'branche', 'section', 'pk', 'z', 'q'])
+        batches = list(reader.batches())
+        self.assertEqual([b.shape[0] for b in batches], [6, 6, 6, 6, 6, 5])
+        tab = reader.read_all()
+        self.assertEqual(tab.shape[0], 35)
+        self.assertEqual(tab['section'].dtype, np.int32)
+        np.testing.assert_array_equal(tab['t'][:8], [0.] * 7 + [10.])
+        np.testing.assert_allclose(tab['pk'][:3], [1.0, 2.01, 3.02])
+        np.testing.assert_allclose(tab['q'][-1], 4 + 7)
+
+    def test_numbers(self):
+        header = ['[variables]', '"Cote";"ZCAS";"m";2', '[resultats]']
+        lignes = ['0.0;"C  1";10.', '0.0;"C  2";20.', '0.0;"C  3";30.', '1.0;"C  1";11.', '1.0;"C  7";17.']
+        reader = ClassReadOpt(self.ecrit('res.cas_opt', lignes, header), ['t', 'bnum'],
+                              {'bnum': {1: 10, 2: 20}})
+        tab = reader.read_all()
+        # the unknown numbers (3, 7) aren't loaded as a valid basin
+        np.testing.assert_array_equal(tab['bnum'], [10, 20, 10])
+        np.testing.assert_array_equal(tab['zcas'], [10., 20., 11.])
+        self.assertEqual(reader.rejets, 2)
+        self.assertEqual(reader.inconnus, {3, 7})
+
+    def test_numbers_without_dico(self):
+        header = ['[variables]', '"Debit";"QECH";"m3/s";2', '[resultats]']
+        reader = ClassReadOpt(self.ecrit('res.liai_opt', ['0.0;"L 4";1.5'], header), ['t', 'lnum'])
+        tab = reader.read_all()
+        np.testing.assert_array_equal(tab['lnum'], [4])
+        self.assertEqual(reader.rejets, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+""" Tests of the LRU cache of the results cubes"""
+import unittest
+
+from . import PLUGIN_DIR  # noqa: F401 (path of the plugin)
+from db import ClassResultCube as module_cube
+from db.ClassResultCube import ClassResultCache
+
+
+class FakeCube(object):
+    """ cube of 1 Mo, the load of the runs in echecs fails"""
+    echecs = set()
+    charges = []
+
+    def __init__(self, mdb, id_runs):
+        self.id_runs = id_runs
+        self.taille = mdb.tailles.get(id_runs, 1) * 1024 * 1024
+
+    def size(self):
+        return self.taille
+
+    def load(self):
+        FakeCube.charges.append(self.id_runs)
+        return self.id_runs not in FakeCube.echecs
+
+
+class FakeMdb(object):
+    def __init__(self):
+        self.mgis = object()
+        self.tailles = {}
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cube_class = module_cube.ClassResultCube
+        module_cube.ClassResultCube = FakeCube
+        FakeCube.echecs = set()
+        FakeCube.charges = []
+        self.mdb = FakeMdb()
+
+    def tearDown(self):
+        module_cube.ClassResultCube = self.cube_class
+
+    def test_lru(self):
+        cache = ClassResultCache(self.mdb, max_mem=100, max_cubes=3)
+        for id_runs in [1, 2, 3]:
+            self.assertEqual(cache.get(id_runs).id_runs, id_runs)
+        # 1 is used again, 2 is the oldest one
+        cache.get(1)
+        cache.get(4)
+        self.assertEqual(list(cache.cubes), [3, 1, 4])
+        self.assertEqual(FakeCube.charges, [1, 2, 3, 4])
+        cache.clear(3)
+        self.assertEqual(list(cache.cubes), [1, 4])
+
+    def test_memory_cap(self):
+        self.mdb.tailles = {1: 40, 2: 40, 3: 40, 4: 200}
+        cache = ClassResultCache(self.mdb, max_mem=100, max_cubes=5)
+        for id_runs in [1, 2, 3]:
+            cache.get(id_runs)
+        self.assertEqual(list(cache.cubes), [2, 3])
+        # too big : the database is used, the result is kept
+        self.assertIsNone(cache.get(4))
+        self.assertIsNone(cache.get(4))
+        self.assertNotIn(4, FakeCube.charges)
+        self.assertIn(4, cache.cubes)
+
+    def test_failed_load_not_cached(self):
+        FakeCube.echecs = {1}
+        cache = ClassResultCache(self.mdb, max_mem=100, max_cubes=3)
+        self.assertIsNone(cache.get(1))
+        self.assertNotIn(1, cache.cubes)
+        FakeCube.echecs = set()
+        self.assertEqual(cache.get(1).id_runs, 1)
+        self.assertEqual(FakeCube.charges, [1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()